@@ -5,12 +5,18 @@ import sys
 
 EXPR_IMPORTS = (
     "from __future__ import annotations  # NOTE: No need since python 3.11+\n"
-    "from typing import Any, Protocol, TypeVar, runtime_checkable\n"
+    "from enum import IntEnum\n"
+    "from typing import TYPE_CHECKING, Any, Protocol, TypeVar, "
+    "runtime_checkable\n"
     "from pyloxtoken import Token\n"
+    "\n"
+    "if TYPE_CHECKING:\n"
+    "    from loxcallable import GetCache, MethodCache, SetCache\n"
 )
 
 STMT_IMPORTS = (
     "from __future__ import annotations  # NOTE: No need since python 3.11+\n"
+    "from enum import IntEnum\n"
     "from typing import Protocol, TypeVar, runtime_checkable\n"
     "from pyloxtoken import Token\n"
     "import expr as e\n"
@@ -49,6 +55,42 @@ EXPRESSIONS = {
     "variable": {"name": "Token"},
 }
 
+# Resolution of a variable use: scope distance and slot of the variable, and
+# whether the slot holds a cell because a closure captures the variable
+RESOLUTION = {
+    "depth": ("int", "GLOBAL"),
+    "slot": ("int", "0"),
+    "boxed": ("bool", "False"),
+}
+
+# The slot of a global is cached together with the version of the globals
+# table it was found in
+GLOBAL_CACHE = {**RESOLUTION, "version": ("object", "None")}
+
+# Node state that is not passed to the constructor: name -> (type, default)
+EXPRESSIONS_STATE = {
+    "assign": GLOBAL_CACHE,
+    # The inline caches of what the property resolved to
+    "get": {"cache": ("GetCache | None", "None")},
+    "set": {"cache": ("SetCache | None", "None")},
+    # super also needs the instance, resolved as a use of this
+    "super": {
+        **RESOLUTION,
+        "this": ("This | None", "None"),
+        "cache": ("MethodCache | None", "None"),
+    },
+    "this": RESOLUTION,
+    "variable": GLOBAL_CACHE,
+}
+
+EXPRESSION_CONSTANTS = (
+    "# Depth of the variables that are not in a local scope\n"
+    "GLOBAL = -1\n"
+    "# Depth of the variables captured from an enclosing function: the slot\n"
+    "# is the index of their cell in the closure\n"
+    "UPVALUE = -2\n"
+)
+
 
 STATEMENT_CLASS_NAME = "Stmt"
 STATEMENTS = {
@@ -59,6 +101,12 @@ STATEMENTS = {
         "methods": "list[Function]",
     },
     "expression": {"expression": f"{'e.'+EXPRESSION_CLASS_NAME}"},
+    "for": {
+        "initializer": f"{STATEMENT_CLASS_NAME} | None",
+        "condition": f"e.{EXPRESSION_CLASS_NAME} | None",
+        "increment": f"e.{EXPRESSION_CLASS_NAME} | None",
+        "body": STATEMENT_CLASS_NAME,
+    },
     "function": {
         "name": "Token",
         "params": "list[Token]",
@@ -84,14 +132,35 @@ STATEMENTS = {
     },
 }
 
+# A declaration captured by a closure puts its value in a cell
+BOXED = {"boxed": ("bool", "False")}
+
+STATEMENTS_STATE = {
+    # A block that declares nothing runs in the scope around it
+    "block": {"scoped": ("bool", "True")},
+    "class": BOXED,
+    # The variables captured by a function, as resolutions from where it is
+    # declared, and the slots of its parameters (and this) that are boxed
+    "function": {
+        **BOXED,
+        "upvalues": ("list[tuple[int, int]]", "[]"),
+        "boxed_params": ("tuple[int, ...]", "()"),
+    },
+    "var": BOXED,
+}
+
 AST = {
     "expr": {
         "classes": EXPRESSIONS,
+        "state": EXPRESSIONS_STATE,
+        "constants": EXPRESSION_CONSTANTS,
         "base_name": EXPRESSION_CLASS_NAME,
         "imports": EXPR_IMPORTS,
     },
     "stmt": {
         "classes": STATEMENTS,
+        "state": STATEMENTS_STATE,
+        "constants": "",
         "base_name": STATEMENT_CLASS_NAME,
         "imports": STMT_IMPORTS,
     },
@@ -104,6 +173,9 @@ NOTE = (
 )
 
 
+# Of the generated modules, as in .flake8
+MAX_LINE_LENGTH = 80
+
 GEN_COVAR = "T_co"
 
 T_COV_VAR = f'{GEN_COVAR} = TypeVar("{GEN_COVAR}", covariant=True)'
@@ -120,6 +192,7 @@ def indent(n=1) -> str:
 def define_protocol(name: str) -> str:
     text = "@runtime_checkable\n"
     text += f"class {name}(Protocol[{GEN_INVAR}]):\n"
+    text += f"{indent()}kind: Kind\n\n"
     text += (
         f"{indent()}def accept(self, visitor: Visitor[{GEN_INVAR}])"
         + f" -> {GEN_INVAR}:\n"
@@ -147,22 +220,55 @@ def define_visitor(return_type: str, methods: list[str], category: str) -> str:
     return text
 
 
-def list_fields(fields: dict[str, str]) -> str:
-    return ", ".join(
-        [f"{name}: {field_type}" for name, field_type in fields.items()]
-    )
+def define_kinds(class_names: list[str]) -> str:
+    """Small integer tags of the node classes, usable as table indexes"""
+    text = "class Kind(IntEnum):\n"
+    for value, class_name in enumerate(class_names):
+        text += f"{indent()}{class_name.upper()} = {value}\n"
+    return text
+
+
+def wrap(opening: str, items: list[str], closing: str, level: int = 1) -> str:
+    """Put items between opening and closing on one line, if it fits in
+    MAX_LINE_LENGTH. Otherwise on one line of their own, or else one per
+    line, like black does."""
+    joined = ", ".join(items)
+    line = f"{indent(level)}{opening}{joined}{closing}"
+    if len(line) <= MAX_LINE_LENGTH:
+        return f"{line}\n"
+    inner = f"{indent(level + 1)}{joined}"
+    if len(inner) > MAX_LINE_LENGTH:
+        inner = ",\n".join(f"{indent(level + 1)}{item}" for item in items)
+        inner += ","
+    return f"{indent(level)}{opening}\n{inner}\n{indent(level)}{closing}\n"
+
 
+def field_names(name: str, fields: list[str]) -> str:
+    """The tuple of the fields, assigned to name"""
+    closing = ",)" if len(fields) == 1 else ")"
+    return wrap(f"{name} = (", [f'"{field}"' for field in fields], closing)
 
-def define_class(class_name: str, fields: dict[str, str], category: str) -> str:
+
+def list_fields(fields: dict[str, str]) -> list[str]:
+    return [f"{name}: {field_type}" for name, field_type in fields.items()]
+
+
+def define_class(
+    class_name: str,
+    fields: dict[str, str],
+    category: str,
+    state: dict[str, tuple[str, str]],
+) -> str:
     text = f"class {class_name.capitalize()}:\n"
-    fields_list = list_fields(fields)
-    init_paramaters = (
-        "self" if not fields_list else f"self, {list_fields(fields)}"
-    )
-    text += f"{indent()}def __init__({init_paramaters}):\n"
+    text += field_names("__slots__", [*fields, *state])
+    text += field_names("__match_args__", list(fields))
+    text += f"{indent()}kind = Kind.{class_name.upper()}\n\n"
+    text += wrap("def __init__(", ["self", *list_fields(fields)], "):")
     for name in fields.keys():
         text += f"{indent(2)}self.{name} = {name}\n"
-    if not fields.keys():
+    for name, (field_type, default) in state.items():
+        text += f"{indent(2)}self.{name}: {field_type} = {default}\n"
+    if not fields.keys() and not state:
         text += f"{indent(2)}pass\n"
     text += "\n"
     text += (
@@ -181,13 +287,19 @@ def generate(ast: dict) -> str:
     text += "\n"
     text += ast["imports"] + "\n\n"
     text += T_COV_VAR + "\n"
-    text += T_INV + "\n\n\n"
+    text += T_INV + "\n\n"
+    if ast["constants"]:
+        text += ast["constants"] + "\n"
+    text += "\n"
+    text += define_kinds(list(classes.keys()))
+    text += "\n\n"
     text += define_visitor(GEN_COVAR, classes.keys(), category)
     text += "\n"
     text += define_protocol(category)
     text += "\n\n"
     for class_name, fields in classes.items():
-        text += define_class(class_name, fields, category)
+        state = ast["state"].get(class_name, {})
+        text += define_class(class_name, fields, category, state)
         text += "\n\n"
     return text[:-2]
 
@@ -0,0 +1,79 @@
+from __future__ import annotations  # NOTE: No need since python 3.11+
+from contextlib import suppress
+from dataclasses import dataclass
+from functools import cache
+from hashlib import sha256
+import os
+import pickle
+import sys
+import tempfile
+import stmt as s
+from source import SourceText
+
+
+# Like __pycache__, it sits next to the scripts
+CACHE_DIRECTORY = "__loxcache__"
+
+
+@dataclass(frozen=True)
+class CachedProgram:
+    key: str
+    statements: list[s.Stmt]  # Resolved: the nodes hold their resolutions
+
+
+@cache
+def interpreter_version() -> str:
+    """Digest of the interpreter sources: any change to them invalidates
+    all the cached programs"""
+    digest = sha256(sys.version.encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            with open(os.path.join(directory, name), mode="rb") as module:
+                digest.update(module.read())
+    return digest.hexdigest()
+
+
+class AstCache:
+    """Resolved program of a script, stored on disk and keyed by the hash of
+    the script source and by the interpreter version. Failing to read or
+    write the cache is never an error: the program is just analysed again.
+    Loading a pickle can run arbitrary code, so the cache trusts whoever can
+    write to the cache directory of the script: it must be enabled only for
+    scripts in directories that nobody else can write to."""
+
+    def __init__(self, script: str, source: SourceText):
+        directory, name = os.path.split(os.path.abspath(script))
+        self._directory = os.path.join(directory, CACHE_DIRECTORY)
+        self._path = os.path.join(self._directory, f"{name}.pickle")
+        text = source.encode() if isinstance(source, str) else source
+        self._key = sha256(text).hexdigest() + interpreter_version()
+
+    def load(self) -> list[s.Stmt] | None:
+        """Return the cached statements, or None if there is no valid cached
+        program"""
+        try:
+            with open(self._path, mode="rb") as cached:
+                program = pickle.load(cached)
+        except Exception:  # Missing, unreadable or corrupted: all the same
+            return None
+        if not isinstance(program, CachedProgram) or program.key != self._key:
+            return None
+        return program.statements
+
+    def store(self, statements: list[s.Stmt]) -> None:
+        program = CachedProgram(self._key, statements)
+        try:
+            os.makedirs(self._directory, exist_ok=True)
+            descriptor, temporary = tempfile.mkstemp(dir=self._directory)
+        except OSError:
+            return
+        # Write then rename, so that a concurrent run never reads a partially
+        # written file
+        try:
+            with os.fdopen(descriptor, mode="wb") as cached:
+                pickle.dump(program, cached, pickle.HIGHEST_PROTOCOL)
+            os.replace(temporary, self._path)
+        except (OSError, pickle.PicklingError, RecursionError):
+            with suppress(OSError):
+                os.remove(temporary)
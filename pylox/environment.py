@@ -4,42 +4,49 @@ from pyloxtoken import Token
 from exceptions import PyloxRuntimeError
 
 
-class Environment:
-    def __init__(self):
-        self._values: dict[str, Any] = {}
-        self.enclosing: Environment | None = None
+class Cell:
+    """A variable captured by a closure. The scope that declares it and the
+    closures that capture it share the cell, not the whole scope."""
 
-    @classmethod
-    def nest(cls, enclosing: Environment) -> Environment:
-        environemnt = Environment()
-        environemnt.enclosing = enclosing
-        return environemnt
+    __slots__ = ("value",)
 
-    def define(self, name: str, value: Any):
-        self._values[name] = value
+    def __init__(self, value: Any = None):
+        self.value = value
 
-    def get(self, name: Token) -> Any:
-        if (value := self._values.get(name.lexeme)) is not None:
-            return value
-        if self.enclosing is not None:
-            return self.enclosing.get(name)
 
-        raise PyloxRuntimeError(name, f'Undefined variable "{name.lexeme}"')
+class Environment:
+    """A local scope. Its variables are defined in the same order in which
+    the resolver numbers them, so they are addressed by that slot index.
+    The scopes of a function end at its frame: what it uses from outside
+    comes from the cells of its closure."""
 
-    def assign(self, name: Token, value: Any) -> None:
-        if name.lexeme in self._values.keys():
-            self._values[name.lexeme] = value
-            return
-        if self.enclosing is not None:
-            self.enclosing.assign(name, value)
-            return
-        raise PyloxRuntimeError(name, f'Undefined variable "{name.lexeme}"')
+    __slots__ = ("slots", "enclosing")
+
+    def __init__(
+        self,
+        enclosing: Environment | None = None,
+        slots: list[Any] | None = None,
+    ):
+        self.slots: list[Any] = [] if slots is None else slots
+        self.enclosing = enclosing
+
+    @classmethod
+    def nest(cls, enclosing: Environment) -> Environment:
+        return Environment(enclosing)
+
+    def define(self, name: str, value: Any) -> None:
+        self.slots.append(value)
 
-    def get_at(self, distance: int, name: str) -> Any:
-        return self._ancestor(distance)._values.get(name)
+    def get_at(self, distance: int, slot: int) -> Any:
+        if distance == 0:
+            return self.slots[slot]
+        return self._ancestor(distance).slots[slot]
 
-    def assign_at(self, distance: int, name: Token, value: Any) -> None:
-        self._ancestor(distance)._values[name.lexeme] = value
+    def assign_at(self, distance: int, slot: int, value: Any) -> None:
+        if distance == 0:
+            self.slots[slot] = value
+        else:
+            self._ancestor(distance).slots[slot] = value
 
     def _ancestor(self, distance: int) -> Environment:
         environment = self
@@ -49,3 +56,42 @@ class Environment:
             ), "Internal error: Invalid null scope."
             environment = environment.enclosing
         return environment
+
+
+class GlobalEnvironment(Environment):
+    """The outermost scope. Globals can be defined at any time (e.g. in the
+    repl) and the resolver does not track them: each one gets a slot when
+    it is first defined, found by name.
+    The use sites of a global cache its slot together with the version of
+    the table. A new version is made when a global is redefined, and no two
+    tables share a version, so a cache is never used with a table it does
+    not come from."""
+
+    __slots__ = ("_indexes", "version")
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._indexes: dict[str, int] = {}
+        self.version = object()
+
+    def define(self, name: str, value: Any) -> None:
+        if (index := self._indexes.get(name)) is None:
+            self._indexes[name] = len(self.slots)
+            self.slots.append(value)
+        else:
+            self.slots[index] = value
+            self.version = object()
+
+    def index(self, name: Token) -> int:
+        """Return the slot of a global"""
+        if (index := self._indexes.get(name.lexeme)) is None:
+            raise PyloxRuntimeError(
+                name, f'Undefined variable "{name.lexeme}"'
+            )
+        return index
+
+    def get(self, name: Token) -> Any:
+        return self.slots[self.index(name)]
+
+    def assign(self, name: Token, value: Any) -> None:
+        self.slots[self.index(name)] = value
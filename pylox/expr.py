@@ -2,13 +2,38 @@
 # Do not manually change it.
 
 from __future__ import annotations  # NOTE: No need since python 3.11+
-from typing import Any, Protocol, TypeVar, runtime_checkable
+from enum import IntEnum
+from typing import TYPE_CHECKING, Any, Protocol, TypeVar, runtime_checkable
 from pyloxtoken import Token
 
+if TYPE_CHECKING:
+    from loxcallable import GetCache, MethodCache, SetCache
+
 
 T_co = TypeVar("T_co", covariant=True)
 T = TypeVar("T")
 
+# Depth of the variables that are not in a local scope
+GLOBAL = -1
+# Depth of the variables captured from an enclosing function: the slot
+# is the index of their cell in the closure
+UPVALUE = -2
+
+
+class Kind(IntEnum):
+    ASSIGN = 0
+    BINARY = 1
+    CALL = 2
+    GET = 3
+    GROUPING = 4
+    LITERAL = 5
+    LOGICAL = 6
+    SET = 7
+    SUPER = 8
+    THIS = 9
+    UNARY = 10
+    VARIABLE = 11
+
 
 class Visitor(Protocol[T_co]):
     def visit_assign_expr(self, expr: Assign) -> T_co:
@@ -50,20 +75,34 @@ class Visitor(Protocol[T_co]):
 
 @runtime_checkable
 class Expr(Protocol[T]):
+    kind: Kind
+
     def accept(self, visitor: Visitor[T]) -> T:
         ...
 
 
 class Assign:
+    __slots__ = ("name", "value", "depth", "slot", "boxed", "version")
+    __match_args__ = ("name", "value")
+    kind = Kind.ASSIGN
+
     def __init__(self, name: Token, value: Expr):
         self.name = name
         self.value = value
+        self.depth: int = GLOBAL
+        self.slot: int = 0
+        self.boxed: bool = False
+        self.version: object = None
 
     def accept(self, visitor: Visitor[T_co]) -> T_co:
         return visitor.visit_assign_expr(self)
 
 
 class Binary:
+    __slots__ = ("left", "operator", "right")
+    __match_args__ = ("left", "operator", "right")
+    kind = Kind.BINARY
+
     def __init__(self, left: Expr, operator: Token, right: Expr):
         self.left = left
         self.operator = operator
@@ -74,6 +113,10 @@ class Binary:
 
 
 class Call:
+    __slots__ = ("callee", "paren", "arguments")
+    __match_args__ = ("callee", "paren", "arguments")
+    kind = Kind.CALL
+
     def __init__(self, callee: Expr, paren: Token, arguments: list[Expr]):
         self.callee = callee
         self.paren = paren
@@ -84,15 +127,24 @@ class Call:
 
 
 class Get:
+    __slots__ = ("obj", "name", "cache")
+    __match_args__ = ("obj", "name")
+    kind = Kind.GET
+
     def __init__(self, obj: Expr, name: Token):
         self.obj = obj
         self.name = name
+        self.cache: GetCache | None = None
 
     def accept(self, visitor: Visitor[T_co]) -> T_co:
         return visitor.visit_get_expr(self)
 
 
 class Grouping:
+    __slots__ = ("expression",)
+    __match_args__ = ("expression",)
+    kind = Kind.GROUPING
+
     def __init__(self, expression: Expr):
         self.expression = expression
 
@@ -101,6 +153,10 @@ class Grouping:
 
 
 class Literal:
+    __slots__ = ("value",)
+    __match_args__ = ("value",)
+    kind = Kind.LITERAL
+
     def __init__(self, value: Any):
         self.value = value
 
@@ -109,6 +165,10 @@ class Literal:
 
 
 class Logical:
+    __slots__ = ("left", "operator", "right")
+    __match_args__ = ("left", "operator", "right")
+    kind = Kind.LOGICAL
+
     def __init__(self, left: Expr, operator: Token, right: Expr):
         self.left = left
         self.operator = operator
@@ -119,33 +179,58 @@ class Logical:
 
 
 class Set:
+    __slots__ = ("obj", "name", "value", "cache")
+    __match_args__ = ("obj", "name", "value")
+    kind = Kind.SET
+
     def __init__(self, obj: Expr, name: Token, value: Expr):
         self.obj = obj
         self.name = name
         self.value = value
+        self.cache: SetCache | None = None
 
     def accept(self, visitor: Visitor[T_co]) -> T_co:
         return visitor.visit_set_expr(self)
 
 
 class Super:
+    __slots__ = ("keyword", "method", "depth", "slot", "boxed", "this", "cache")
+    __match_args__ = ("keyword", "method")
+    kind = Kind.SUPER
+
     def __init__(self, keyword: Token, method: Token):
         self.keyword = keyword
         self.method = method
+        self.depth: int = GLOBAL
+        self.slot: int = 0
+        self.boxed: bool = False
+        self.this: This | None = None
+        self.cache: MethodCache | None = None
 
     def accept(self, visitor: Visitor[T_co]) -> T_co:
         return visitor.visit_super_expr(self)
 
 
 class This:
+    __slots__ = ("keyword", "depth", "slot", "boxed")
+    __match_args__ = ("keyword",)
+    kind = Kind.THIS
+
     def __init__(self, keyword: Token):
         self.keyword = keyword
+        self.depth: int = GLOBAL
+        self.slot: int = 0
+        self.boxed: bool = False
 
     def accept(self, visitor: Visitor[T_co]) -> T_co:
         return visitor.visit_this_expr(self)
 
 
 class Unary:
+    __slots__ = ("operator", "right")
+    __match_args__ = ("operator", "right")
+    kind = Kind.UNARY
+
     def __init__(self, operator: Token, right: Expr):
         self.operator = operator
         self.right = right
@@ -155,8 +240,16 @@ class Unary:
 
 
 class Variable:
+    __slots__ = ("name", "depth", "slot", "boxed", "version")
+    __match_args__ = ("name",)
+    kind = Kind.VARIABLE
+
     def __init__(self, name: Token):
         self.name = name
+        self.depth: int = GLOBAL
+        self.slot: int = 0
+        self.boxed: bool = False
+        self.version: object = None
 
     def accept(self, visitor: Visitor[T_co]) -> T_co:
         return visitor.visit_variable_expr(self)
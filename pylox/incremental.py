@@ -0,0 +1,199 @@
+from __future__ import annotations  # NOTE: No need since python 3.11+
+from bisect import bisect_left
+from dataclasses import dataclass, field, replace
+from typing import Any, Iterable
+import expr as e
+import stmt as s
+from pyloxtoken import Token, TokenBuffer, TokenType
+from pyloxparser import Parser
+from pyloxresolver import Interpreter, Resolver
+from pyloxscanner import RegexScanner
+from exceptions import ParserError
+from error_handler import report
+
+
+# Where a token is held: the node and the attribute, or the list and the
+# index
+TokenSite = tuple[Any, str | int]
+
+
+@dataclass(eq=False)
+class Declaration:
+    """A top-level declaration together with the range of its tokens"""
+
+    statement: s.Stmt | None  # None if the declaration has errors
+    start: int  # Offset of the first token
+    end: int  # Offset past the last token
+    first_line: int
+    last_line: int
+    line_shift: int = 0  # Not yet applied to the tokens of the statement
+    tokens: list[TokenSite] = field(default_factory=list)
+
+
+def _token_sites(node: Any, sites: list[TokenSite]) -> list[TokenSite]:
+    """Collect where the tokens found in node are held"""
+    children: Iterable[tuple[str | int, Any]]
+    match node:
+        case list():
+            children = enumerate(node)
+        case s.Stmt() | e.Expr():
+            slots: tuple[str, ...] = getattr(node, "__slots__")
+            children = ((name, getattr(node, name)) for name in slots)
+        case _:
+            return sites
+    for key, child in children:
+        if type(child) is Token:
+            sites.append((node, key))
+        else:
+            _token_sites(child, sites)
+    return sites
+
+
+def _shift_lines(sites: list[TokenSite], shift: int) -> None:
+    """Move the tokens held at sites by shift lines"""
+    for holder, key in sites:
+        if isinstance(key, int):
+            holder[key] = replace(holder[key], line=holder[key].line + shift)
+        else:
+            token = getattr(holder, key)
+            setattr(holder, key, replace(token, line=token.line + shift))
+
+
+class IncrementalFrontEnd:
+    """Scanner, parser and resolver for a program that is edited over time.
+    After an edit, scanning and parsing restart at the first top-level
+    declaration touched by the edit, and stop as soon as they get back in
+    step with a declaration of the previous version: that one and all the
+    following ones are reused as they are."""
+
+    def __init__(self, interpreter: Interpreter, source: str = ""):
+        self._interpreter = interpreter
+        self._source = ""
+        self._declarations: list[Declaration] = []
+        self.edit(0, 0, source)
+
+    @property
+    def source(self) -> str:
+        return self._source
+
+    @property
+    def declarations(self) -> list[Declaration]:
+        return self._declarations
+
+    def program(self) -> list[s.Stmt] | None:
+        """Return the statements of the program, or None if it has errors"""
+        statements = []
+        for declaration in self._declarations:
+            if declaration.statement is None:
+                return None
+            if declaration.line_shift:
+                _shift_lines(declaration.tokens, declaration.line_shift)
+                declaration.line_shift = 0
+            statements.append(declaration.statement)
+        return statements
+
+    def edit(self, start: int, end: int, text: str) -> bool:
+        """Replace source[start:end] with text. Return True if the new
+        version of the program has no errors."""
+        source = self._source[:start] + text + self._source[end:]
+        old = self._declarations
+
+        # Lexemes look ahead up to two characters ("1." followed by "5"), so
+        # a declaration ending right before the edit may change as well. The
+        # parser looks one token ahead (e.g. for an "else"), so the one before
+        # it depends on the edit too.
+        first = max(bisect_left(old, start - 1, key=lambda d: d.end) - 1, 0)
+        if first > 0:
+            resume, line = old[first - 1].end, old[first - 1].last_line
+        else:
+            resume, line = 0, 1
+
+        buffer = RegexScanner(source, resume, line).scan_buffer(lazy=True)
+        try:
+            parser = Parser(buffer)
+        except ParserError as error:
+            report({"ParseError:": error})
+            parsed = [Declaration(None, resume, len(source), line, line)]
+            reused = len(old)
+        else:
+            delta = len(text) - (end - start)
+            parsed, reused = self._parse(
+                parser, buffer, first, start + len(text), delta
+            )
+
+        for declaration in parsed:
+            if declaration.statement is None:
+                continue
+            if Resolver(self._interpreter).resolve_statements(
+                [declaration.statement]
+            ):
+                declaration.tokens = _token_sites(declaration.statement, [])
+            else:
+                declaration.statement = None
+
+        self._declarations = old[:first] + parsed + old[reused:]
+        self._source = source
+        return all(d.statement is not None for d in self._declarations)
+
+    def _parse(
+        self,
+        parser: Parser,
+        buffer: TokenBuffer,
+        first: int,
+        edit_end: int,
+        delta: int,
+    ) -> tuple[list[Declaration], int]:
+        """Parse declarations until the parser reaches, past the edit, the
+        start of a previous declaration. Return the new declarations and the
+        index of the first previous one that can be reused."""
+        old = self._declarations
+        parsed: list[Declaration] = []
+        statements = parser.declarations()
+        while buffer.token_type(index := parser.token_index()) is not (
+            TokenType.EOF
+        ):
+            offset = buffer.starts[index]
+            if offset >= edit_end:
+                reused = bisect_left(
+                    old, offset - delta, lo=first, key=lambda d: d.start
+                )
+                if reused < len(old) and old[reused].start == offset - delta:
+                    self._shift(reused, delta, buffer.line(index))
+                    return parsed, reused
+            statement = next(statements)
+            last = parser.token_index() - 1
+            if buffer.truncated:
+                # Nothing is known about the source past a scanner error: the
+                # declaration that hit it extends to the end.
+                parsed.append(
+                    Declaration(
+                        None,
+                        offset,
+                        buffer.ends[-1],
+                        buffer.line(index),
+                        buffer.line(len(buffer) - 1),
+                    )
+                )
+                break
+            parsed.append(
+                Declaration(
+                    statement,
+                    offset,
+                    buffer.ends[last],
+                    buffer.line(index),
+                    buffer.line(last),
+                )
+            )
+        return parsed, len(old)
+
+    def _shift(self, reused: int, delta: int, first_line: int) -> None:
+        """Move the reused declarations to their position in the new source"""
+        line_shift = first_line - self._declarations[reused].first_line
+        if not delta and not line_shift:
+            return
+        for declaration in self._declarations[reused:]:
+            declaration.start += delta
+            declaration.end += delta
+            declaration.first_line += line_shift
+            declaration.last_line += line_shift
+            declaration.line_shift += line_shift
@@ -1,9 +1,29 @@
-from pyloxscanner import Scanner, TOKEN_FINDERS
-from source import Source
+from pyloxscanner import (
+    Scanner,
+    DispatchScanner,
+    RegexScanner,
+    TOKEN_FINDERS,
+    TOKEN_FINDER_TABLE,
+)
+from pyloxtoken import Token, TokenBuffer
+from source import Source, SourceText, as_text
 import sys
+import os
+import mmap
+from contextlib import contextmanager
+from enum import Enum, auto
+from typing import Iterator
+import stmt as s
+from astcache import AstCache
 from pyloxparser import Parser
 from pyloxinterpreter import Interpreter
+from pyloxcompiler import CompiledInterpreter
+from pyloxvm import VirtualMachine
+from pyloxtranspiler import TranspiledInterpreter
+from pyloxtiered import TieredInterpreter
 from pyloxresolver import Resolver
+from pyloxoptimizer import Optimizer
+from exceptions import InternalPyloxError, ScannerError
 
 # from visitors import Stringyfier
 
@@ -16,12 +36,88 @@ def _read_as_string(fname: str) -> str:
         return source.read()
 
 
+class Lexer(Enum):
+    FINDERS = auto()
+    DISPATCH = auto()
+    REGEX = auto()
+
+
+@contextmanager
+def _open_source(fname: str, lexer: Lexer) -> Iterator[SourceText]:
+    """Yield the file content. The regex lexer scans bytes directly, so it
+    gets a read-only memory map of the file instead of a decoded copy.
+    Files with carriage returns are read in text mode instead, which turns
+    every line ending into a newline"""
+    if lexer is Lexer.REGEX:
+        with open(fname, mode="rb") as source:
+            if os.fstat(source.fileno()).st_size == 0:
+                yield ""  # Empty files can't be mapped
+                return
+            with mmap.mmap(
+                source.fileno(), 0, access=mmap.ACCESS_READ
+            ) as mapped:
+                if mapped.find(b"\r") == -1:
+                    yield mapped
+                    return
+    yield _read_as_string(fname)
+
+
+def _scan(
+    source: SourceText, lexer: Lexer
+) -> Iterator[Token | None] | TokenBuffer:
+    match lexer:
+        case Lexer.FINDERS:
+            return Scanner(
+                Source(as_text(source[:])), TOKEN_FINDERS
+            ).scan_tokens()
+        case Lexer.DISPATCH:
+            return DispatchScanner(
+                Source(as_text(source[:])), TOKEN_FINDER_TABLE
+            ).scan_tokens()
+        case Lexer.REGEX:
+            return RegexScanner(source).scan_buffer()
+    raise InternalPyloxError(f"Unknown lexer {lexer}")
+
+
+class Engine(Enum):
+    TREE_WALKER = auto()
+    CLOSURES = auto()
+    BYTECODE = auto()
+    PYTHON = auto()
+    TIERED = auto()
+
+
+def _interpreter(engine: Engine) -> Interpreter:
+    match engine:
+        case Engine.TREE_WALKER:
+            return Interpreter()
+        case Engine.CLOSURES:
+            return CompiledInterpreter()
+        case Engine.BYTECODE:
+            return VirtualMachine()
+        case Engine.PYTHON:
+            return TranspiledInterpreter()
+        case Engine.TIERED:
+            return TieredInterpreter()
+    raise InternalPyloxError(f"Unknown engine {engine}")
+
+
 class Lox:
-    def __init__(self):
-        self._interpreter = Interpreter()
+    def __init__(
+        self,
+        lexer: Lexer = Lexer.REGEX,
+        use_cache: bool = False,
+        engine: Engine = Engine.TREE_WALKER,
+    ):
+        self._interpreter = _interpreter(engine)
+        self._lexer = lexer
+        self._use_cache = use_cache
 
     def run_file(self, script: str) -> None:
-        if (exit_code := self._run(_read_as_string(script))) != 0:
+        with _open_source(script, self._lexer) as source:
+            cache = AstCache(script, source) if self._use_cache else None
+            exit_code = self._run(source, cache)
+        if exit_code != 0:
             sys.exit(exit_code)
 
     def run_prompt(self) -> None:
@@ -32,15 +128,35 @@ class Lox:
         except (EOFError, KeyboardInterrupt):
             pass
 
-    def _run(self, source: str) -> int:
-        tokens = Scanner(Source(source), TOKEN_FINDERS).scan_tokens()
-        statements = Parser(tokens).parse()
+    def _run(self, source: SourceText, cache: AstCache | None = None) -> int:
+        statements = None
+        if cache is not None:
+            statements = cache.load()
         if statements is None:
-            return 65
+            statements = self._front_end(source, cache)
+            if statements is None:
+                return 65
         if not statements:
             return 0
-        if not Resolver(self._interpreter).resolve_statements(statements):
-            return 65
         if not self._interpreter.interpret(statements):
             return 70
         return 0
+
+    def _front_end(
+        self, source: SourceText, cache: AstCache | None
+    ) -> list[s.Stmt] | None:
+        """Scan, parse, resolve and optimize the source. Return None on
+        errors"""
+        try:
+            tokens = _scan(source, self._lexer)
+        except ScannerError:
+            return None
+        statements = Parser(tokens).parse()
+        if not statements:
+            return statements
+        if not Resolver(self._interpreter).resolve_statements(statements):
+            return None
+        statements = Optimizer().optimize(statements)
+        if cache is not None:
+            cache.store(statements)
+        return statements
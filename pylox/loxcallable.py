@@ -1,8 +1,9 @@
 from __future__ import annotations
-from typing import Any, Protocol, runtime_checkable
+from abc import ABC, abstractmethod
+from typing import Any, Generic, Protocol, TypeVar, runtime_checkable
 import expr as e
 import stmt as s
-from environment import Environment
+from environment import Cell, Environment, GlobalEnvironment
 from exceptions import Return, PyloxRuntimeError
 from pyloxtoken import Token
 
@@ -11,11 +12,13 @@ class CallableVisitor(Protocol):
     def visit_call_expr(self, expr: e.Call) -> Any:
         """Method used to interact with a Call expression object."""
 
-    def get_globals(self) -> Environment:
+    def get_globals(self) -> GlobalEnvironment:
         """Return the environment containing the globals of the interpreter."""
 
-    def execute_block(self, statements: list[s.Stmt], env: Environment) -> None:
-        """Execute a block of code."""
+    def execute_function(
+        self, function: s.Function, frame: Environment, closure: list[Cell]
+    ) -> None:
+        """Execute the body of a function, in its frame and closure."""
 
 
 @runtime_checkable
@@ -28,67 +31,215 @@ class LoxCallable(Protocol):
 
 
 class LoxFunction:
+    """A function and the cells of the variables it captures: its frames do
+    not link to the scopes around it, so they never outlive a call."""
+
     def __init__(
         self,
         declaration: s.Function,
-        closure: Environment,
+        closure: list[Cell],
         is_initializer: bool,
+        this: LoxInstance | None = None,
     ):
         self._declaration = declaration
         self._closure = closure
         self._is_initializer = is_initializer
+        self._this = this  # The instance a method is bound to
 
     def call(self, interpreter: CallableVisitor, arguments: list[Any]) -> Any:
-        env = Environment.nest(self._closure)
-        for par, arg in zip(self._declaration.params, arguments):
-            env.define(par.lexeme, arg)
+        # The arguments are a fresh list: they become the frame
+        if self._this is not None:
+            arguments.insert(0, self._this)
+        return self.invoke(interpreter, arguments)
+
+    def invoke(self, interpreter: CallableVisitor, slots: list[Any]) -> Any:
+        """Run the function in a frame made of the slots: a method finds
+        its instance in the first one, so it runs without being bound"""
+        this = slots[0] if self._is_initializer else None
+        for slot in self._declaration.boxed_params:
+            slots[slot] = Cell(slots[slot])
+        frame = Environment(None, slots)
 
         try:
-            interpreter.execute_block(self._declaration.body, env)
+            self._execute(interpreter, frame)
         except Return as r:
             if self._is_initializer:
-                return self._closure.get_at(0, "this")
+                return this
             return r.value
+        return this
 
-        if self._is_initializer:
-            return self._closure.get_at(0, "this")
-        return None
+    def _execute(
+        self, interpreter: CallableVisitor, frame: Environment
+    ) -> None:
+        interpreter.execute_function(self._declaration, frame, self._closure)
 
     def arity(self) -> int:
         return len(self._declaration.params)
 
     def bind(self, instance: LoxInstance) -> LoxFunction:
-        env = Environment.nest(self._closure)
-        env.define("this", instance)
-        return LoxFunction(self._declaration, env, self._is_initializer)
+        return LoxFunction(
+            self._declaration, self._closure, self._is_initializer, instance
+        )
 
     def __repr__(self) -> str:
         return f"<function {self._declaration.name.lexeme}>"
 
 
+# Keys a property use site remembers before it stops caching
+POLYMORPHIC_LIMIT = 4
+
+# What an inline cache is keyed by, and what it holds
+K = TypeVar("K")
+V = TypeVar("V")
+
+
+class Shape:
+    """The layout of the fields of instances: the slots of their values by
+    name. The instances of a class that got the same fields in the same
+    order share it. Adding a field moves an instance to the next shape,
+    through a transition recorded for the next instances."""
+
+    __slots__ = ("klass", "indexes", "_transitions")
+
+    def __init__(self, klass: LoxClass, indexes: dict[str, int]):
+        self.klass = klass
+        self.indexes = indexes
+        self._transitions: dict[str, Shape] = {}
+
+    def add(self, name: str) -> Shape:
+        if (shape := self._transitions.get(name)) is None:
+            indexes = {**self.indexes, name: len(self.indexes)}
+            shape = self._transitions[name] = Shape(self.klass, indexes)
+        return shape
+
+    def find(self, name: str) -> int | LoxFunction | None:
+        """What a property is: the slot of a field, or else the method, None
+        if there is none"""
+        if (index := self.indexes.get(name)) is not None:
+            return index
+        return self.klass.find_method(name)
+
+    def place(self, name: str) -> tuple[int, Shape]:
+        """Where a field goes: its slot and the shape after the assignment"""
+        if (index := self.indexes.get(name)) is not None:
+            return index, self
+        return len(self.indexes), self.add(name)
+
+
+class InlineCache(ABC, Generic[K, V]):
+    """Inline cache of a property use site: what its name resolves to for
+    each key it saw, a class or a shape. Neither changes once created, so
+    the entries never go stale. The first key is checked first and a few
+    more go in a small table. A site that sees more than POLYMORPHIC_LIMIT
+    keys is megamorphic: it stops caching."""
+
+    __slots__ = ("name", "_key", "_value", "_others")
+
+    def __init__(self, name: str):
+        self.name = name
+        self._key: K | None = None
+        self._value: V  # Set together with _key
+        self._others: dict[K, V] | None = {}
+
+    def find(self, key: K) -> V:
+        if key is self._key:
+            return self._value
+        others = self._others
+        if others is None:
+            return self._resolve(key)
+        if key in others:
+            return others[key]
+        value = self._resolve(key)
+        if self._key is None:
+            self._key, self._value = key, value
+        elif len(others) < POLYMORPHIC_LIMIT - 1:
+            others[key] = value
+        else:
+            self._others = None
+        return value
+
+    @abstractmethod
+    def _resolve(self, key: K) -> V:
+        """What the name resolves to for a key not in the cache"""
+
+
+class MethodCache(InlineCache["LoxClass", LoxFunction | None]):
+    """The method of a class, None if there is none"""
+
+    def _resolve(self, key: LoxClass) -> LoxFunction | None:
+        return key.find_method(self.name)
+
+
+class GetCache(InlineCache[Shape, int | LoxFunction | None]):
+    """What a property of instances of a shape is: the slot of a field, or
+    else the method, None if there is none"""
+
+    def _resolve(self, key: Shape) -> int | LoxFunction | None:
+        return key.find(self.name)
+
+
+class SetCache(InlineCache[Shape, tuple[int, Shape]]):
+    """Where a field of instances of a shape goes: its slot and the shape
+    of the instance after the assignment"""
+
+    def _resolve(self, key: Shape) -> tuple[int, Shape]:
+        return key.place(self.name)
+
+
 class LoxInstance:
+    """The fields of an instance are the values of the slots of its shape"""
+
+    __slots__ = ("shape", "values")
+
     def __init__(self, klass: LoxClass):
-        self._klass = klass
-        self._fields: dict[str, Any] = {}
+        self.shape: Shape = klass.shape
+        self.values: list[Any] = []
 
-    def get(self, name: Token) -> Any:
-        notFound = object()  # Use this to allow 'None' in the dictionary
-        if (value := self._fields.get(name.lexeme, notFound)) is not notFound:
-            return value
-        method = self._klass.find_method(name.lexeme)
-        if method is not None:
-            return method.bind(self)
+    def get(self, name: Token, cache: GetCache | None = None) -> Any:
+        if cache is None:
+            found = self.shape.find(name.lexeme)
+        else:
+            found = cache.find(self.shape)
+        if isinstance(found, int):
+            return self.values[found]
+        if found is not None:
+            return found.bind(self)
 
         raise PyloxRuntimeError(name, f"Undefined property '{name.lexeme}'.")
 
-    def set(self, name: Token, value: Any) -> None:
-        self._fields[name.lexeme] = value
+    def method(self, name: Token, cache: GetCache) -> LoxFunction | None:
+        """The method the property is, not bound, or None if it is a
+        field"""
+        found: int | LoxFunction | None = cache.find(self.shape)
+        if isinstance(found, int):
+            return None
+        if found is None:
+            raise PyloxRuntimeError(
+                name, f"Undefined property '{name.lexeme}'."
+            )
+        return found
+
+    def set(
+        self, name: Token, value: Any, cache: SetCache | None = None
+    ) -> None:
+        if cache is None:
+            index, shape = self.shape.place(name.lexeme)
+        else:
+            index, shape = cache.find(self.shape)
+        if shape is self.shape:
+            self.values[index] = value
+        else:
+            self.shape = shape
+            self.values.append(value)
 
     def __repr__(self) -> str:
-        return f"{self._klass._name} instance"
+        return f"{self.shape.klass._name} instance"
 
 
 class LoxClass:
+    """The methods of a class include the inherited ones, copied down when
+    it is created, so a lookup is one dict access at any depth"""
+
     def __init__(
         self,
         name: str,
@@ -97,27 +248,29 @@ class LoxClass:
     ):
         self._name = name
         self._superclass = superclass
-        self._methods = methods
+        if superclass is not None:
+            methods = superclass._methods | methods
+        self._methods: dict[str, LoxFunction] = methods
+        self.initializer = methods.get("init")
+        self._arity = 0 if self.initializer is None else (
+            self.initializer.arity()
+        )
+        self.shape: Shape = Shape(self, {})  # Of its instances without fields
 
     def call(
         self, interpreter: CallableVisitor, arguments: list[Any]
     ) -> LoxInstance:
         instance = LoxInstance(self)
-        initializer = self.find_method("init")
-        if initializer is not None:
-            initializer.bind(instance).call(interpreter, arguments)
+        if self.initializer is not None:
+            arguments.insert(0, instance)
+            self.initializer.invoke(interpreter, arguments)
         return instance
 
     def find_method(self, name: str) -> LoxFunction | None:
-        if (method := self._methods.get(name)) is not None:
-            return method
-        if self._superclass is not None:
-            return self._superclass.find_method(name)
-        return None
+        return self._methods.get(name)
 
     def arity(self) -> int:
-        initializer = self.find_method("init")
-        return 0 if initializer is None else initializer.arity()
+        return self._arity
 
     def __repr__(self) -> str:
         return f"<class {self._name} >"
@@ -3,11 +3,17 @@ from lox import Lox
 import logging
 
 
+# Opts in to caching the resolved program of the script, see astcache
+CACHE_FLAG = "--cache"
+
+
 def main(args: list[str]) -> None:
     """Run the script or start the repl."""
 
     logging.basicConfig(level=logging.DEBUG)
-    lox = Lox()
+    use_cache = CACHE_FLAG in args
+    args = [arg for arg in args if arg != CACHE_FLAG]
+    lox = Lox(use_cache=use_cache)
 
     if len(args) == 1:
         logging.debug("run_prompt")
@@ -17,7 +23,7 @@ def main(args: list[str]) -> None:
         logging.debug(f"run_file {script}")
         lox.run_file(script)
     else:
-        print("Usage: python main.py [script]")
+        print(f"Usage: python main.py [{CACHE_FLAG}] [script]")
         sys.exit(64)
 
 
@@ -0,0 +1,487 @@
+from __future__ import annotations  # NOTE: No need since python 3.11+
+from array import array
+from dataclasses import dataclass, field
+from enum import IntEnum, auto
+from typing import Any
+import expr as e
+import stmt as s
+from pyloxtoken import Token, TokenType
+from loxcallable import GetCache, InlineCache, MethodCache, SetCache
+
+
+class OpCode(IntEnum):
+    CONSTANT = auto()  # constant index
+    NIL = auto()
+    TRUE = auto()
+    FALSE = auto()
+    POP = auto()
+    POPN = auto()  # count
+    GET_LOCAL = auto()  # frame slot
+    SET_LOCAL = auto()  # frame slot
+    GET_CELL = auto()  # frame slot of a boxed local
+    SET_CELL = auto()  # frame slot of a boxed local
+    CELL = auto()  # Box the value on top of the stack
+    GET_UPVALUE = auto()  # closure index
+    SET_UPVALUE = auto()  # closure index
+    GET_GLOBAL = auto()  # constant index of a GlobalSite
+    SET_GLOBAL = auto()  # constant index of a GlobalSite
+    DEFINE_GLOBAL = auto()  # constant index of the name token
+    GET_PROPERTY = auto()  # constant index of the property site
+    SET_PROPERTY = auto()  # constant index of the property site
+    ASSERT_INSTANCE = auto()  # Check the target of a property assignment
+    GET_SUPER = auto()  # constant index of the method property site
+    EQUAL = auto()
+    NOT_EQUAL = auto()
+    GREATER = auto()
+    GREATER_EQUAL = auto()
+    LESS = auto()
+    LESS_EQUAL = auto()
+    ADD = auto()
+    SUBTRACT = auto()
+    MULTIPLY = auto()
+    DIVIDE = auto()
+    NOT = auto()
+    NEGATE = auto()
+    PRINT = auto()
+    JUMP = auto()  # target
+    JUMP_IF_FALSE = auto()  # target; leaves the condition on the stack
+    CALL = auto()  # argument count
+    METHOD = auto()  # constant index of the property site
+    SUPER_METHOD = auto()  # constant index of the method property site
+    INVOKE = auto()  # argument count
+    CLOSURE = auto()  # constant index of a Prototype
+    CLASS = auto()  # constant index of the name, method count, has super
+    SUPERCLASS = auto()  # Check and box the superclass on top of the stack
+    RETURN = auto()
+
+
+_BINARY = {
+    TokenType.BANG_EQUAL: OpCode.NOT_EQUAL,
+    TokenType.EQUAL_EQUAL: OpCode.EQUAL,
+    TokenType.GREATER: OpCode.GREATER,
+    TokenType.GREATER_EQUAL: OpCode.GREATER_EQUAL,
+    TokenType.LESS: OpCode.LESS,
+    TokenType.LESS_EQUAL: OpCode.LESS_EQUAL,
+    TokenType.PLUS: OpCode.ADD,
+    TokenType.MINUS: OpCode.SUBTRACT,
+    TokenType.STAR: OpCode.MULTIPLY,
+    TokenType.SLASH: OpCode.DIVIDE,
+}
+
+
+@dataclass
+class Chunk:
+    """Instructions and their operands, one word each, and the constants
+    they refer to"""
+
+    code: array = field(default_factory=lambda: array("I"))
+    constants: list[Any] = field(default_factory=list)
+    # Offset of an instruction that can fail -> token to report the error at
+    tokens: dict[int, Token] = field(default_factory=dict)
+
+
+@dataclass
+class Prototype:
+    """A compiled function, before it captures anything"""
+
+    name: str
+    arity: int
+    chunk: Chunk
+    # What a closure captures: (is a local of the enclosing frame, index)
+    upvalues: list[tuple[bool, int]]
+    boxed_params: tuple[int, ...]
+    is_initializer: bool = False
+
+
+class GlobalSite:
+    """A global used by an instruction, with its slot cached as in the
+    interpreter"""
+
+    __slots__ = ("name", "slot", "version")
+
+    def __init__(self, name: Token):
+        self.name = name
+        self.slot = 0
+        self.version: object = None
+
+
+class PropertySite:
+    """A property used by an instruction, with its inline cache"""
+
+    __slots__ = ("name", "cache")
+
+    def __init__(self, name: Token, cache: InlineCache):
+        self.name = name
+        self.cache = cache
+
+
+class _FunctionState:
+    def __init__(self, enclosing: _FunctionState | None, locals: int):
+        self.enclosing = enclosing
+        self.chunk = Chunk()
+        # First frame slot of each open scope; the top level code only has
+        # the scopes of its blocks, outside of them variables are global
+        self.scopes: list[int] = []
+        self.locals = locals
+
+
+class BytecodeCompiler:
+    """Compile a resolved program to bytecode. The frame of a function holds
+    its locals, in the order and scopes in which the resolver numbered them,
+    followed by the temporaries of the expressions."""
+
+    def __init__(self, isrepl: bool):
+        self._isrepl = isrepl
+        self._function = _FunctionState(None, 0)
+
+    def compile(self, statements: list[s.Stmt]) -> Prototype:
+        """Compile the top level code, as a function with no parameters"""
+        for statement in statements:
+            self._statement(statement)
+        self._emit(OpCode.NIL)
+        self._emit(OpCode.RETURN)
+        return Prototype("script", 0, self._function.chunk, [], ())
+
+    def _statement(self, statement: s.Stmt) -> None:
+        statement.accept(self)
+
+    def _expression(self, expression: e.Expr) -> None:
+        expression.accept(self)
+
+    def _emit(
+        self, op: OpCode, *operands: int, token: Token | None = None
+    ) -> None:
+        chunk = self._function.chunk
+        if token is not None:
+            chunk.tokens[len(chunk.code)] = token
+        chunk.code.append(op)
+        chunk.code.extend(operands)
+
+    def _constant(self, value: Any) -> int:
+        constants = self._function.chunk.constants
+        constants.append(value)
+        return len(constants) - 1
+
+    def _jump(self, op: OpCode) -> int:
+        """Emit a jump to be patched, return the offset of its target"""
+        self._emit(op, 0)
+        return len(self._function.chunk.code) - 1
+
+    def _patch(self, offset: int) -> None:
+        self._function.chunk.code[offset] = len(self._function.chunk.code)
+
+    def _here(self) -> int:
+        return len(self._function.chunk.code)
+
+    def _is_global(self) -> bool:
+        return self._function.enclosing is None and not self._function.scopes
+
+    def _begin_scope(self) -> None:
+        self._function.scopes.append(self._function.locals)
+
+    def _end_scope(self, pop: bool = True) -> None:
+        first = self._function.scopes.pop()
+        if pop and (count := self._function.locals - first):
+            self._emit(OpCode.POPN, count)
+        self._function.locals = first
+
+    def _declare_local(self) -> int:
+        """The value on top of the stack becomes the next local"""
+        self._function.locals += 1
+        return self._function.locals - 1
+
+    def _frame_slot(self, depth: int, slot: int) -> int:
+        return self._function.scopes[-1 - depth] + slot
+
+    def _load(self, expr: e.Super | e.This | e.Variable) -> None:
+        match expr.depth:
+            case e.GLOBAL:
+                # this and super are always resolved in a local scope
+                assert isinstance(expr, e.Variable), "Error: unresolved."
+                self._emit(
+                    OpCode.GET_GLOBAL,
+                    self._constant(GlobalSite(expr.name)),
+                    token=expr.name,
+                )
+            case e.UPVALUE:
+                self._emit(OpCode.GET_UPVALUE, expr.slot)
+            case depth:
+                op = OpCode.GET_CELL if expr.boxed else OpCode.GET_LOCAL
+                self._emit(op, self._frame_slot(depth, expr.slot))
+
+    def _prototype(self, stmt: s.Function, is_method: bool = False) -> int:
+        """Compile a function, return the constant index of its prototype.
+        The instance takes the first slot of the frame of a method."""
+        enclosing = self._function
+        locals = len(stmt.params) + is_method
+        self._function = _FunctionState(enclosing, locals)
+        self._function.scopes.append(0)
+        for statement in stmt.body:
+            self._statement(statement)
+        self._emit(OpCode.NIL)
+        self._emit(OpCode.RETURN)
+        chunk = self._function.chunk
+        self._function = enclosing
+        upvalues = [
+            (False, slot) if depth == e.UPVALUE
+            else (True, self._frame_slot(depth, slot))
+            for depth, slot in stmt.upvalues
+        ]
+        return self._constant(
+            Prototype(
+                stmt.name.lexeme,
+                len(stmt.params),
+                chunk,
+                upvalues,
+                stmt.boxed_params,
+                is_method and stmt.name.lexeme == "init",
+            )
+        )
+
+    def visit_block_stmt(self, stmt: s.Block) -> None:
+        if stmt.scoped:
+            self._begin_scope()
+        for statement in stmt.statements:
+            self._statement(statement)
+        if stmt.scoped:
+            self._end_scope()
+
+    def visit_class_stmt(self, stmt: s.Class) -> None:
+        is_global = self._is_global()
+        cell = None
+        if stmt.boxed:
+            # The methods capture the cell of the class before it exists
+            self._emit(OpCode.NIL)
+            self._emit(OpCode.CELL)
+            cell = self._declare_local()
+        if stmt.superclass is not None:
+            self._expression(stmt.superclass)
+            self._emit(OpCode.SUPERCLASS, token=stmt.superclass.name)
+            self._begin_scope()
+            self._declare_local()
+        for method in stmt.methods:
+            self._emit(OpCode.CLOSURE, self._prototype(method, is_method=True))
+        self._emit(
+            OpCode.CLASS,
+            self._constant(stmt.name.lexeme),
+            len(stmt.methods),
+            stmt.superclass is not None,
+        )
+        if stmt.superclass is not None:
+            self._end_scope(pop=False)  # CLASS takes the superclass
+        if is_global:
+            self._emit(OpCode.DEFINE_GLOBAL, self._constant(stmt.name))
+        elif cell is not None:
+            self._emit(OpCode.SET_CELL, cell)
+            self._emit(OpCode.POP)
+        else:
+            self._declare_local()
+
+    def visit_expression_stmt(self, stmt: s.Expression) -> None:
+        self._expression(stmt.expression)
+        self._emit(OpCode.PRINT if self._isrepl else OpCode.POP)
+
+    def visit_for_stmt(self, stmt: s.For) -> None:
+        scoped = isinstance(stmt.initializer, s.Var)
+        if scoped:
+            self._begin_scope()
+        if stmt.initializer is not None:
+            self._statement(stmt.initializer)
+        start = self._here()
+        loop_exit = None
+        if stmt.condition is not None:
+            self._expression(stmt.condition)
+            loop_exit = self._jump(OpCode.JUMP_IF_FALSE)
+            self._emit(OpCode.POP)
+        self._statement(stmt.body)
+        if stmt.increment is not None:
+            self._expression(stmt.increment)
+            self._emit(OpCode.POP)
+        self._emit(OpCode.JUMP, start)
+        if loop_exit is not None:
+            self._patch(loop_exit)
+            self._emit(OpCode.POP)
+        if scoped:
+            self._end_scope()
+
+    def visit_function_stmt(self, stmt: s.Function) -> None:
+        if self._is_global():
+            self._emit(OpCode.CLOSURE, self._prototype(stmt))
+            self._emit(OpCode.DEFINE_GLOBAL, self._constant(stmt.name))
+        elif stmt.boxed:
+            # A function that captures itself needs its cell first
+            self._emit(OpCode.NIL)
+            self._emit(OpCode.CELL)
+            cell = self._declare_local()
+            self._emit(OpCode.CLOSURE, self._prototype(stmt))
+            self._emit(OpCode.SET_CELL, cell)
+            self._emit(OpCode.POP)
+        else:
+            self._emit(OpCode.CLOSURE, self._prototype(stmt))
+            self._declare_local()
+
+    def visit_if_stmt(self, stmt: s.If) -> None:
+        self._expression(stmt.condition)
+        otherwise = self._jump(OpCode.JUMP_IF_FALSE)
+        self._emit(OpCode.POP)
+        self._statement(stmt.then_branch)
+        end = self._jump(OpCode.JUMP)
+        self._patch(otherwise)
+        self._emit(OpCode.POP)
+        if stmt.else_branch is not None:
+            self._statement(stmt.else_branch)
+        self._patch(end)
+
+    def visit_print_stmt(self, stmt: s.Print) -> None:
+        self._expression(stmt.expression)
+        self._emit(OpCode.PRINT)
+
+    def visit_return_stmt(self, stmt: s.Return) -> None:
+        if stmt.value is None:
+            self._emit(OpCode.NIL)
+        else:
+            self._expression(stmt.value)
+        self._emit(OpCode.RETURN)
+
+    def visit_var_stmt(self, stmt: s.Var) -> None:
+        if stmt.initializer is None:
+            self._emit(OpCode.NIL)
+        else:
+            self._expression(stmt.initializer)
+        if self._is_global():
+            self._emit(OpCode.DEFINE_GLOBAL, self._constant(stmt.name))
+            return
+        if stmt.boxed:
+            self._emit(OpCode.CELL)
+        self._declare_local()
+
+    def visit_while_stmt(self, stmt: s.While) -> None:
+        start = self._here()
+        self._expression(stmt.condition)
+        loop_exit = self._jump(OpCode.JUMP_IF_FALSE)
+        self._emit(OpCode.POP)
+        self._statement(stmt.body)
+        self._emit(OpCode.JUMP, start)
+        self._patch(loop_exit)
+        self._emit(OpCode.POP)
+
+    def visit_assign_expr(self, expr: e.Assign) -> None:
+        self._expression(expr.value)
+        match expr.depth:
+            case e.GLOBAL:
+                self._emit(
+                    OpCode.SET_GLOBAL,
+                    self._constant(GlobalSite(expr.name)),
+                    token=expr.name,
+                )
+            case e.UPVALUE:
+                self._emit(OpCode.SET_UPVALUE, expr.slot)
+            case depth:
+                op = OpCode.SET_CELL if expr.boxed else OpCode.SET_LOCAL
+                self._emit(op, self._frame_slot(depth, expr.slot))
+
+    def visit_binary_expr(self, expr: e.Binary) -> None:
+        self._expression(expr.left)
+        self._expression(expr.right)
+        self._emit(_BINARY[expr.operator.token_type], token=expr.operator)
+
+    def visit_call_expr(self, expr: e.Call) -> None:
+        """A method called right away is not bound: it goes on the stack
+        below the instance, that takes the first slot of its frame"""
+        match expr.callee:
+            case e.Get() as target:
+                self._expression(target.obj)
+                self._emit(
+                    OpCode.METHOD,
+                    self._constant(
+                        PropertySite(target.name, GetCache(target.name.lexeme))
+                    ),
+                    token=target.name,
+                )
+                op = OpCode.INVOKE
+            case e.Super() as target:
+                assert target.this is not None, "Error: unresolved instance."
+                self._super_method(target, OpCode.SUPER_METHOD)
+                self._load(target.this)
+                op = OpCode.INVOKE
+            case callee:
+                self._expression(callee)
+                op = OpCode.CALL
+        for argument in expr.arguments:
+            self._expression(argument)
+        self._emit(op, len(expr.arguments), token=expr.paren)
+
+    def visit_get_expr(self, expr: e.Get) -> None:
+        self._expression(expr.obj)
+        self._emit(
+            OpCode.GET_PROPERTY,
+            self._constant(PropertySite(expr.name, GetCache(expr.name.lexeme))),
+            token=expr.name,
+        )
+
+    def visit_grouping_expr(self, expr: e.Grouping) -> None:
+        self._expression(expr.expression)
+
+    def visit_literal_expr(self, expr: e.Literal) -> None:
+        match expr.value:
+            case None:
+                self._emit(OpCode.NIL)
+            case True:
+                self._emit(OpCode.TRUE)
+            case False:
+                self._emit(OpCode.FALSE)
+            case value:
+                self._emit(OpCode.CONSTANT, self._constant(value))
+
+    def visit_logical_expr(self, expr: e.Logical) -> None:
+        self._expression(expr.left)
+        if expr.operator.token_type is TokenType.OR:
+            otherwise = self._jump(OpCode.JUMP_IF_FALSE)
+            end = self._jump(OpCode.JUMP)
+            self._patch(otherwise)
+        else:
+            end = self._jump(OpCode.JUMP_IF_FALSE)
+        self._emit(OpCode.POP)
+        self._expression(expr.right)
+        self._patch(end)
+
+    def visit_set_expr(self, expr: e.Set) -> None:
+        self._expression(expr.obj)
+        if not isinstance(expr.obj, e.This):
+            # As in the interpreter, the target is checked before the value
+            # is evaluated
+            self._emit(OpCode.ASSERT_INSTANCE, token=expr.name)
+        self._expression(expr.value)
+        self._emit(
+            OpCode.SET_PROPERTY,
+            self._constant(PropertySite(expr.name, SetCache(expr.name.lexeme))),
+            token=expr.name,
+        )
+
+    def visit_super_expr(self, expr: e.Super) -> None:
+        assert expr.this is not None, "Error: unresolved instance."
+        self._load(expr.this)
+        self._super_method(expr, OpCode.GET_SUPER)
+
+    def _super_method(self, expr: e.Super, op: OpCode) -> None:
+        self._load(expr)
+        self._emit(
+            op,
+            self._constant(
+                PropertySite(expr.method, MethodCache(expr.method.lexeme))
+            ),
+            token=expr.method,
+        )
+
+    def visit_this_expr(self, expr: e.This) -> None:
+        self._load(expr)
+
+    def visit_unary_expr(self, expr: e.Unary) -> None:
+        self._expression(expr.right)
+        if expr.operator.token_type is TokenType.BANG:
+            self._emit(OpCode.NOT)
+        else:
+            self._emit(OpCode.NEGATE, token=expr.operator)
+
+    def visit_variable_expr(self, expr: e.Variable) -> None:
+        self._load(expr)
@@ -0,0 +1,781 @@
+from __future__ import annotations  # NOTE: No need since python 3.11+
+import operator
+from typing import Any, Callable
+import expr as e
+import stmt as s
+from pyloxtoken import Token, TokenType
+from exceptions import PyloxRuntimeError, Return
+from environment import Cell, Environment
+from error_handler import report
+from loxcallable import (
+    CallableVisitor,
+    LoxCallable,
+    LoxClass,
+    LoxFunction,
+    GetCache,
+    LoxInstance,
+    MethodCache,
+    SetCache,
+    Shape,
+)
+from pyloxinterpreter import (
+    Interpreter,
+    binary_operation,
+    pylox_stringify,
+    unary_operation,
+)
+
+# A compiled node: it runs in the current scope and closure
+Code = Callable[[Environment, list[Cell]], Any]
+
+# Operators that only take numbers, applied directly to two floats
+_NUMERIC = {
+    TokenType.MINUS: operator.sub,
+    TokenType.STAR: operator.mul,
+    TokenType.GREATER: operator.gt,
+    TokenType.GREATER_EQUAL: operator.ge,
+    TokenType.LESS: operator.lt,
+    TokenType.LESS_EQUAL: operator.le,
+}
+
+# Operators that take two operands of the same type without failing
+_SPECIALIZED = {TokenType.PLUS: operator.add, **_NUMERIC}
+
+
+def _call_error(paren: Token, function: Any, count: int) -> PyloxRuntimeError:
+    if not isinstance(function, LoxCallable):
+        return PyloxRuntimeError(paren, "Can only call functions and classes")
+    return PyloxRuntimeError(
+        paren,
+        f"Expected {function.arity()} arguments"
+        f"but got {count} instead",
+    )
+
+
+def _sequence(statements: list[Code]) -> Code:
+    match statements:
+        case []:
+            return lambda env, closure: None
+        case [statement]:
+            return statement
+
+    def run(env: Environment, closure: list[Cell]) -> None:
+        for statement in statements:
+            statement(env, closure)
+
+    return run
+
+
+class CompiledFunction(LoxFunction):
+    """A function whose body is compiled once, when it is declared"""
+
+    def __init__(
+        self,
+        declaration: s.Function,
+        closure: list[Cell],
+        is_initializer: bool,
+        body: Code,
+        this: LoxInstance | None = None,
+    ):
+        super().__init__(declaration, closure, is_initializer, this)
+        self._body = body
+
+    def _execute(
+        self, interpreter: CallableVisitor, frame: Environment
+    ) -> None:
+        self._body(frame, self._closure)
+
+    def bind(self, instance: LoxInstance) -> LoxFunction:
+        return CompiledFunction(
+            self._declaration,
+            self._closure,
+            self._is_initializer,
+            self._body,
+            instance,
+        )
+
+
+class Feedback:
+    """What the tree walker saw while code warmed up: the operand type of
+    the binary operations, object once they differed, and the shape of the
+    instances at the property sites, None once they differed"""
+
+    def __init__(self) -> None:
+        self.types: dict[e.Binary, type] = {}
+        self.shapes: dict[e.Get | e.Set, Shape | None] = {}
+
+
+class Compiler:
+    """Turn a resolved program into nested python closures. Everything that
+    does not depend on the values, like the operator to apply or where a
+    variable lives, is decided here once instead of at each evaluation.
+    With a deoptimize callback, the binary operations and the property
+    sites specialise on what the tree walker saw, in feedback, and call it
+    when they see something else."""
+
+    def __init__(
+        self,
+        interpreter: Interpreter,
+        isrepl: bool,
+        deoptimize: Callable[[], None] | None = None,
+        feedback: Feedback | None = None,
+    ):
+        self._interpreter = interpreter
+        self._globals = interpreter.get_globals()
+        self._isrepl = isrepl
+        self._deoptimize = deoptimize
+        self._feedback = feedback
+
+    def compile(self, statement: s.Stmt) -> Code:
+        code: Code = statement.accept(self)
+        return code
+
+    def compile_statements(self, statements: list[s.Stmt]) -> Code:
+        return _sequence([self.compile(statement) for statement in statements])
+
+    def _expression(self, expression: e.Expr) -> Code:
+        code: Code = expression.accept(self)
+        return code
+
+    def _function(
+        self, stmt: s.Function, is_initializer: bool
+    ) -> Callable[[Environment, list[Cell]], CompiledFunction]:
+        """Code that creates the function, capturing its closure"""
+        body = self.compile_statements(stmt.body)
+        upvalues = stmt.upvalues
+
+        def function(
+            env: Environment, closure: list[Cell]
+        ) -> CompiledFunction:
+            cells = [
+                closure[slot] if depth == e.UPVALUE else env.get_at(depth, slot)
+                for depth, slot in upvalues
+            ]
+            return CompiledFunction(stmt, cells, is_initializer, body)
+
+        return function
+
+    def _local(self, expr: e.Super | e.This | e.Variable) -> Code:
+        """Read a variable that is not global"""
+        depth, slot = expr.depth, expr.slot
+        if depth == e.UPVALUE:
+            return lambda env, closure: closure[slot].value
+        match depth, expr.boxed:
+            case 0, False:
+                return lambda env, closure: env.slots[slot]
+            case 0, True:
+                return lambda env, closure: env.slots[slot].value
+            case 1, False:
+
+                def enclosing(env: Environment, closure: list[Cell]) -> Any:
+                    parent = env.enclosing
+                    assert parent is not None, "Error: unresolved variable."
+                    return parent.slots[slot]
+
+                return enclosing
+            case _, False:
+                return lambda env, closure: env.get_at(depth, slot)
+        return lambda env, closure: env.get_at(depth, slot).value
+
+    def _global_slot(self, name: Token) -> Callable[[], int]:
+        """The slot of a global, cached by the use site until the globals
+        table changes version"""
+        globals = self._globals
+        slot, version = 0, None
+
+        def global_slot() -> int:
+            nonlocal slot, version
+            if version is not globals.version:
+                slot = globals.index(name)
+                version = globals.version
+            return slot
+
+        return global_slot
+
+    def visit_block_stmt(self, stmt: s.Block) -> Code:
+        statements = self.compile_statements(stmt.statements)
+        if not stmt.scoped:
+            return statements
+        return lambda env, closure: statements(Environment(env), closure)
+
+    def visit_class_stmt(self, stmt: s.Class) -> Code:
+        name = stmt.name.lexeme
+        # The code that loads the superclass, and its name for errors
+        superclass: tuple[Code, Token] | None = None
+        if stmt.superclass is not None:
+            superclass = (
+                self._expression(stmt.superclass),
+                stmt.superclass.name,
+            )
+        methods = [
+            (method.name.lexeme,
+             self._function(method, method.name.lexeme == "init"))
+            for method in stmt.methods
+        ]
+        boxed = stmt.boxed
+
+        def klass(env: Environment, closure: list[Cell]) -> None:
+            parent = None
+            if superclass is not None:
+                load, token = superclass
+                parent = load(env, closure)
+                if type(parent) is not LoxClass:
+                    raise PyloxRuntimeError(token, "Superclass must be a class")
+            # As in the interpreter: a boxed class is declared first, for
+            # the methods to capture its cell
+            cell = Cell() if boxed else None
+            if cell is not None:
+                env.define(name, cell)
+            scope = env
+            if parent is not None:
+                scope = Environment(env)
+                scope.define("super", Cell(parent))
+            created = LoxClass(
+                name,
+                parent,
+                {lexeme: method(scope, closure) for lexeme, method in methods},
+            )
+            if cell is None:
+                env.define(name, created)
+            else:
+                cell.value = created
+
+        return klass
+
+    def visit_expression_stmt(self, stmt: s.Expression) -> Code:
+        expression = self._expression(stmt.expression)
+        if not self._isrepl:
+            return expression
+        return lambda env, closure: print(
+            pylox_stringify(expression(env, closure))
+        )
+
+    def visit_for_stmt(self, stmt: s.For) -> Code:
+        initializer = None
+        if stmt.initializer is not None:
+            initializer = self.compile(stmt.initializer)
+        loop = self.loop(stmt.condition, stmt.body, stmt.increment)
+        scoped = isinstance(stmt.initializer, s.Var)
+
+        def for_loop(env: Environment, closure: list[Cell]) -> None:
+            if scoped:
+                env = Environment(env)
+            if initializer is not None:
+                initializer(env, closure)
+            loop(env, closure)
+
+        return for_loop
+
+    def visit_function_stmt(self, stmt: s.Function) -> Code:
+        name = stmt.name.lexeme
+        function = self._function(stmt, False)
+        if not stmt.boxed:
+            return lambda env, closure: env.define(name, function(env, closure))
+
+        def declare(env: Environment, closure: list[Cell]) -> None:
+            # A function that captures itself needs its cell first
+            cell = Cell()
+            env.define(name, cell)
+            cell.value = function(env, closure)
+
+        return declare
+
+    def visit_if_stmt(self, stmt: s.If) -> Code:
+        condition = self._expression(stmt.condition)
+        then_branch = self.compile(stmt.then_branch)
+        if stmt.else_branch is None:
+            def if_then(env: Environment, closure: list[Cell]) -> None:
+                value = condition(env, closure)
+                if value is not None and value is not False:
+                    then_branch(env, closure)
+
+            return if_then
+        else_branch = self.compile(stmt.else_branch)
+
+        def if_else(env: Environment, closure: list[Cell]) -> None:
+            value = condition(env, closure)
+            if value is not None and value is not False:
+                then_branch(env, closure)
+            else:
+                else_branch(env, closure)
+
+        return if_else
+
+    def visit_print_stmt(self, stmt: s.Print) -> Code:
+        expression = self._expression(stmt.expression)
+        return lambda env, closure: print(
+            pylox_stringify(expression(env, closure))
+        )
+
+    def visit_return_stmt(self, stmt: s.Return) -> Code:
+        if stmt.value is None:
+            def return_nil(env: Environment, closure: list[Cell]) -> None:
+                raise Return(None)
+
+            return return_nil
+        value = self._expression(stmt.value)
+
+        def return_value(env: Environment, closure: list[Cell]) -> None:
+            raise Return(value(env, closure))
+
+        return return_value
+
+    def visit_var_stmt(self, stmt: s.Var) -> Code:
+        name = stmt.name.lexeme
+        initializer = None
+        if stmt.initializer is not None:
+            initializer = self._expression(stmt.initializer)
+        boxed = stmt.boxed
+
+        def var(env: Environment, closure: list[Cell]) -> None:
+            value = None
+            if initializer is not None:
+                value = initializer(env, closure)
+            env.define(name, Cell(value) if boxed else value)
+
+        return var
+
+    def visit_while_stmt(self, stmt: s.While) -> Code:
+        return self.loop(stmt.condition, stmt.body, None)
+
+    def loop(
+        self,
+        condition_expr: e.Expr | None,
+        body_stmt: s.Stmt,
+        increment_expr: e.Expr | None,
+    ) -> Code:
+        """The iterations of a loop, without the initializer of a for: it
+        can take over a loop the tree walker started"""
+        condition = None
+        if condition_expr is not None:
+            condition = self._expression(condition_expr)
+        body = self.compile(body_stmt)
+        if increment_expr is not None:
+            increment = self._expression(increment_expr)
+            body = _sequence([body, increment])
+        if condition is None:
+            def forever(env: Environment, closure: list[Cell]) -> None:
+                while True:
+                    body(env, closure)
+
+            return forever
+
+        def loop(env: Environment, closure: list[Cell]) -> None:
+            while (
+                value := condition(env, closure)
+            ) is not None and value is not False:
+                body(env, closure)
+
+        return loop
+
+    def visit_assign_expr(self, expr: e.Assign) -> Code:
+        value = self._expression(expr.value)
+        depth, slot = expr.depth, expr.slot
+        if depth == e.GLOBAL:
+            slots = self._globals.slots
+            global_slot = self._global_slot(expr.name)
+
+            def assign_global(env: Environment, closure: list[Cell]) -> Any:
+                result = value(env, closure)
+                slots[global_slot()] = result
+                return result
+
+            return assign_global
+        if depth == e.UPVALUE:
+            def assign_upvalue(env: Environment, closure: list[Cell]) -> Any:
+                result = closure[slot].value = value(env, closure)
+                return result
+
+            return assign_upvalue
+        if expr.boxed:
+            def assign_cell(env: Environment, closure: list[Cell]) -> Any:
+                result = env.get_at(depth, slot).value = value(env, closure)
+                return result
+
+            return assign_cell
+
+        def assign(env: Environment, closure: list[Cell]) -> Any:
+            result = value(env, closure)
+            env.assign_at(depth, slot, result)
+            return result
+
+        return assign
+
+    def visit_binary_expr(self, expr: e.Binary) -> Code:
+        left = self._expression(expr.left)
+        right = self._expression(expr.right)
+        token = expr.operator
+        if (specialized := self._specialized(expr, left, right)) is not None:
+            return specialized
+        # The fast paths only cover what cannot fail: anything else goes
+        # through binary_operation, for its checks and error messages
+        match token.token_type:
+            case TokenType.PLUS:
+                def plus(env: Environment, closure: list[Cell]) -> Any:
+                    a, b = left(env, closure), right(env, closure)
+                    if (t := type(a)) is type(b) and (t is float or t is str):
+                        return a + b
+                    return binary_operation(token, a, b)
+
+                return plus
+            case TokenType.SLASH:
+                def divide(env: Environment, closure: list[Cell]) -> Any:
+                    a, b = left(env, closure), right(env, closure)
+                    if type(a) is float and type(b) is float and b:
+                        return a / b
+                    return binary_operation(token, a, b)
+
+                return divide
+            case TokenType.EQUAL_EQUAL:
+                return lambda env, closure: (
+                    left(env, closure) == right(env, closure)
+                )
+            case TokenType.BANG_EQUAL:
+                return lambda env, closure: (
+                    left(env, closure) != right(env, closure)
+                )
+        numeric = _NUMERIC[token.token_type]
+
+        def arithmetic(env: Environment, closure: list[Cell]) -> Any:
+            a, b = left(env, closure), right(env, closure)
+            if type(a) is float and type(b) is float:
+                return numeric(a, b)
+            return binary_operation(token, a, b)
+
+        return arithmetic
+
+    def _specialized(
+        self, expr: e.Binary, left: Code, right: Code
+    ) -> Code | None:
+        """The operation on the only operand type seen so far. Any other
+        type deoptimizes the code, and the feedback forgets the type."""
+        token = expr.operator
+        operation = _SPECIALIZED.get(token.token_type)
+        if (
+            self._deoptimize is None
+            or self._feedback is None
+            or operation is None
+        ):
+            return None
+        feedback = self._feedback.types
+        kind = feedback.get(expr)
+        if kind is not float and (
+            kind is not str or token.token_type is not TokenType.PLUS
+        ):
+            return None
+        deoptimize = self._deoptimize
+
+        def specialized(env: Environment, closure: list[Cell]) -> Any:
+            a, b = left(env, closure), right(env, closure)
+            if type(a) is kind and type(b) is kind:
+                return operation(a, b)
+            feedback[expr] = object
+            deoptimize()
+            return binary_operation(token, a, b)
+
+        return specialized
+
+    def visit_call_expr(self, expr: e.Call) -> Code:
+        arguments = [self._expression(argument) for argument in expr.arguments]
+        match expr.callee:
+            case e.Get() as target:
+                return self._invoke(target, arguments, expr.paren)
+            case e.Super() as target:
+                return self._invoke_super(target, arguments, expr.paren)
+        callee = self._expression(expr.callee)
+        count = len(arguments)
+        paren = expr.paren
+        interpreter = self._interpreter
+
+        def call(env: Environment, closure: list[Cell]) -> Any:
+            function = callee(env, closure)
+            values = [argument(env, closure) for argument in arguments]
+            kind = type(function)
+            if (
+                kind is not CompiledFunction
+                and kind is not LoxFunction
+                and not isinstance(function, LoxCallable)
+            ) or count != function.arity():
+                raise _call_error(paren, function, count)
+            return function.call(interpreter, values)
+
+        return call
+
+    def _invoke(
+        self, target: e.Get, arguments: list[Code], paren: Token
+    ) -> Code:
+        """Call a method with its instance in the first slot of the frame,
+        instead of binding it first"""
+        obj = self._expression(target.obj)
+        name = target.name
+        cache = GetCache(name.lexeme)
+        count = len(arguments)
+        interpreter = self._interpreter
+
+        def call_field(
+            instance: Any, env: Environment, closure: list[Cell]
+        ) -> Any:
+            """A field, or an error"""
+            if not isinstance(instance, LoxInstance):
+                raise PyloxRuntimeError(name, "Only instances have properties")
+            function = instance.get(name, cache)
+            values = [argument(env, closure) for argument in arguments]
+            if not isinstance(function, LoxCallable) or (
+                count != function.arity()
+            ):
+                raise _call_error(paren, function, count)
+            return function.call(interpreter, values)
+
+        def invoke(env: Environment, closure: list[Cell]) -> Any:
+            instance = obj(env, closure)
+            if type(instance) is LoxInstance and (
+                method := instance.method(name, cache)
+            ) is not None:
+                values = [instance]
+                values += [argument(env, closure) for argument in arguments]
+                if count != method.arity():
+                    raise _call_error(paren, method, count)
+                return method.invoke(interpreter, values)
+            return call_field(instance, env, closure)
+
+        if (guard := self._guard(target)) is None:
+            return invoke
+        shape, miss = guard
+        known = shape.find(name.lexeme)
+        if not isinstance(known, LoxFunction) or count != known.arity():
+            return invoke
+        method = known
+
+        def invoke_known(env: Environment, closure: list[Cell]) -> Any:
+            instance = obj(env, closure)
+            if type(instance) is LoxInstance and instance.shape is shape:
+                values = [instance]
+                values += [argument(env, closure) for argument in arguments]
+                return method.invoke(interpreter, values)
+            miss()
+            if type(instance) is LoxInstance and (
+                found := instance.method(name, cache)
+            ) is not None:
+                values = [instance]
+                values += [argument(env, closure) for argument in arguments]
+                if count != found.arity():
+                    raise _call_error(paren, found, count)
+                return found.invoke(interpreter, values)
+            return call_field(instance, env, closure)
+
+        return invoke_known
+
+    def _invoke_super(
+        self, target: e.Super, arguments: list[Code], paren: Token
+    ) -> Code:
+        find_method = self._super_method(target)
+        assert target.this is not None, "Error: unresolved instance."
+        this = self._local(target.this)
+        count = len(arguments)
+        interpreter = self._interpreter
+
+        def invoke_super(env: Environment, closure: list[Cell]) -> Any:
+            method = find_method(env, closure)
+            values = [this(env, closure)]
+            values += [argument(env, closure) for argument in arguments]
+            if count != method.arity():
+                raise _call_error(paren, method, count)
+            return method.invoke(interpreter, values)
+
+        return invoke_super
+
+    def visit_get_expr(self, expr: e.Get) -> Code:
+        obj = self._expression(expr.obj)
+        name = expr.name
+        cache = GetCache(name.lexeme)
+
+        def get_property(env: Environment, closure: list[Cell]) -> Any:
+            instance = obj(env, closure)
+            if isinstance(instance, LoxInstance):
+                return instance.get(name, cache)
+            raise PyloxRuntimeError(name, "Only instances have properties")
+
+        if (guard := self._guard(expr)) is None:
+            return get_property
+        shape, miss = guard
+        known = shape.find(name.lexeme)
+        if known is None:
+            return get_property
+
+        def get_other(instance: Any) -> Any:
+            miss()
+            if isinstance(instance, LoxInstance):
+                return instance.get(name, cache)
+            raise PyloxRuntimeError(name, "Only instances have properties")
+
+        if isinstance(known, int):
+            index = known
+
+            def get_field(env: Environment, closure: list[Cell]) -> Any:
+                instance = obj(env, closure)
+                if type(instance) is LoxInstance and instance.shape is shape:
+                    return instance.values[index]
+                return get_other(instance)
+
+            return get_field
+        method = known
+
+        def get_method(env: Environment, closure: list[Cell]) -> Any:
+            instance = obj(env, closure)
+            if type(instance) is LoxInstance and instance.shape is shape:
+                return method.bind(instance)
+            return get_other(instance)
+
+        return get_method
+
+    def _guard(
+        self, expr: e.Get | e.Set
+    ) -> tuple[Shape, Callable[[], None]] | None:
+        """The only shape of instances the tree walker saw at a property
+        site, and what the code specialised on it does when it sees another
+        one: it deoptimizes, and the feedback forgets the shape"""
+        deoptimize, feedback = self._deoptimize, self._feedback
+        if deoptimize is None or feedback is None:
+            return None
+        shapes = feedback.shapes
+        if (shape := shapes.get(expr)) is None:
+            return None
+
+        def miss() -> None:
+            shapes[expr] = None
+            deoptimize()
+
+        return shape, miss
+
+    def visit_grouping_expr(self, expr: e.Grouping) -> Code:
+        return self._expression(expr.expression)
+
+    def visit_literal_expr(self, expr: e.Literal) -> Code:
+        value = expr.value
+        return lambda env, closure: value
+
+    def visit_logical_expr(self, expr: e.Logical) -> Code:
+        left = self._expression(expr.left)
+        right = self._expression(expr.right)
+        if expr.operator.token_type is TokenType.OR:
+            def logical_or(env: Environment, closure: list[Cell]) -> Any:
+                value = left(env, closure)
+                if value is not None and value is not False:
+                    return value
+                return right(env, closure)
+
+            return logical_or
+
+        def logical_and(env: Environment, closure: list[Cell]) -> Any:
+            value = left(env, closure)
+            if value is None or value is False:
+                return value
+            return right(env, closure)
+
+        return logical_and
+
+    def visit_set_expr(self, expr: e.Set) -> Code:
+        obj = self._expression(expr.obj)
+        value = self._expression(expr.value)
+        name = expr.name
+        cache = SetCache(name.lexeme)
+
+        def set_property(env: Environment, closure: list[Cell]) -> Any:
+            instance = obj(env, closure)
+            if type(instance) is not LoxInstance:
+                raise PyloxRuntimeError(name, "Only instances have fields")
+            result = value(env, closure)
+            instance.set(name, result, cache)
+            return result
+
+        if (guard := self._guard(expr)) is None:
+            return set_property
+        shape, miss = guard
+        index, next_shape = shape.place(name.lexeme)
+
+        def set_field(env: Environment, closure: list[Cell]) -> Any:
+            instance = obj(env, closure)
+            if type(instance) is not LoxInstance:
+                miss()
+                raise PyloxRuntimeError(name, "Only instances have fields")
+            result = value(env, closure)
+            if instance.shape is not shape:
+                miss()
+                instance.set(name, result, cache)
+            elif next_shape is shape:
+                instance.values[index] = result
+            else:
+                instance.shape = next_shape
+                instance.values.append(result)
+            return result
+
+        return set_field
+
+    def visit_super_expr(self, expr: e.Super) -> Code:
+        assert expr.this is not None, "Error: unresolved instance."
+        find_method = self._super_method(expr)
+        this = self._local(expr.this)
+        return lambda env, closure: find_method(env, closure).bind(
+            this(env, closure)
+        )
+
+    def _super_method(self, expr: e.Super) -> Code:
+        """Code that finds the method, not bound"""
+        superclass = self._local(expr)
+        method_name = expr.method
+        cache = MethodCache(method_name.lexeme)
+
+        def super_method(env: Environment, closure: list[Cell]) -> Any:
+            method = cache.find(superclass(env, closure))
+            if method is None:
+                raise PyloxRuntimeError(
+                    method_name,
+                    f"Undefined property {method_name.lexeme}."
+                )
+            return method
+
+        return super_method
+
+    def visit_this_expr(self, expr: e.This) -> Code:
+        return self._local(expr)
+
+    def visit_unary_expr(self, expr: e.Unary) -> Code:
+        right = self._expression(expr.right)
+        token = expr.operator
+        if token.token_type is TokenType.BANG:
+            def negate(env: Environment, closure: list[Cell]) -> Any:
+                value = right(env, closure)
+                return value is None or value is False
+
+            return negate
+
+        def minus(env: Environment, closure: list[Cell]) -> Any:
+            value = right(env, closure)
+            if type(value) is float:
+                return -value
+            return unary_operation(token, value)
+
+        return minus
+
+    def visit_variable_expr(self, expr: e.Variable) -> Code:
+        if expr.depth != e.GLOBAL:
+            return self._local(expr)
+        slots = self._globals.slots
+        global_slot = self._global_slot(expr.name)
+        return lambda env, closure: slots[global_slot()]
+
+
+class CompiledInterpreter(Interpreter):
+    """Run programs compiled to closures instead of walking their trees.
+    Resolution, globals and error reporting are the interpreter's."""
+
+    def interpret(self, statements: list[s.Stmt]) -> bool:
+        compiler = Compiler(self, self._isrepl)
+        program = [compiler.compile(statement) for statement in statements]
+        try:
+            for statement in program:
+                statement(self._globals, [])
+            return True
+        except PyloxRuntimeError as e:
+            report({f"{e}": f"\n\t[line {e.token.line}]"})
+            return False
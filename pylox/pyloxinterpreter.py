@@ -1,4 +1,5 @@
-from typing import Any, Type
+import operator
+from typing import Any, Callable, Type
 import expr as e
 import stmt as s
 from pyloxtoken import TokenType, Token
@@ -10,8 +11,16 @@ from exceptions import (
     Return,
 )
 from error_handler import report
-from environment import Environment
-from loxcallable import LoxCallable, LoxFunction, LoxClass, LoxInstance
+from environment import Cell, Environment, GlobalEnvironment
+from loxcallable import (
+    LoxCallable,
+    LoxFunction,
+    LoxClass,
+    GetCache,
+    LoxInstance,
+    MethodCache,
+    SetCache,
+)
 from native import Clock
 
 
@@ -41,6 +50,98 @@ def assertOperandsType(
     )
 
 
+# The Number types of Lox values: bool is a Number too
+_NUMBERS = (float, bool)
+
+# Operations by operator and concrete operand types. Only the operands they
+# accept are in the tables: anything else takes the generic path, which
+# checks them against the abstract types
+_UNARY_OPERATIONS: dict[tuple[TokenType, type], Callable[[Any], Any]] = {
+    (TokenType.MINUS, t): operator.neg for t in _NUMBERS
+}
+
+_BINARY_OPERATIONS: dict[
+    tuple[TokenType, type, type], Callable[[Any, Any], Any]
+] = {
+    (token_type, left, right): operation
+    for token_type, operation in {
+        TokenType.MINUS: operator.sub,
+        TokenType.PLUS: operator.add,
+        TokenType.STAR: operator.mul,
+        TokenType.SLASH: operator.truediv,
+        TokenType.GREATER: operator.gt,
+        TokenType.GREATER_EQUAL: operator.ge,
+        TokenType.LESS: operator.lt,
+        TokenType.LESS_EQUAL: operator.le,
+    }.items()
+    for left in _NUMBERS
+    for right in _NUMBERS
+}
+_BINARY_OPERATIONS[TokenType.PLUS, str, str] = operator.add
+
+
+def unary_operation(operator: Token, right: Any) -> Any:
+    if operator.token_type is TokenType.BANG:
+        return right is None or right is False
+    operation = _UNARY_OPERATIONS.get((operator.token_type, type(right)))
+    if operation is not None:
+        return operation(right)
+    match operator.token_type:
+        case TokenType.MINUS:
+            assertOperandsType(operator, [Number], right)
+            return -right  # type: ignore
+    raise InternalPyloxError(f"Invalid unary expression {operator.token_type}")
+
+
+def binary_operation(operator: Token, left: Any, right: Any) -> Any:
+    operation = _BINARY_OPERATIONS.get(
+        (operator.token_type, type(left), type(right))
+    )
+    if operation is None:
+        return _checked_binary_operation(operator, left, right)
+    try:
+        return operation(left, right)
+    except ZeroDivisionError:
+        raise PyloxDivisionByZeroError(operator, "Division by zero.") from None
+
+
+def _checked_binary_operation(operator: Token, left: Any, right: Any) -> Any:
+    """The operations on operands that are not in the table: the equality
+    of any values, and the errors"""
+    match operator.token_type:
+        case TokenType.EQUAL_EQUAL:
+            return left == right
+        case TokenType.BANG_EQUAL:
+            return left != right
+        case TokenType.MINUS:
+            assertOperandsType(operator, [Number], left, right)
+            return left - right  # type: ignore
+        case TokenType.PLUS:
+            assertOperandsType(operator, [Number, str], left, right)
+            return left + right  # type: ignore
+        case TokenType.STAR:
+            assertOperandsType(operator, [Number], left, right)
+            return left * right  # type: ignore
+        case TokenType.SLASH:
+            assertOperandsType(operator, [Number], left, right)
+            if right == 0:
+                raise PyloxDivisionByZeroError(operator, "Division by zero.")
+            return left / right  # type: ignore
+        case TokenType.GREATER:
+            assertOperandsType(operator, [Number], left, right)
+            return left > right  # type: ignore
+        case TokenType.GREATER_EQUAL:
+            assertOperandsType(operator, [Number], left, right)
+            return left >= right  # type: ignore
+        case TokenType.LESS:
+            assertOperandsType(operator, [Number], left, right)
+            return left < right  # type: ignore
+        case TokenType.LESS_EQUAL:
+            assertOperandsType(operator, [Number], left, right)
+            return left <= right  # type: ignore
+    raise InternalPyloxError(f"Invalid binary operator: {operator.lexeme}")
+
+
 def pylox_stringify(value: Any) -> str:
     match value:
         case None:
@@ -54,13 +155,13 @@ def pylox_stringify(value: Any) -> str:
 class Interpreter:
     def __init__(self):
         self._isrepl = False
-        self._globals = Environment()
-        self._environemnt = self._globals
-        self._locals: dict[e.Expr, int] = {}
+        self._globals = GlobalEnvironment()
+        self._environemnt: Environment = self._globals
+        self._closure: list[Cell] = []  # Of the running function
 
         self._globals.define("clock", Clock())
 
-    def get_globals(self) -> Environment:
+    def get_globals(self) -> GlobalEnvironment:
         return self._globals
 
     def set_repl(self) -> None:
@@ -75,8 +176,18 @@ class Interpreter:
             report({f"{e}": f"\n\t[line {e.token.line}]"})
             return False
 
-    def resolve(self, expr: e.Expr, depth: int) -> None:
-        self._locals[expr] = depth
+    def resolve(
+        self,
+        expr: e.Assign | e.Super | e.This | e.Variable,
+        depth: int,
+        slot: int,
+        boxed: bool,
+    ) -> None:
+        """Attach the resolution to the node: variables that are never
+        resolved keep the GLOBAL depth"""
+        expr.depth = depth
+        expr.slot = slot
+        expr.boxed = boxed
 
     def _execute(self, statement: s.Stmt) -> None:
         statement.accept(self)
@@ -95,9 +206,15 @@ class Interpreter:
             value = None
         else:
             value = self._evaluate(stmt.initializer)
+        if stmt.boxed:
+            value = Cell(value)
         self._environemnt.define(stmt.name.lexeme, value)
 
     def visit_block_stmt(self, stmt: s.Block) -> None:
+        if not stmt.scoped:
+            for statement in stmt.statements:
+                self._execute(statement)
+            return None
         self.execute_block(stmt.statements, Environment.nest(self._environemnt))
         return None
 
@@ -110,15 +227,19 @@ class Interpreter:
                 )
         else:
             superclass = None
-        self._environemnt.define(stmt.name.lexeme, None)
+
+        # The methods capture the cell of a boxed class before it exists
+        cell = Cell() if stmt.boxed else None
+        if cell is not None:
+            self._environemnt.define(stmt.name.lexeme, cell)
 
         if stmt.superclass is not None:
             self._environemnt = Environment.nest(self._environemnt)
-            self._environemnt.define("super", superclass)
+            self._environemnt.define("super", Cell(superclass))
 
         methods = {
             (lexeme := method.name.lexeme): LoxFunction(method,
-                                                        self._environemnt,
+                                                        self._capture(method),
                                                         lexeme == "init")
             for method in stmt.methods
         }
@@ -129,7 +250,13 @@ class Interpreter:
                    "Error: enclosing environment must be not None."
             self._environemnt = self._environemnt.enclosing
 
-        self._environemnt.assign(stmt.name, klass)
+        # Defining the class only now is the same as declaring it before
+        # its methods: they can only run after this. Nothing else can be
+        # defined in between, so the class gets the slot the resolver gave it.
+        if cell is None:
+            self._environemnt.define(stmt.name.lexeme, klass)
+        else:
+            cell.value = klass
         return None
 
     def visit_if_stmt(self, stmt: s.If) -> None:
@@ -144,6 +271,27 @@ class Interpreter:
             self._execute(stmt.body)
         return None
 
+    def visit_for_stmt(self, stmt: s.For) -> None:
+        if not isinstance(stmt.initializer, s.Var):
+            self._loop(stmt)
+            return None
+        prev = self._environemnt
+        try:
+            self._environemnt = Environment.nest(prev)
+            self._loop(stmt)
+        finally:
+            self._environemnt = prev
+        return None
+
+    def _loop(self, stmt: s.For) -> None:
+        if stmt.initializer is not None:
+            self._execute(stmt.initializer)
+        condition, body, increment = stmt.condition, stmt.body, stmt.increment
+        while condition is None or as_boolean(self._evaluate(condition)):
+            self._execute(body)
+            if increment is not None:
+                self._evaluate(increment)
+
     def execute_block(self, statements: list[s.Stmt], env: Environment) -> None:
         prev = self._environemnt
         try:
@@ -155,6 +303,17 @@ class Interpreter:
         finally:
             self._environemnt = prev
 
+    def execute_function(
+        self, function: s.Function, frame: Environment, closure: list[Cell]
+    ) -> None:
+        prev_environment, prev_closure = self._environemnt, self._closure
+        try:
+            self._environemnt, self._closure = frame, closure
+            for statement in function.body:
+                self._execute(statement)
+        finally:
+            self._environemnt, self._closure = prev_environment, prev_closure
+
     def visit_literal_expr(self, expr: e.Literal) -> Any:
         return expr.value
 
@@ -162,70 +321,44 @@ class Interpreter:
         return self._evaluate(expr.expression)
 
     def visit_unary_expr(self, expr: e.Unary) -> Any:
-        right = self._evaluate(expr.right)
-        match expr.operator.token_type:
-            case TokenType.MINUS:
-                assertOperandsType(expr.operator, [Number], right)
-                return -right  # type: ignore
-            case TokenType.BANG:
-                return not as_boolean(right)
-        raise InternalPyloxError(
-            f"Invalid unary expression {expr.operator.token_type}"
-        )
+        return unary_operation(expr.operator, self._evaluate(expr.right))
 
     def visit_binary_expr(self, expr: e.Binary) -> Any:
         left = self._evaluate(expr.left)
         right = self._evaluate(expr.right)
-        match expr.operator.token_type:
-            case TokenType.MINUS:
-                assertOperandsType(expr.operator, [Number], left, right)
-                return left - right  # type: ignore
-            case TokenType.PLUS:
-                assertOperandsType(expr.operator, [Number, str], left, right)
-                return left + right  # type: ignore
-            case TokenType.STAR:
-                assertOperandsType(expr.operator, [Number], left, right)
-                return left * right  # type: ignore
-            case TokenType.SLASH:
-                assertOperandsType(expr.operator, [Number], left, right)
-                if right == 0:
-                    raise PyloxDivisionByZeroError(
-                        expr.operator, "Division by zero."
-                    )
-                return left / right  # type: ignore
-            case TokenType.GREATER:
-                assertOperandsType(expr.operator, [Number], left, right)
-                return left > right  # type: ignore
-            case TokenType.GREATER_EQUAL:
-                assertOperandsType(expr.operator, [Number], left, right)
-                return left >= right  # type: ignore
-            case TokenType.LESS:
-                assertOperandsType(expr.operator, [Number], left, right)
-                return left < right  # type: ignore
-            case TokenType.LESS_EQUAL:
-                assertOperandsType(expr.operator, [Number], left, right)
-                return left <= right  # type: ignore
-            case TokenType.EQUAL_EQUAL:
-                return left == right
-            case TokenType.BANG_EQUAL:
-                return left != right
-        raise InternalPyloxError(
-            f"Invalid binary operator: {expr.operator.lexeme}"
-        )
+        return binary_operation(expr.operator, left, right)
 
     def _evaluate(self, expression: e.Expr) -> Any:
         return expression.accept(self)
 
     def visit_assign_expr(self, expr: e.Assign) -> Any:
         value = self._evaluate(expr.value)
-        if (distance := self._locals.get(expr)) is not None:
-            self._environemnt.assign_at(distance, expr.name, value)
+        if expr.depth >= 0:
+            if expr.boxed:
+                self._environemnt.get_at(expr.depth, expr.slot).value = value
+            else:
+                self._environemnt.assign_at(expr.depth, expr.slot, value)
+        elif expr.depth == e.UPVALUE:
+            self._closure[expr.slot].value = value
         else:
-            self._globals.assign(expr.name, value)
+            self._globals.slots[self._global_slot(expr)] = value
         return value
 
     def visit_call_expr(self, expr: e.Call) -> Any:
-        callee = self._evaluate(expr.callee)
+        # A method called right away gets its instance in the first slot of
+        # the frame, instead of being bound to it first
+        target = expr.callee
+        if type(target) is e.Super:
+            return self._invoke(expr, *self._super_method(target))
+        if type(target) is e.Get:
+            obj = self._evaluate(target.obj)
+            if type(obj) is LoxInstance and (
+                method := self._method(obj, target)
+            ) is not None:
+                return self._invoke(expr, method, obj)
+            callee = self._get(obj, target)
+        else:
+            callee = self._evaluate(target)
         arguments = [self._evaluate(arg) for arg in expr.arguments]
         if not isinstance(callee, LoxCallable):
             raise PyloxRuntimeError(
@@ -239,12 +372,36 @@ class Interpreter:
             )
         return callee.call(self, arguments)
 
+    def _invoke(
+        self, expr: e.Call, method: LoxFunction, instance: LoxInstance
+    ) -> Any:
+        arguments = [instance]
+        for argument in expr.arguments:
+            arguments.append(self._evaluate(argument))
+        if len(expr.arguments) != method.arity():
+            raise PyloxRuntimeError(
+                expr.paren,
+                f"Expected {method.arity()} arguments"
+                f"but got {len(expr.arguments)} instead",
+            )
+        return method.invoke(self, arguments)
+
     def visit_get_expr(self, expr: e.Get) -> Any:
-        obj = self._evaluate(expr.obj)
+        return self._get(self._evaluate(expr.obj), expr)
+
+    def _get(self, obj: Any, expr: e.Get) -> Any:
         if isinstance(obj, LoxInstance):
-            return obj.get(expr.name)
+            return obj.get(expr.name, self._get_cache(expr))
         raise PyloxRuntimeError(expr.name, "Only instances have properties")
 
+    def _method(self, obj: LoxInstance, expr: e.Get) -> LoxFunction | None:
+        return obj.method(expr.name, self._get_cache(expr))
+
+    def _get_cache(self, expr: e.Get) -> GetCache:
+        if expr.cache is None:
+            expr.cache = GetCache(expr.name.lexeme)
+        return expr.cache
+
     def visit_logical_expr(self, expr: e.Logical) -> Any:
         left = self._evaluate(expr.left)
         truthy = as_boolean(left)
@@ -261,40 +418,80 @@ class Interpreter:
         if type(obj) is not LoxInstance:
             raise PyloxRuntimeError(expr.name, "Only instances have fields")
         value = self._evaluate(expr.value)
-        obj.set(expr.name, value)
+        self._set(obj, expr, value)
         return value
 
+    def _set(self, obj: LoxInstance, expr: e.Set, value: Any) -> None:
+        if expr.cache is None:
+            expr.cache = SetCache(expr.name.lexeme)
+        obj.set(expr.name, value, expr.cache)
+
     def visit_super_expr(self, expr: e.Super) -> Any:
-        distance = self._locals[expr]
-        superclass = self._environemnt.get_at(distance, "super")
+        method, instance = self._super_method(expr)
+        return method.bind(instance)
+
+    def _super_method(self, expr: e.Super) -> tuple[LoxFunction, LoxInstance]:
+        """The method, not bound, and the instance"""
+        superclass = self._lookup(expr)
         assert isinstance(superclass, LoxClass), \
                "Error: invalid superclass type."
-        assert distance > 0, "Error: invalid distance."
-        instance = self._environemnt.get_at(distance - 1, "this")
-        method = superclass.find_method(expr.method.lexeme)
+        assert expr.this is not None, "Error: unresolved instance."
+        instance = self._lookup(expr.this)
+        if expr.cache is None:
+            expr.cache = MethodCache(expr.method.lexeme)
+        method = expr.cache.find(superclass)
         if method is None:
             raise PyloxRuntimeError(
                 expr.method,
                 f"Undefined property {expr.method.lexeme}."
             )
-        return method.bind(instance)
+        return method, instance
 
     def visit_this_expr(self, expr: e.This) -> Any:
-        return self._look_up_variable(expr.keyword, expr)
+        return self._lookup(expr)
 
     def visit_variable_expr(self, expr: e.Variable) -> Any:
-        return self._look_up_variable(expr.name, expr)
-
-    def _look_up_variable(self, name: Token, expr: e.Variable | e.This):
-        if (distance := self._locals.get(expr)) is not None:
-            return self._environemnt.get_at(distance, name.lexeme)
-        return self._globals.get(name)
+        if expr.depth >= 0:
+            value = self._environemnt.get_at(expr.depth, expr.slot)
+            return value.value if expr.boxed else value
+        if expr.depth == e.UPVALUE:
+            return self._closure[expr.slot].value
+        return self._globals.slots[self._global_slot(expr)]
+
+    def _lookup(self, expr: e.Super | e.This) -> Any:
+        """Value of a variable that is never global"""
+        if expr.depth == e.UPVALUE:
+            return self._closure[expr.slot].value
+        value = self._environemnt.get_at(expr.depth, expr.slot)
+        return value.value if expr.boxed else value
+
+    def _global_slot(self, expr: e.Assign | e.Variable) -> int:
+        """Slot of a global, cached on the node that uses it"""
+        if expr.version is not self._globals.version:
+            expr.slot = self._globals.index(expr.name)
+            expr.version = self._globals.version
+        return expr.slot
 
     def visit_function_stmt(self, stmt: s.Function) -> None:
-        function = LoxFunction(stmt, self._environemnt, False)
-        self._environemnt.define(stmt.name.lexeme, function)
+        if not stmt.boxed:
+            function = LoxFunction(stmt, self._capture(stmt), False)
+            self._environemnt.define(stmt.name.lexeme, function)
+            return None
+        # A function that captures itself needs its cell first
+        cell = Cell()
+        self._environemnt.define(stmt.name.lexeme, cell)
+        cell.value = LoxFunction(stmt, self._capture(stmt), False)
         return None
 
+    def _capture(self, stmt: s.Function) -> list[Cell]:
+        """The closure of a function declared here: the cells it captures
+        from the current frame and from the closure that is running"""
+        return [
+            self._closure[slot] if depth == e.UPVALUE
+            else self._environemnt.get_at(depth, slot)
+            for depth, slot in stmt.upvalues
+        ]
+
     def visit_return_stmt(self, stmt: s.Return) -> None:
         value = self._evaluate(stmt.value) if stmt.value is not None else None
         raise Return(value)
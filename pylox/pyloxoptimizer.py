@@ -0,0 +1,182 @@
+import stmt as s
+import expr as e
+from pyloxtoken import TokenType
+from exceptions import PyloxRuntimeError
+from pyloxinterpreter import as_boolean, binary_operation, unary_operation
+
+
+class Optimizer:
+    """Simplify a resolved program before it is interpreted: fold the
+    operations whose operands are literals, drop the groupings and prune
+    the branches and loops whose condition is constant.
+    An operation that would fail is left in place, so that its error is
+    raised at runtime, if and when it is evaluated."""
+
+    def optimize(self, statements: list[s.Stmt]) -> list[s.Stmt]:
+        return self._statements(statements)
+
+    def _statements(self, statements: list[s.Stmt]) -> list[s.Stmt]:
+        return [
+            optimized
+            for statement in statements
+            if (optimized := self._statement(statement)) is not None
+        ]
+
+    def _statement(self, statement: s.Stmt) -> s.Stmt | None:
+        """Return the optimized statement, or None if it does nothing"""
+        optimized: s.Stmt | None = statement.accept(self)
+        return optimized
+
+    def _branch(self, statement: s.Stmt) -> s.Stmt:
+        """Like _statement, for a statement that cannot be removed"""
+        if (optimized := self._statement(statement)) is not None:
+            return optimized
+        empty = s.Block([])
+        empty.scoped = False  # It declares nothing
+        return empty
+
+    def _expression(self, expression: e.Expr) -> e.Expr:
+        optimized: e.Expr = expression.accept(self)
+        return optimized
+
+    def visit_block_stmt(self, stmt: s.Block) -> s.Stmt | None:
+        stmt.statements = self._statements(stmt.statements)
+        return stmt
+
+    def visit_class_stmt(self, stmt: s.Class) -> s.Stmt | None:
+        for method in stmt.methods:
+            self._statement(method)
+        return stmt
+
+    def visit_expression_stmt(self, stmt: s.Expression) -> s.Stmt | None:
+        stmt.expression = self._expression(stmt.expression)
+        return stmt
+
+    def visit_for_stmt(self, stmt: s.For) -> s.Stmt | None:
+        if stmt.initializer is not None:
+            stmt.initializer = self._statement(stmt.initializer)
+        if stmt.condition is not None:
+            stmt.condition = self._expression(stmt.condition)
+            if isinstance(stmt.condition, e.Literal):
+                if not as_boolean(stmt.condition.value):
+                    return self._never_looping(stmt)
+                stmt.condition = None
+        if stmt.increment is not None:
+            stmt.increment = self._expression(stmt.increment)
+        stmt.body = self._branch(stmt.body)
+        return stmt
+
+    def _never_looping(self, stmt: s.For) -> s.Stmt | None:
+        """Only the initializer of the loop runs. A variable declared there
+        stays in a scope of its own, as the resolver expects."""
+        if isinstance(stmt.initializer, s.Var):
+            return s.Block([stmt.initializer])
+        return stmt.initializer
+
+    def visit_function_stmt(self, stmt: s.Function) -> s.Stmt | None:
+        stmt.body = self._statements(stmt.body)
+        return stmt
+
+    def visit_if_stmt(self, stmt: s.If) -> s.Stmt | None:
+        stmt.condition = self._expression(stmt.condition)
+        if isinstance(stmt.condition, e.Literal):
+            if as_boolean(stmt.condition.value):
+                return self._statement(stmt.then_branch)
+            if stmt.else_branch is not None:
+                return self._statement(stmt.else_branch)
+            return None
+        stmt.then_branch = self._branch(stmt.then_branch)
+        if stmt.else_branch is not None:
+            stmt.else_branch = self._statement(stmt.else_branch)
+        return stmt
+
+    def visit_print_stmt(self, stmt: s.Print) -> s.Stmt | None:
+        stmt.expression = self._expression(stmt.expression)
+        return stmt
+
+    def visit_return_stmt(self, stmt: s.Return) -> s.Stmt | None:
+        if stmt.value is not None:
+            stmt.value = self._expression(stmt.value)
+        return stmt
+
+    def visit_var_stmt(self, stmt: s.Var) -> s.Stmt | None:
+        if stmt.initializer is not None:
+            stmt.initializer = self._expression(stmt.initializer)
+        return stmt
+
+    def visit_while_stmt(self, stmt: s.While) -> s.Stmt | None:
+        stmt.condition = self._expression(stmt.condition)
+        if isinstance(stmt.condition, e.Literal) and not as_boolean(
+            stmt.condition.value
+        ):
+            return None
+        stmt.body = self._branch(stmt.body)
+        return stmt
+
+    def visit_assign_expr(self, expr: e.Assign) -> e.Expr:
+        expr.value = self._expression(expr.value)
+        return expr
+
+    def visit_binary_expr(self, expr: e.Binary) -> e.Expr:
+        expr.left = self._expression(expr.left)
+        expr.right = self._expression(expr.right)
+        match expr.left, expr.right:
+            case e.Literal(left), e.Literal(right):
+                try:
+                    return e.Literal(
+                        binary_operation(expr.operator, left, right)
+                    )
+                except PyloxRuntimeError:
+                    pass
+        return expr
+
+    def visit_call_expr(self, expr: e.Call) -> e.Expr:
+        expr.callee = self._expression(expr.callee)
+        expr.arguments = [self._expression(arg) for arg in expr.arguments]
+        return expr
+
+    def visit_get_expr(self, expr: e.Get) -> e.Expr:
+        expr.obj = self._expression(expr.obj)
+        return expr
+
+    def visit_grouping_expr(self, expr: e.Grouping) -> e.Expr:
+        return self._expression(expr.expression)
+
+    def visit_literal_expr(self, expr: e.Literal) -> e.Expr:
+        return expr
+
+    def visit_logical_expr(self, expr: e.Logical) -> e.Expr:
+        expr.left = self._expression(expr.left)
+        expr.right = self._expression(expr.right)
+        if not isinstance(expr.left, e.Literal):
+            return expr
+        # A constant left operand either is the result or is discarded
+        truthy = as_boolean(expr.left.value)
+        if truthy is (expr.operator.token_type is TokenType.OR):
+            return expr.left
+        return expr.right
+
+    def visit_set_expr(self, expr: e.Set) -> e.Expr:
+        expr.obj = self._expression(expr.obj)
+        expr.value = self._expression(expr.value)
+        return expr
+
+    def visit_super_expr(self, expr: e.Super) -> e.Expr:
+        return expr
+
+    def visit_this_expr(self, expr: e.This) -> e.Expr:
+        return expr
+
+    def visit_unary_expr(self, expr: e.Unary) -> e.Expr:
+        expr.right = self._expression(expr.right)
+        if isinstance(expr.right, e.Literal):
+            try:
+                return e.Literal(
+                    unary_operation(expr.operator, expr.right.value)
+                )
+            except PyloxRuntimeError:
+                pass
+        return expr
+
+    def visit_variable_expr(self, expr: e.Variable) -> e.Expr:
+        return expr
@@ -1,6 +1,7 @@
 from __future__ import annotations  # NOTE: No need since python 3.11+
-from typing import Iterator, Callable, Any, Type
-from pyloxtoken import Token, TokenType
+from typing import Iterator, Protocol
+from enum import IntEnum, auto
+from pyloxtoken import Token, TokenBuffer, TokenType
 import expr as e
 import stmt as s
 from exceptions import InternalPyloxError, ParserError, ScannerError
@@ -8,13 +9,116 @@ from error_handler import report
 from dataclasses import asdict
 
 
-class Parser:
-    _MAX_PARAMS = 255
+class TokenCursor(Protocol):
+    def advance(self) -> None:
+        """Move to the next token. Raise StopIteration past the end."""
+
+    def token_type(self) -> TokenType:
+        """Return the type of the current token."""
+
+    def token(self) -> Token:
+        """Return the current token."""
+
+
+class StreamCursor:
+    """Cursor over a lazily scanned stream of tokens"""
 
     def __init__(self, tokens: Iterator[Token | None]):
         self._tokens = tokens
-        self._current = self._try_get_next()
+        self._current: Token
+
+    def advance(self) -> None:
+        while (token := next(self._tokens)) is None:
+            pass
+        self._current = token
+
+    def token_type(self) -> TokenType:
+        return self._current.token_type
+
+    def token(self) -> Token:
+        return self._current
+
+
+class BufferCursor:
+    """Cursor over a TokenBuffer. Tokens are only materialised when the
+    parser asks for them, i.e. when they end up in the AST or in an error"""
+
+    def __init__(self, buffer: TokenBuffer):
+        self._buffer = buffer
+        self._index = -1
+        self._token_type: TokenType
+        self._token: Token | None = None
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    def advance(self) -> None:
+        if not self._buffer.fetch(self._index + 1):
+            raise StopIteration
+        self._index += 1
+        self._token_type = self._buffer.token_type(self._index)
+        self._token = None
+
+    def token_type(self) -> TokenType:
+        return self._token_type
+
+    def token(self) -> Token:
+        if self._token is None:
+            self._token = self._buffer.token(self._index)
+        return self._token
+
+
+class Precedence(IntEnum):
+    NONE = 0
+    ASSIGNMENT = auto()
+    OR = auto()
+    AND = auto()
+    EQUALITY = auto()
+    COMPARISON = auto()
+    TERM = auto()
+    FACTOR = auto()
+    UNARY = auto()
+    CALL = auto()
+
+
+# How tightly each operator that can follow an operand binds to it
+_BINDING_POWERS: dict[TokenType, Precedence] = {
+    TokenType.EQUAL: Precedence.ASSIGNMENT,
+    TokenType.OR: Precedence.OR,
+    TokenType.AND: Precedence.AND,
+    TokenType.BANG_EQUAL: Precedence.EQUALITY,
+    TokenType.EQUAL_EQUAL: Precedence.EQUALITY,
+    TokenType.GREATER: Precedence.COMPARISON,
+    TokenType.GREATER_EQUAL: Precedence.COMPARISON,
+    TokenType.LESS: Precedence.COMPARISON,
+    TokenType.LESS_EQUAL: Precedence.COMPARISON,
+    TokenType.MINUS: Precedence.TERM,
+    TokenType.PLUS: Precedence.TERM,
+    TokenType.SLASH: Precedence.FACTOR,
+    TokenType.STAR: Precedence.FACTOR,
+    TokenType.LEFT_PAREN: Precedence.CALL,
+    TokenType.DOT: Precedence.CALL,
+}
+
+_LITERALS = {
+    TokenType.FALSE: False,
+    TokenType.TRUE: True,
+    TokenType.NIL: None,
+}
+
+
+class Parser:
+    _MAX_PARAMS = 255
+
+    def __init__(self, tokens: Iterator[Token | None] | TokenBuffer):
+        self._tokens: TokenCursor = (
+            BufferCursor(tokens)
+            if isinstance(tokens, TokenBuffer)
+            else StreamCursor(tokens)
+        )
         self._has_error = False
+        self._advance()
 
     def parse(self) -> list[s.Stmt] | None:
         statements = []
@@ -30,12 +134,29 @@ class Parser:
             return None
         return statements
 
+    def declarations(self) -> Iterator[s.Stmt | None]:
+        """Parse the top-level declarations one at a time. Declarations
+        with errors are reported and yielded as None"""
+        while not self._is_at_end():
+            self._has_error = False
+            try:
+                declaration = self._declaration()
+            except ParserError as e:
+                report({"ParseError:": e})
+                declaration = None
+            yield None if self._has_error else declaration
+
+    def token_index(self) -> int:
+        """Index of the current token, when parsing a TokenBuffer"""
+        assert isinstance(self._tokens, BufferCursor), "Not parsing a buffer."
+        return self._tokens.index
+
     def _declaration(self) -> s.Stmt | None:
         try:
             if self._match(TokenType.CLASS):
                 return self._class_declaration()
             if self._match(TokenType.FUN):
-                self._current = self._expect(
+                self._expect(
                     TokenType.IDENTIFIER, "Expect function name"
                 )  # Consume fun keyword
                 return self._function("function")
@@ -49,34 +170,33 @@ class Parser:
             return None
 
     def _class_declaration(self) -> s.Stmt:
-        self._current = self._expect(TokenType.IDENTIFIER, "Expect class name.")
+        self._expect(TokenType.IDENTIFIER, "Expect class name.")
         name = self._current
 
-        self._current = self._try_get_next()
+        self._advance()
         expect_brace = TokenType.LEFT_BRACE, "Expect '{' before class body."
         if (self._match(TokenType.LESS)):
-            self._current = self._expect(
+            self._expect(
                 TokenType.IDENTIFIER,
                 "Expect superclass name."
             )
             superclass = e.Variable(self._current)
-            self._current = self._expect(*expect_brace)
+            self._expect(*expect_brace)
         else:
             superclass = None
-            self._assert_token(self._current, *expect_brace)
+            self._assert_token(*expect_brace)
 
-        self._current = self._try_get_next()
+        self._advance()
 
         methods = []
         while not self._match(TokenType.RIGHT_BRACE) and not self._is_at_end():
             methods.append(self._function("method"))
 
         self._assert_token(
-            self._current,
             TokenType.RIGHT_BRACE,
             "Expect '}' after class body."
         )
-        self._current = self._try_get_next()
+        self._advance()
         return s.Class(name, superclass, methods)
 
     def _assert_max_arity(
@@ -93,52 +213,44 @@ class Parser:
 
     def _function(self, fun: str) -> s.Stmt:
         name = self._current
-        self._current = self._expect(
-            TokenType.LEFT_PAREN, f"Expect '(' after {fun} name"
-        )
-        self._current = self._try_get_next()
+        self._expect(TokenType.LEFT_PAREN, f"Expect '(' after {fun} name")
+        self._advance()
         parameters: list[Token] = []
         if not self._match(TokenType.RIGHT_PAREN):
             self._assert_token(
-                self._current,
                 TokenType.IDENTIFIER,
                 "Expect parameter name."
             )
             parameters = [self._current]
-            self._current = self._try_get_next()
+            self._advance()
             while self._match(TokenType.COMMA):
-                self._current = self._expect(
-                    TokenType.IDENTIFIER, "Expect parameter name"
-                )
+                self._expect(TokenType.IDENTIFIER, "Expect parameter name")
                 parameters.append(self._current)
                 self._assert_max_arity(parameters, "paramters")
-                self._current = self._try_get_next()
+                self._advance()
 
         self._assert_token(
-            self._current,
             TokenType.RIGHT_PAREN,
             "Expect ')' after parameters."
         )
 
-        self._current = self._expect(
-            TokenType.LEFT_BRACE, f"Expect '{{' before {fun} body."
-        )
-        self._current = self._try_get_next()
+        self._expect(TokenType.LEFT_BRACE, f"Expect '{{' before {fun} body.")
+        self._advance()
         body = self._block()
         return s.Function(name, parameters, body)
 
     def _var_declaration(self) -> s.Stmt:
-        self._current = self._try_get_next()
+        self._advance()
         name = self._current
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.IDENTIFIER, "Expect variable name."
         )
 
         initializer: e.Expr | None = None
         if self._match(TokenType.EQUAL):
-            self._current = self._try_get_next()
+            self._advance()
             initializer = self._expression()
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.SEMICOLON, "Expect ';' after variable declaration"
         )
         return s.Var(name, initializer)
@@ -147,42 +259,42 @@ class Parser:
         if self._match(TokenType.FOR):
             return self._for_statement()
         if self._match(TokenType.IF):
-            self._current = self._try_get_next()
+            self._advance()
             return self._if_statement()
         if self._match(TokenType.PRINT):
-            self._current = self._try_get_next()
+            self._advance()
             return self._print_statement()
         if self._match(TokenType.RETURN):
             return self._return_statement()
         if self._match(TokenType.WHILE):
             return self._while_statement()
         if self._match(TokenType.LEFT_BRACE):
-            self._current = self._try_get_next()
+            self._advance()
             return s.Block(self._block())
         return self._expression_statement()
 
     def _return_statement(self) -> s.Stmt:
         keyword = self._current
-        self._current = self._try_get_next()
+        self._advance()
         value: e.Expr | None = None
         if not self._match(TokenType.SEMICOLON):
             value = self._expression()
 
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.SEMICOLON, "Expect ';' after return value."
         )
         return s.Return(keyword, value)
 
     def _for_statement(self) -> s.Stmt:
-        self._current = self._try_get_next()
+        self._advance()
 
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.LEFT_PAREN, "Expect '(' after 'for'."
         )
 
         if self._match(TokenType.SEMICOLON):
             initializer = None
-            self._current = self._try_get_next()
+            self._advance()
         elif self._match(TokenType.VAR):
             initializer = self._var_declaration()
         else:
@@ -192,7 +304,7 @@ class Parser:
         if not self._match(TokenType.SEMICOLON):
             condition = self._expression()
 
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.SEMICOLON, "Expect ';' after loop condition."
         )
 
@@ -200,48 +312,36 @@ class Parser:
         if not self._match(TokenType.RIGHT_PAREN):
             increment = self._expression()
 
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.RIGHT_PAREN, "Expect ')' after for clauses."
         )
 
-        body = self._statement()
-
-        if increment is not None:
-            body = s.Block([body, s.Expression(increment)])
-
-        if condition is None:
-            condition = e.Literal(True)
-
-        body = s.While(condition, body)
-
-        if initializer is not None:
-            body = s.Block([initializer, body])
-
-        return body
+        return s.For(initializer, condition, increment, self._statement())
 
     def _while_statement(self) -> s.Stmt:
-        self._current = self._try_get_next()
-        self._current = self._get_next_if_current_is(
+        self._advance()
+        self._get_next_if_current_is(
             TokenType.LEFT_PAREN, "Expect '(' after a 'while'."
         )
         condition = self._expression()
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.RIGHT_PAREN, "Expect ')' after condition."
         )
         body = self._statement()
         return s.While(condition, body)
 
     def _if_statement(self) -> s.Stmt:
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.LEFT_PAREN, "Expect '(' after if."
         )
         condition = self._expression()
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.RIGHT_PAREN, "Expect ')' after if body."
         )
         then_branch = self._statement()
         else_branch = None
         if self._match(TokenType.ELSE):
+            self._advance()
             else_branch = self._statement()
         return s.If(condition, then_branch, else_branch)
 
@@ -251,30 +351,28 @@ class Parser:
             decl = self._declaration()
             if decl is not None:
                 statements.append(decl)
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.RIGHT_BRACE, "Expect '}' after block."
         )
         return statements
 
     def _print_statement(self) -> s.Stmt:
         value = self._expression()
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.SEMICOLON, "Expect ';' after value."
         )
         return s.Print(value)
 
     def _expression_statement(self) -> s.Stmt:
         expression = self._expression()
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.SEMICOLON, "Expect ';' after expression."
         )
         return s.Expression(expression)
 
-    def _try_get_next(self) -> Token:
+    def _advance(self) -> None:
         try:
-            while (token := next(self._tokens)) is None:
-                pass
-            return token
+            self._tokens.advance()
         except ScannerError:
             self._has_error = True
             raise ParserError("Parse error due to previous scanner error.")
@@ -283,122 +381,126 @@ class Parser:
                 f"Accessing non-existing token: {__file__}"
             )
 
+    @property
+    def _current(self) -> Token:
+        return self._tokens.token()
+
     def _get_next_if_current_is(
         self, token_type: TokenType, message: str
-    ) -> Token:
+    ) -> None:
         if not self._match(token_type):
             self._has_error = True
             raise ParserError(self._current, message)
-        return self._try_get_next()
+        self._advance()
 
-    def _expect(self, token_type: TokenType, msg: str) -> Token:
-        tkn = self._try_get_next()
-        self._assert_token(tkn, token_type, msg)
-        return tkn
+    def _expect(self, token_type: TokenType, msg: str) -> None:
+        self._advance()
+        self._assert_token(token_type, msg)
 
-    def _assert_token(
-        self, token: Token, token_type: TokenType, msg: str
-    ) -> None:
-        if token.token_type is not token_type:
+    def _assert_token(self, token_type: TokenType, msg: str) -> None:
+        if self._tokens.token_type() is not token_type:
             self._has_error = True
-            raise ParserError(token, msg)
+            raise ParserError(self._current, msg)
 
     def _match(self, *token_types: TokenType) -> bool:
-        return any(
-            self._current.token_type == token_type for token_type in token_types
-        )
+        return self._tokens.token_type() in token_types
 
     def _is_at_end(self) -> bool:
         return self._match(TokenType.EOF)
 
-    def _expression(self) -> e.Expr:
-        return self._assignment()
-
-    def _assignment(self) -> e.Expr:
-        expr = self._or()
-        if self._match(TokenType.EQUAL):
-            equals = self._current
-            self._current = self._try_get_next()
-            value = self._assignment()
-            match expr:
-                case e.Variable(name):
-                    return e.Assign(name, value)  # noqa(F821)
-                case e.Get(obj, name):
-                    return e.Set(obj, name, value)  # noqa(F821)
+    def _expression(self, precedence: int = Precedence.ASSIGNMENT) -> e.Expr:
+        """Parse an expression whose operators bind at least as tightly as
+        precedence"""
+        expr = self._prefix()
+        while (
+            power := _BINDING_POWERS.get(
+                token_type := self._tokens.token_type(), Precedence.NONE
+            )
+        ) >= precedence:
+            match token_type:
+                case TokenType.LEFT_PAREN:
+                    self._advance()
+                    expr = self._finishCall(expr)
+                case TokenType.DOT:
+                    self._expect(
+                        TokenType.IDENTIFIER, "Expect property name after '.'."
+                    )
+                    expr = e.Get(expr, self._current)
+                    self._advance()
+                case TokenType.EQUAL:
+                    expr = self._assignment(expr)
+                case TokenType.OR | TokenType.AND:
+                    operation = self._current
+                    self._advance()
+                    right = self._expression(power + 1)
+                    expr = e.Logical(expr, operation, right)
                 case _:
-                    report(asdict(equals), "Invalid assignement target.")
-
+                    operation = self._current
+                    self._advance()
+                    # Left-associative: the right operand stops at the next
+                    # operator of the same precedence
+                    right = self._expression(power + 1)
+                    expr = e.Binary(expr, operation, right)
         return expr
 
-    def _or(self) -> e.Expr:
-        return self._binary_expr(self._and, [TokenType.OR], e.Logical)
-
-    def _and(self):
-        return self._binary_expr(self._equality, [TokenType.AND], e.Logical)
-
-    def _binary_expr(
-        self,
-        op: Callable[[], e.Expr],
-        token_types: list[TokenType],
-        expr_class: Type[e.Binary | e.Logical] = e.Binary,
-    ) -> e.Expr:
-        expression = op()
-        while self._match(*token_types):
-            operation = self._current
-            self._current = self._try_get_next()
-            right = op()
-            expression = expr_class(expression, operation, right)
-        return expression
-
-    def _equality(self) -> e.Expr:
-        return self._binary_expr(
-            self._comparison, [TokenType.BANG_EQUAL, TokenType.EQUAL_EQUAL]
-        )
-
-    def _comparison(self) -> e.Expr:
-        return self._binary_expr(
-            self._term,
-            [
-                TokenType.GREATER,
-                TokenType.GREATER_EQUAL,
-                TokenType.LESS,
-                TokenType.LESS_EQUAL,
-            ],
-            e.Binary,
-        )
-
-    def _term(self) -> e.Expr:
-        return self._binary_expr(
-            self._factor, [TokenType.MINUS, TokenType.PLUS]
-        )
+    def _assignment(self, expr: e.Expr) -> e.Expr:
+        equals = self._current
+        self._advance()
+        # Right-associative: a = b = c is a = (b = c)
+        value = self._expression(Precedence.ASSIGNMENT)
+        match expr:
+            case e.Variable(name):
+                return e.Assign(name, value)  # noqa(F821)
+            case e.Get(obj, name):
+                return e.Set(obj, name, value)  # noqa(F821)
+            case _:
+                report(asdict(equals), "Invalid assignement target.")
+        return expr
 
-    def _factor(self) -> e.Expr:
-        return self._binary_expr(self._unary, [TokenType.SLASH, TokenType.STAR])
-
-    def _unary(self) -> e.Expr:
-        if self._match(TokenType.BANG, TokenType.MINUS):
-            operation = self._current
-            self._current = self._try_get_next()
-            right = self._unary()
-            return e.Unary(operation, right)
-        return self._call()
-
-    def _call(self) -> e.Expr:
-        expr = self._primary()
-        while True:
-            if self._match(TokenType.LEFT_PAREN):
-                self._current = self._try_get_next()
-                expr = self._finishCall(expr)
-            elif self._match(TokenType.DOT):
-                self._current = self._expect(
-                    TokenType.IDENTIFIER, "Expect property name after '.'."
+    def _prefix(self) -> e.Expr:
+        """Parse an operand: a primary expression or a unary operation"""
+        match token_type := self._tokens.token_type():
+            case TokenType.IDENTIFIER:
+                var = self._current
+                self._advance()
+                return e.Variable(var)
+            case TokenType.NUMBER | TokenType.STRING:
+                literal = e.Literal(self._current.literal)
+                self._advance()
+                return literal
+            case TokenType.BANG | TokenType.MINUS:
+                operation = self._current
+                self._advance()
+                right = self._expression(Precedence.UNARY)
+                return e.Unary(operation, right)
+            case TokenType.FALSE | TokenType.TRUE | TokenType.NIL:
+                self._advance()
+                return e.Literal(_LITERALS[token_type])
+            case TokenType.LEFT_PAREN:
+                self._advance()
+                expression = self._expression()
+                self._get_next_if_current_is(
+                    TokenType.RIGHT_PAREN, "Expect ')' after expression."
                 )
-                expr = e.Get(expr, self._current)
-                self._current = self._try_get_next()
-            else:
-                break
+                return e.Grouping(expression)
+            case TokenType.THIS:
+                var = self._current
+                self._advance()
+                return e.This(var)
+            case TokenType.SUPER:
+                keyword = self._current
+                self._expect(TokenType.DOT, "Expect '.' after super.")
+                self._advance()
+                method = self._current
+                self._advance()
+                return e.Super(keyword, method)
 
-        return expr
+        self._has_error = True
+        raise ParserError(
+            f"Invalid primary expression:\n"
+            f"Line: {self._current.line}\n"
+            f"Expression: {self._current.lexeme}"
+        )
 
     def _finishCall(self, callee: e.Expr) -> e.Expr:
         arguments: list[e.Expr] = []
@@ -407,88 +509,29 @@ class Parser:
                 self._assert_max_arity(arguments, "arguments")
                 arguments.append(self._expression())
                 if self._match(TokenType.COMMA):
-                    self._current = self._try_get_next()
+                    self._advance()
                 else:
                     break
         paren = self._current
-        self._current = self._get_next_if_current_is(
+        self._get_next_if_current_is(
             TokenType.RIGHT_PAREN, "Expect ')' after arguments."
         )
         return e.Call(callee, paren, arguments)
 
-    def _find_literal(self, tokens: dict[TokenType, Any]) -> e.Expr | None:
-        for token, literal in tokens.items():
-            if self._match(token):
-                ret = e.Literal(literal)
-                self._current = self._try_get_next()
-                return ret
-        return None
-
-    def _primary(self) -> e.Expr:
-        if (
-            literal := self._find_literal(
-                {
-                    TokenType.FALSE: False,
-                    TokenType.TRUE: True,
-                    TokenType.NIL: None,
-                    TokenType.NUMBER: self._current.literal,
-                    TokenType.STRING: self._current.literal,
-                }
-            )
-        ) is not None:
-            return literal
-
-        if self._match(TokenType.SUPER):
-            keyword = self._current
-            self._current = self._expect(
-                TokenType.DOT,
-                "Expect '.' after super."
-            )
-            self._current = self._try_get_next()
-            method, self._current = self._current, self._try_get_next()
-            return e.Super(keyword, method)
-
-        if self._match(TokenType.THIS):
-            var, self._current = self._current, self._try_get_next()
-            return e.This(var)
-
-        if self._match(TokenType.IDENTIFIER):
-            var = self._current
-            self._current = self._try_get_next()
-            return e.Variable(var)
-
-        if self._match(TokenType.LEFT_PAREN):
-            self._current = self._try_get_next()
-            expression = self._expression()
-            self._current = self._get_next_if_current_is(
-                TokenType.RIGHT_PAREN, "Expect ')' after expression."
-            )
-            return e.Grouping(expression)
-
-        self._has_error = True
-        raise ParserError(
-            f"Invalid primary expression:\n"
-            f"Line: {self._current.line}\n"
-            f"Expression: {self._current.lexeme}"
-        )
-
     def _synchronize(self) -> None:
         while not self._is_at_end():
-            if self._current.token_type == TokenType.SEMICOLON:
-                self._current = self._try_get_next()
+            if self._match(TokenType.SEMICOLON):
+                self._advance()
                 return
-            if any(
-                token == self._current.token_type
-                for token in (
-                    TokenType.CLASS,
-                    TokenType.FUN,
-                    TokenType.VAR,
-                    TokenType.FOR,
-                    TokenType.IF,
-                    TokenType.WHILE,
-                    TokenType.PRINT,
-                    TokenType.RETURN,
-                )
+            if self._match(
+                TokenType.CLASS,
+                TokenType.FUN,
+                TokenType.VAR,
+                TokenType.FOR,
+                TokenType.IF,
+                TokenType.WHILE,
+                TokenType.PRINT,
+                TokenType.RETURN,
             ):
                 return
-            self._current = self._try_get_next()
+            self._advance()
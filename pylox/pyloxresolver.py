@@ -4,6 +4,7 @@ from pyloxtoken import Token
 from error_handler import report
 from typing import Protocol, Any
 from enum import Enum, auto
+from dataclasses import dataclass, field
 
 
 class FunctionType(Enum):
@@ -19,32 +20,124 @@ class ClassType(Enum):
     SUBCLASS = auto()
 
 
+# The nodes that hold the resolution of a variable
+Resolvable = e.Assign | e.Super | e.This | e.Variable
+
+
 class Interpreter(Protocol):
-    def resolve(self, expr: e.Expr, depth: int) -> None:
+    def resolve(
+        self, expr: Resolvable, depth: int, slot: int, boxed: bool
+    ) -> None:
         """Resolves the number of environments between the use of a variable
-        and its definition."""
+        and its definition, and the slot of the variable in the latter.
+        The depth is UPVALUE for a variable captured from an enclosing
+        function, and the slot its index in the closure."""
+
+
+# The declarations whose variable may live in a cell
+Declaration = s.Var | s.Function | s.Class
+
+
+class ResolutionTable:
+    """All that the resolver finds out about the nodes of a tree, kept apart
+    from it: a tree is resolved once, and the table applied to any number
+    of interpreters. The fields of the nodes are a cache of the table,
+    written by apply."""
+
+    def __init__(self) -> None:
+        self.variables: dict[Resolvable, tuple[int, int, bool]] = {}
+        self.scoped: dict[s.Block, bool] = {}
+        self.boxed: dict[Declaration, bool] = {}
+        # Upvalues and boxed parameters
+        self.functions: dict[
+            s.Function, tuple[list[tuple[int, int]], tuple[int, ...]]
+        ] = {}
+        self.this: dict[e.Super, e.This] = {}
+
+    def resolve(
+        self, expr: Resolvable, depth: int, slot: int, boxed: bool
+    ) -> None:
+        self.variables[expr] = (depth, slot, boxed)
+
+    def apply(self, interpreter: Interpreter) -> None:
+        for super_expr, this in self.this.items():
+            super_expr.this = this
+        for expr, (depth, slot, boxed) in self.variables.items():
+            interpreter.resolve(expr, depth, slot, boxed)
+        for block, scoped in self.scoped.items():
+            block.scoped = scoped
+        for declaration, boxed in self.boxed.items():
+            declaration.boxed = boxed
+        for function, (upvalues, boxed_params) in self.functions.items():
+            function.upvalues = upvalues
+            function.boxed_params = boxed_params
+
+
+@dataclass
+class Local:
+    slot: int  # Position of the variable in its scope
+    defined: bool = False
+    captured: bool = False  # By a closure, so it must live in a cell
+    declaration: Declaration | None = None
+    # Uses in the same function, resolved when the scope ends and it is
+    # known whether the variable is boxed: (expression, depth)
+    uses: list[tuple[Resolvable, int]] = field(default_factory=list)
+
+
+@dataclass
+class FunctionScope:
+    first_scope: int  # Index of the outermost scope of the function
+    # What the function captures, as (depth, slot) from where it is declared
+    upvalues: list[tuple[int, int]] = field(default_factory=list)
+
+
+def declares(statements: list[s.Stmt]) -> bool:
+    """Whether the statements of a block declare any name in its scope"""
+    return any(
+        isinstance(statement, (s.Var, s.Function, s.Class))
+        for statement in statements
+    )
 
 
 class Resolver:
+    """Resolves a tree into a ResolutionTable, applied to the interpreter
+    once the tree resolves without errors"""
+
     def __init__(self, interpreter: Interpreter):
         self._interpreter = interpreter
-        self._scopes: list[dict[str, bool]] = []
+        self._table = ResolutionTable()
+        self._scopes: list[dict[str, Local]] = []
+        # The top level code is the outermost function, with no upvalues
+        self._functions = [FunctionScope(0)]
         self._current_function = FunctionType.NONE
         self._current_class = ClassType.NONE
         self._has_error = False
 
+    @property
+    def table(self) -> ResolutionTable:
+        return self._table
+
     def resolve_statements(self, statements: list[s.Stmt]) -> bool:
         self._resolve(statements)
-        return not self._has_error
+        if self._has_error:
+            return False
+        self._table.apply(self._interpreter)
+        return True
 
     def visit_block_stmt(self, stmt: s.Block) -> None:
+        # A block without declarations gets no scope, so the variables used
+        # in it are one scope closer than they would be otherwise
+        scoped = self._table.scoped[stmt] = declares(stmt.statements)
+        if not scoped:
+            self._resolve(stmt.statements)
+            return
         self._begin_scope()
         self._resolve(stmt.statements)
         self._end_scope()
 
     def visit_class_stmt(self, stmt: s.Class) -> None:
         enclosing_class = self._current_class
-        self._declare(stmt.name)
+        self._declare(stmt.name, stmt)
         self._define(stmt.name)
         if stmt.superclass is not None:
             if stmt.name.lexeme == stmt.superclass.name.lexeme:
@@ -55,43 +148,45 @@ class Resolver:
             self._current_class = ClassType.SUBCLASS
             self._resolve(stmt.superclass)
             self._begin_scope()
-            self._scopes[-1]["super"] = True
+            # Only the methods use it, so it is always captured
+            self._scopes[-1]["super"] = Local(0, defined=True, captured=True)
         else:
             self._current_class = ClassType.CLASS
 
-        self._begin_scope()
-        self._scopes[-1]["this"] = True
         for method in stmt.methods:
             if method.name.lexeme == "init":
                 declaration = FunctionType.INITIALIZER
             else:
                 declaration = FunctionType.METHOD
             self._resolve_function(method, declaration)
-        self._end_scope()
         if stmt.superclass is not None:
             self._end_scope()
         self._current_class = enclosing_class
 
     def visit_var_stmt(self, stmt: s.Var) -> None:
-        self._declare(stmt.name)
+        self._declare(stmt.name, stmt)
         if stmt.initializer is not None:
             self._resolve(stmt.initializer)
         self._define(stmt.name)
 
     def visit_variable_expr(self, expr: e.Variable) -> None:
-        if self._scopes and self._scopes[-1].get(expr.name.lexeme) is False:
+        if (
+            self._scopes
+            and (local := self._scopes[-1].get(expr.name.lexeme)) is not None
+            and not local.defined
+        ):
             self._report_error(
                 {"Error at line": expr.name.line, "Token": expr.name.lexeme},
                 "Can't read local variable in its own initializer.",
             )
-        self._resolve_local(expr, expr.name)
+        self._resolve_local(expr, expr.name.lexeme)
 
     def visit_assign_expr(self, expr: e.Assign) -> None:
         self._resolve(expr.value)
-        self._resolve_local(expr, expr.name)
+        self._resolve_local(expr, expr.name.lexeme)
 
     def visit_function_stmt(self, stmt: s.Function) -> None:
-        self._declare(stmt.name)
+        self._declare(stmt.name, stmt)
         self._define(stmt.name)
         self._resolve_function(stmt, FunctionType.FUNCTION)
 
@@ -127,6 +222,22 @@ class Resolver:
         self._resolve(stmt.condition)
         self._resolve(stmt.body)
 
+    def visit_for_stmt(self, stmt: s.For) -> None:
+        # Only a declared loop variable needs a scope, shared by all the
+        # iterations
+        has_scope = isinstance(stmt.initializer, s.Var)
+        if has_scope:
+            self._begin_scope()
+        if stmt.initializer is not None:
+            self._resolve(stmt.initializer)
+        if stmt.condition is not None:
+            self._resolve(stmt.condition)
+        if stmt.increment is not None:
+            self._resolve(stmt.increment)
+        self._resolve(stmt.body)
+        if has_scope:
+            self._end_scope()
+
     def visit_binary_expr(self, expr: e.Binary) -> None:
         self._resolve(expr.left)
         self._resolve(expr.right)
@@ -169,15 +280,17 @@ class Resolver:
                     "Cannot use 'super' in class with no superclass."
                 )
 
-        self._resolve_local(expr, expr.keyword)
+        self._resolve_local(expr, expr.keyword.lexeme)
+        this = self._table.this[expr] = e.This(expr.keyword)
+        self._resolve_local(this, "this")
 
     def visit_this_expr(self, expr: e.This) -> None:
-        if self._current_class is not ClassType.CLASS:
+        if self._current_class is ClassType.NONE:
             self._report_error(
                 {"Error: ": expr.keyword},
                 "Cannot use 'this' outside of a class.",
             )
-        self._resolve_local(expr, expr.keyword)
+        self._resolve_local(expr, expr.keyword.lexeme)
 
     def _report_error(
         self,
@@ -198,10 +311,20 @@ class Resolver:
     def _begin_scope(self) -> None:
         self._scopes.append({})
 
-    def _end_scope(self) -> None:
-        self._scopes.pop()
+    def _end_scope(self) -> dict[str, Local]:
+        scope = self._scopes.pop()
+        for local in scope.values():
+            for expr, depth in local.uses:
+                self._table.resolve(expr, depth, local.slot, local.captured)
+            if local.declaration is not None:
+                self._table.boxed[local.declaration] = local.captured
+        return scope
 
-    def _declare(self, name: Token) -> None:
+    def _declare(
+        self,
+        name: Token,
+        declaration: Declaration | None = None,
+    ) -> None:
         if not self._scopes:
             return
         if name.lexeme in self._scopes[-1]:
@@ -209,28 +332,65 @@ class Resolver:
                 {"Error: ": name.lexeme},
                 "Already a variable with this name in this scope.",
             )
-        self._scopes[-1][name.lexeme] = False
+            self._scopes[-1][name.lexeme].defined = False
+            return
+        self._scopes[-1][name.lexeme] = Local(
+            len(self._scopes[-1]), declaration=declaration
+        )
 
     def _define(self, name: Token) -> None:
         if not self._scopes:
             return
-        self._scopes[-1][name.lexeme] = True
+        self._scopes[-1][name.lexeme].defined = True
 
-    def _resolve_local(self, expr: e.Expr, name: Token) -> None:
-        for i, scope in enumerate(reversed(self._scopes)):
-            if scope.get(name.lexeme) is not None:
-                self._interpreter.resolve(expr, i)
-                return
+    def _resolve_local(self, expr: Resolvable, name: str) -> None:
+        for index in range(len(self._scopes) - 1, -1, -1):
+            if (local := self._scopes[index].get(name)) is not None:
+                break
+        else:
+            return  # A global
+        if index >= self._functions[-1].first_scope:
+            local.uses.append((expr, len(self._scopes) - 1 - index))
+            return
+        local.captured = True
+        upvalue = self._upvalue(len(self._functions) - 1, index, local.slot)
+        self._table.resolve(expr, e.UPVALUE, upvalue, True)
+
+    def _upvalue(self, level: int, scope: int, slot: int) -> int:
+        """Index in the closure of the function at the given level of the
+        cell of a variable of an enclosing function. The functions in
+        between capture it too, to pass it along."""
+        function = self._functions[level]
+        if scope >= self._functions[level - 1].first_scope:
+            capture = (function.first_scope - 1 - scope, slot)
+        else:
+            capture = (e.UPVALUE, self._upvalue(level - 1, scope, slot))
+        if capture not in function.upvalues:
+            function.upvalues.append(capture)
+        return function.upvalues.index(capture)
 
     def _resolve_function(
         self, function: s.Function, function_type: FunctionType
     ) -> None:
         enclosing_function = self._current_function
         self._current_function = function_type
+        self._functions.append(FunctionScope(len(self._scopes)))
         self._begin_scope()
+        if function_type in (FunctionType.METHOD, FunctionType.INITIALIZER):
+            # The instance takes the first slot of the frame of a method
+            self._scopes[-1]["this"] = Local(0, defined=True)
         for param in function.params:
             self._declare(param)
             self._define(param)
         self._resolve(function.body)
-        self._end_scope()
+        scope = self._end_scope()
+        boxed_params = tuple(
+            local.slot
+            for local in scope.values()
+            if local.captured and local.declaration is None
+        )
+        self._table.functions[function] = (
+            self._functions.pop().upvalues,
+            boxed_params,
+        )
         self._current_function = enclosing_function
@@ -0,0 +1,182 @@
+"""Runtime support of the python code generated by the transpiler.
+
+Lox names are prefixed in python, so that they cannot clash with each other
+or with python: g_ for globals, p_ for properties and methods, and local
+names carry the number of their declaration (l3_count). The prefix is
+stripped to show the name to the user."""
+from types import FunctionType
+from typing import Any
+from environment import Cell
+from exceptions import PyloxRuntimeError
+from loxcallable import LoxCallable
+from pyloxinterpreter import binary_operation, pylox_stringify, unary_operation
+from pyloxtoken import Token, TokenType
+
+__all__ = [
+    "Cell",
+    "LoxObject",
+    "binary",
+    "call",
+    "get",
+    "instance",
+    "lox_name",
+    "print_value",
+    "set_cell",
+    "set_property",
+    "superclass",
+    "super_method",
+    "unary",
+]
+
+_OPERATORS = {
+    "-": TokenType.MINUS,
+    "+": TokenType.PLUS,
+    "/": TokenType.SLASH,
+    "*": TokenType.STAR,
+    "!": TokenType.BANG,
+    ">": TokenType.GREATER,
+    ">=": TokenType.GREATER_EQUAL,
+    "<": TokenType.LESS,
+    "<=": TokenType.LESS_EQUAL,
+}
+
+
+_MISSING = object()  # Fields can hold None
+
+
+def lox_name(name: str) -> str:
+    return name.split("_", 1)[1]
+
+
+def _token(lexeme: str, line: int) -> Token:
+    return Token(_OPERATORS.get(lexeme, TokenType.IDENTIFIER), lexeme, None,
+                 line)
+
+
+def _error(lexeme: str, line: int, message: str) -> PyloxRuntimeError:
+    return PyloxRuntimeError(_token(lexeme, line), message)
+
+
+class LoxObject:
+    """Base of the python classes of Lox classes. Fields are instance
+    attributes and shadow the methods, as in Lox."""
+
+    def __repr__(self) -> str:
+        return f"{lox_name(type(self).__name__)} instance"
+
+
+class BoundMethod:
+    """A method bound to an instance. Unlike python bound methods, two of
+    them are equal only if they are the same object, as in Lox."""
+
+    __slots__ = ("function", "instance")
+
+    def __init__(self, function: FunctionType, instance: LoxObject):
+        self.function = function
+        self.instance = instance
+
+    def __call__(self, *arguments: Any) -> Any:
+        return self.function(self.instance, *arguments)
+
+
+def binary(operator: str, left: Any, right: Any, line: int) -> Any:
+    """The operations the generated code does not handle inline"""
+    return binary_operation(_token(operator, line), left, right)
+
+
+def unary(operator: str, right: Any, line: int) -> Any:
+    return unary_operation(_token(operator, line), right)
+
+
+def _arity(callee: Any) -> int:
+    match callee:
+        case FunctionType():
+            return callee.__code__.co_argcount
+        case BoundMethod():
+            return callee.function.__code__.co_argcount - 1
+        case type():
+            init = getattr(callee, "p_init", None)
+            return 0 if init is None else init.__code__.co_argcount - 1
+    arity: int = callee.arity()
+    return arity
+
+
+def call(callee: Any, line: int, *arguments: Any) -> Any:
+    kind = type(callee)
+    if not (
+        kind is FunctionType
+        or kind is BoundMethod
+        or (kind is type and issubclass(callee, LoxObject))
+        or isinstance(callee, LoxCallable)
+    ):
+        raise _error("(", line, "Can only call functions and classes")
+    if len(arguments) != (arity := _arity(callee)):
+        raise _error(
+            "(",
+            line,
+            f"Expected {arity} arguments"
+            f"but got {len(arguments)} instead",
+        )
+    if kind is FunctionType or kind is BoundMethod:
+        return callee(*arguments)
+    if kind is type:
+        new = callee()
+        if (init := getattr(callee, "p_init", None)) is not None:
+            init(new, *arguments)
+        return new
+    return callee.call(None, list(arguments))
+
+
+def get(obj: Any, name: str, line: int) -> Any:
+    if not isinstance(obj, LoxObject):
+        raise _error(name, line, "Only instances have properties")
+    # Fields shadow the methods
+    if (value := obj.__dict__.get(name, _MISSING)) is not _MISSING:
+        return value
+    if (method := getattr(type(obj), name, None)) is None:
+        raise _error(name, line, f"Undefined property '{lox_name(name)}'.")
+    return BoundMethod(method, obj)
+
+
+def instance(obj: Any, name: str, line: int) -> LoxObject:
+    """Check the target of a property assignment"""
+    if not isinstance(obj, LoxObject):
+        raise _error(name, line, "Only instances have fields")
+    return obj
+
+
+def set_property(obj: LoxObject, name: str, value: Any) -> Any:
+    setattr(obj, name, value)
+    return value
+
+
+def set_cell(cell: Cell, value: Any) -> Any:
+    cell.value = value
+    return value
+
+
+def superclass(value: Any, name: str, line: int) -> type:
+    if not (type(value) is type and issubclass(value, LoxObject)):
+        raise _error(name, line, "Superclass must be a class")
+    return value
+
+
+def super_method(
+    klass: type, this: LoxObject, name: str, line: int
+) -> BoundMethod:
+    if (method := getattr(klass, name, None)) is None:
+        raise _error(name, line, f"Undefined property {lox_name(name)}.")
+    return BoundMethod(method, this)
+
+
+def print_value(value: Any) -> None:
+    match value:
+        case FunctionType():
+            text = f"<function {lox_name(value.__name__)}>"
+        case BoundMethod():
+            text = f"<function {lox_name(value.function.__name__)}>"
+        case type():
+            text = f"<class {lox_name(value.__name__)} >"
+        case _:
+            text = pylox_stringify(value)
+    print(text)
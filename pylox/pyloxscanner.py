@@ -1,11 +1,20 @@
 from __future__ import annotations  # NOTE: No need since python 3.11+
-from typing import Callable, Iterable, Iterator, TypeVar
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Iterator,
+    Mapping,
+    NoReturn,
+    TypeVar,
+)
 from dataclasses import dataclass, asdict
 from error_handler import ErrorData, report
-from pyloxtoken import Token, TokenType
-from source import Source
-from exceptions import ScannerError
-from string import ascii_letters
+from pyloxtoken import Token, TokenBuffer, TokenType
+from source import LineIndex, Source, SourceText, as_text
+from exceptions import InternalPyloxError, ScannerError
+from string import ascii_letters, digits
+import re
 
 
 RESERVED_KEYWORDS = {
@@ -108,9 +117,7 @@ def token_finder_slash_or_comment(c: str, source: Source) -> TokenMatch:
                     ErrorData(source.line(), None, "Untermined comment")
                 )
 
-            if (char := source.advance()) == "\n":
-                source.newline()
-            elif char == "*" and _opt_map_or_false(
+            if source.advance() == "*" and _opt_map_or_false(
                 source.peek(), lambda x: x == "/"
             ):
                 source.advance()
@@ -136,7 +143,6 @@ def token_finder_discard_factory(
 
 def token_finder_newline(c: str, source: Source) -> TokenMatch:
     if c == "\n":
-        source.newline()
         return TokenMatch.found()
     return TokenMatch.none()
 
@@ -145,9 +151,7 @@ def token_finder_string(c: str, source: Source) -> TokenMatch:
     if c != '"':
         return TokenMatch.none()
 
-    while _opt_map_or_false(char := source.peek(), lambda x: x != '"'):
-        if char == "\n":
-            source.newline()
+    while _opt_map_or_false(source.peek(), lambda x: x != '"'):
         source.advance()
     if source.is_at_end():
         return TokenMatch.error(
@@ -182,6 +186,13 @@ def token_finder_number(c: str, source: Source) -> TokenMatch:
     )
 
 
+def _keyword_or_identifier(source: Source) -> TokenMatch:
+    if (keyword := RESERVED_KEYWORDS.get(source.lexeme())) is not None:
+        return TokenMatch.found(Token.make(source, keyword))
+    else:
+        return TokenMatch.found(Token.make(source, TokenType.IDENTIFIER))
+
+
 def token_finder_keyword_or_identifier(c: str, source: Source) -> TokenMatch:
     def is_alpha(char: str) -> bool:
         return char in ascii_letters or char == "_"
@@ -193,10 +204,35 @@ def token_finder_keyword_or_identifier(c: str, source: Source) -> TokenMatch:
         return TokenMatch.none()
     while _opt_map_or_false(source.peek(), lambda x: is_alphanum(x)):
         source.advance()
-    if (keyword := RESERVED_KEYWORDS.get(source.lexeme())) is not None:
-        return TokenMatch.found(Token.make(source, keyword))
-    else:
-        return TokenMatch.found(Token.make(source, TokenType.IDENTIFIER))
+    return _keyword_or_identifier(source)
+
+
+_WHITESPACE_RUN = re.compile(r"[ \r\t\n]*")
+_IDENTIFIER_RUN = re.compile(r"[A-Za-z0-9_]*")
+_NUMBER_RUN = re.compile(r"[0-9]*(?:\.[0-9]+)?")
+
+
+def token_finder_whitespace_run(c: str, source: Source) -> TokenMatch:
+    """Discard a whole run of blanks and newlines in a single step.
+    Must only be dispatched on whitespace characters."""
+    source.advance_matching(_WHITESPACE_RUN)
+    return TokenMatch.found()
+
+
+def token_finder_number_run(c: str, source: Source) -> TokenMatch:
+    """Bulk version of token_finder_number.
+    Must only be dispatched on digits."""
+    source.advance_matching(_NUMBER_RUN)
+    return TokenMatch.found(
+        Token.make(source, TokenType.NUMBER, float(source.lexeme()))
+    )
+
+
+def token_finder_identifier_run(c: str, source: Source) -> TokenMatch:
+    """Bulk version of token_finder_keyword_or_identifier.
+    Must only be dispatched on letters or underscore."""
+    source.advance_matching(_IDENTIFIER_RUN)
+    return _keyword_or_identifier(source)
 
 
 TokenFinder = Callable[[str, Source], TokenMatch]
@@ -234,6 +270,65 @@ TOKEN_FINDERS: Iterable[TokenFinder] = (
 )
 
 
+TokenFinderTable = Mapping[str, TokenFinder]
+
+
+def make_token_finder_table(
+    *entries: tuple[Iterable[str], TokenFinder]
+) -> TokenFinderTable:
+    """Build a first-character dispatch table. Each entry maps all the
+    characters a lexeme can start with to the finder for that lexeme."""
+    table: dict[str, TokenFinder] = {}
+    for chars, finder in entries:
+        for char in chars:
+            assert char not in table, f"Ambiguous token finder for {char!r}"
+            table[char] = finder
+    return table
+
+
+TOKEN_FINDER_TABLE = make_token_finder_table(
+    ("(", token_finder_single_char_factory("(", TokenType.LEFT_PAREN)),
+    (")", token_finder_single_char_factory(")", TokenType.RIGHT_PAREN)),
+    ("{", token_finder_single_char_factory("{", TokenType.LEFT_BRACE)),
+    ("}", token_finder_single_char_factory("}", TokenType.RIGHT_BRACE)),
+    (",", token_finder_single_char_factory(",", TokenType.COMMA)),
+    (".", token_finder_single_char_factory(".", TokenType.DOT)),
+    ("-", token_finder_single_char_factory("-", TokenType.MINUS)),
+    ("+", token_finder_single_char_factory("+", TokenType.PLUS)),
+    (";", token_finder_single_char_factory(";", TokenType.SEMICOLON)),
+    ("*", token_finder_single_char_factory("*", TokenType.STAR)),
+    (
+        "=",
+        token_finder_disambiguate_factory(
+            "=", "=", TokenType.EQUAL, TokenType.EQUAL_EQUAL
+        ),
+    ),
+    (
+        "!",
+        token_finder_disambiguate_factory(
+            "!", "=", TokenType.BANG, TokenType.BANG_EQUAL
+        ),
+    ),
+    (
+        ">",
+        token_finder_disambiguate_factory(
+            ">", "=", TokenType.GREATER, TokenType.GREATER_EQUAL
+        ),
+    ),
+    (
+        "<",
+        token_finder_disambiguate_factory(
+            "<", "=", TokenType.LESS, TokenType.LESS_EQUAL
+        ),
+    ),
+    ("/", token_finder_slash_or_comment),
+    (" \r\t\n", token_finder_whitespace_run),
+    ('"', token_finder_string),
+    (digits, token_finder_number_run),
+    (ascii_letters + "_", token_finder_identifier_run),
+)
+
+
 class Scanner:
     def __init__(
         self,
@@ -260,14 +355,22 @@ class Scanner:
 
         for finder in self._token_finders:
             token_match = finder(c, self._source)
-            match token_match.result:
-                case (Token() | None) as result:  # noqa(E211)
-                    return result  # noqa(F821)
-                case ErrorData(_, _, message) as err_data:
-                    report(asdict(err_data))  # noqa(F821)
-                    raise ScannerError(message)  # noqa(F821)
-                case NotFound():
-                    continue
+            if type(token_match.result) is not NotFound:
+                return self._unwrap(token_match)
+        self._invalid_character(c)
+
+    def _unwrap(self, token_match: TokenMatch) -> Token | None:
+        match token_match.result:
+            case (Token() | None) as result:  # noqa(E211)
+                return result  # noqa(F821)
+            case ErrorData(_, _, message) as err_data:
+                report(asdict(err_data))  # noqa(F821)
+                raise ScannerError(message)  # noqa(F821)
+        raise InternalPyloxError(
+            f"Unexpected token finder result: {token_match.result}"
+        )
+
+    def _invalid_character(self, c: str) -> NoReturn:
         report(
             asdict(
                 ErrorData(
@@ -276,3 +379,176 @@ class Scanner:
             )
         )
         raise ScannerError("Invalid character.")
+
+
+_OPERATORS = {
+    "(": TokenType.LEFT_PAREN,
+    ")": TokenType.RIGHT_PAREN,
+    "{": TokenType.LEFT_BRACE,
+    "}": TokenType.RIGHT_BRACE,
+    ",": TokenType.COMMA,
+    ".": TokenType.DOT,
+    "-": TokenType.MINUS,
+    "+": TokenType.PLUS,
+    ";": TokenType.SEMICOLON,
+    "/": TokenType.SLASH,
+    "*": TokenType.STAR,
+    "!": TokenType.BANG,
+    "!=": TokenType.BANG_EQUAL,
+    "=": TokenType.EQUAL,
+    "==": TokenType.EQUAL_EQUAL,
+    ">": TokenType.GREATER,
+    ">=": TokenType.GREATER_EQUAL,
+    "<": TokenType.LESS,
+    "<=": TokenType.LESS_EQUAL,
+}
+
+_MASTER_PATTERN_TEMPLATE = r"""
+    (?P<blank>[ \r\t\n]+)
+    | (?P<identifier>[A-Za-z_][A-Za-z0-9_]*)
+    | (?P<operator>[!=<>]=?|[(){},.\-+;*]|/(?![/*]))
+    | (?P<number>[0-9]+(?:\.[0-9]+)?)
+    | (?P<string>"[^"]*")
+    | (?P<comment>//[^\n]*)
+    | (?P<block_comment>/\*.*?\*/)
+    | (?P<untermined_string>".*)
+    | (?P<untermined_comment>/\*.*)
+    | (?P<invalid>%s)
+"""
+
+_MASTER_PATTERN = re.compile(
+    _MASTER_PATTERN_TEMPLATE % ".", re.VERBOSE | re.DOTALL
+)
+
+_RESERVED_KEYWORDS_BYTES = {
+    keyword.encode(): token_type
+    for keyword, token_type in RESERVED_KEYWORDS.items()
+}
+_OPERATORS_BYTES = {
+    operator.encode(): token_type for operator, token_type in _OPERATORS.items()
+}
+
+# Same pattern for utf-8 encoded sources: an invalid character may span
+# several bytes, and it must be reported as a whole.
+_MASTER_BYTES_PATTERN = re.compile(
+    (_MASTER_PATTERN_TEMPLATE % r"[\x00-\x7f\xc0-\xff][\x80-\xbf]*").encode(),
+    re.VERBOSE | re.DOTALL,
+)
+
+
+class RegexScanner:
+    """Scanner that recognises every token class with a single compiled
+    regular expression. It yields the same tokens (and reports the same
+    errors) as Scanner with TOKEN_FINDERS, without the None placeholders
+    for discarded lexemes.
+    The source can also be utf-8 encoded bytes, e.g. a memory-mapped file:
+    in that case only the lexemes that end up in a Token are decoded.
+    Scanning can start anywhere between two lexemes, given the offset and
+    the line of that position. Lines are looked up in a LineIndex only for
+    the tokens that need one."""
+
+    def __init__(self, source: SourceText, start: int = 0, line: int = 1):
+        self._source = source
+        self._start = start
+        self._lines = LineIndex(source, start, line)
+
+    def scan_tokens(self) -> Iterator[Token | None]:
+        for token_type, found in self._scan():
+            lexeme = as_text(found.group())
+            match token_type:
+                case TokenType.NUMBER:
+                    literal: Any = float(lexeme)
+                case TokenType.STRING:
+                    literal = lexeme[1:-1]
+                case _:
+                    literal = None
+            line = self._lines.line(found.end())
+            yield Token(token_type, lexeme, literal, line)
+
+        end = len(self._source)
+        yield Token(TokenType.EOF, "", None, self._lines.line(end))
+
+    def scan_buffer(self, lazy: bool = False) -> TokenBuffer:
+        """Scan the source straight into a TokenBuffer, without creating any
+        Token object. A lazy buffer is only filled as its tokens are fetched,
+        so a consumer that stops early does not pay for the rest."""
+        buffer = TokenBuffer(self._source, self._lines)
+        if lazy:
+            buffer.fill_lazily(self._fill(buffer))
+        else:
+            for _ in self._fill(buffer):
+                pass
+        return buffer
+
+    def _fill(self, buffer: TokenBuffer) -> Iterator[None]:
+        """Append the tokens to buffer, one at a time. The stream is closed
+        with EOF even on errors, so that its consumers can stop cleanly"""
+        try:
+            for token_type, found in self._scan():
+                start, end = found.span()
+                buffer.append(token_type, start, end)
+                yield
+        except ScannerError:
+            end = len(self._source)
+            buffer.append(TokenType.EOF, end, end)
+            buffer.truncated = True
+            raise
+        end = len(self._source)
+        buffer.append(TokenType.EOF, end, end)
+
+    def _scan(self) -> Iterator[tuple[TokenType, re.Match]]:
+        """Yield the type and the match of every significant lexeme"""
+        if isinstance(self._source, str):
+            pattern: re.Pattern = _MASTER_PATTERN
+            keywords: dict = RESERVED_KEYWORDS
+            operators: dict = _OPERATORS
+        else:
+            pattern = _MASTER_BYTES_PATTERN
+            keywords = _RESERVED_KEYWORDS_BYTES
+            operators = _OPERATORS_BYTES
+        for match in pattern.finditer(self._source, self._start):
+            kind = match.lastgroup
+            if kind == "blank":
+                continue
+            if kind == "identifier":
+                yield keywords.get(match.group(), TokenType.IDENTIFIER), match
+            elif kind == "operator":
+                yield operators[match.group()], match
+            elif kind == "number":
+                yield TokenType.NUMBER, match
+            elif kind == "string":
+                yield TokenType.STRING, match
+            elif kind == "block_comment" or kind == "comment":
+                continue
+            elif kind == "untermined_string":
+                self._error(match, "Untermined string")
+            elif kind == "untermined_comment":
+                self._error(match, "Untermined comment")
+            else:
+                self._error(
+                    match,
+                    f"Invalid character parsed: {as_text(match.group())}",
+                    "Invalid character.",
+                )
+
+    def _error(
+        self, match: re.Match, message: str, summary: str | None = None
+    ) -> NoReturn:
+        line = self._lines.line(match.end())
+        report(asdict(ErrorData(line, None, message)))
+        raise ScannerError(message if summary is None else summary)
+
+
+class DispatchScanner(Scanner):
+    """Scanner that routes each character straight to the only token finder
+    that can match it, instead of probing every finder in turn."""
+
+    def __init__(self, source: Source, table: TokenFinderTable):
+        super().__init__(source, table.values())
+        self._table = table
+
+    def _scan_token(self) -> Token | None:
+        c = self._source.advance()
+        if (finder := self._table.get(c)) is None:
+            self._invalid_character(c)
+        return self._unwrap(finder(c, self._source))
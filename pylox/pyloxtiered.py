@@ -0,0 +1,122 @@
+from typing import Any
+import expr as e
+import stmt as s
+from environment import Cell, Environment
+from loxcallable import LoxFunction, LoxInstance
+from pyloxcompiler import Code, Compiler, Feedback
+from pyloxinterpreter import Interpreter, as_boolean, binary_operation
+
+# Calls of a function, and iterations of a loop, after which it is compiled
+HOT_CALLS = 100
+HOT_ITERATIONS = 1000
+
+# The functions and loops that can be compiled
+Hot = s.Function | s.For | s.While
+
+
+class TieredInterpreter(Interpreter):
+    """Walk the tree of cold code, and compile to closures the functions and
+    loops that get hot. Meanwhile the tree walker records the operand types
+    of the binary operations and the shapes of the instances at the property
+    sites, for the compiled code to specialise on them.
+    When an assumption fails, the code goes back to the tree walker until it
+    gets hot again, with what it learnt.
+    What is learnt and compiled is kept by the interpreter, not on the
+    nodes: another interpreter may run the same tree."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        # Calls of the functions and iterations of the loops not compiled
+        self._counts: dict[Hot, int] = {}
+        self._code: dict[Hot, Code] = {}
+        self._feedback = Feedback()
+
+    def execute_function(
+        self, function: s.Function, frame: Environment, closure: list[Cell]
+    ) -> None:
+        if (code := self._code.get(function)) is None:
+            calls = self._counts[function] = self._counts.get(function, 0) + 1
+            if calls < HOT_CALLS:
+                super().execute_function(function, frame, closure)
+                return
+            compiler = self._compiler(function)
+            code = self._code[function] = compiler.compile_statements(
+                function.body
+            )
+        code(frame, closure)
+
+    def visit_while_stmt(self, stmt: s.While) -> None:
+        if stmt in self._code or not self._warm_up(
+            stmt, stmt.condition, stmt.body, None
+        ):
+            self._code[stmt](self._environemnt, self._closure)
+        return None
+
+    def _loop(self, stmt: s.For) -> None:
+        if stmt.initializer is not None:
+            self._execute(stmt.initializer)
+        if stmt in self._code or not self._warm_up(
+            stmt, stmt.condition, stmt.body, stmt.increment
+        ):
+            self._code[stmt](self._environemnt, self._closure)
+
+    def _warm_up(
+        self,
+        loop: s.For | s.While,
+        condition: e.Expr | None,
+        body: s.Stmt,
+        increment: e.Expr | None,
+    ) -> bool:
+        """Walk the loop until it ends, and return True, or until it gets
+        hot. Then it is compiled, for the compiled code to carry on."""
+        iterations = self._counts.get(loop, 0)
+        try:
+            while condition is None or as_boolean(self._evaluate(condition)):
+                self._execute(body)
+                if increment is not None:
+                    self._evaluate(increment)
+                iterations += 1
+                if iterations >= HOT_ITERATIONS:
+                    compiler = self._compiler(loop)
+                    self._code[loop] = compiler.loop(
+                        condition, body, increment
+                    )
+                    return False
+            return True
+        finally:
+            self._counts[loop] = iterations
+
+    def _compiler(self, hot: Hot) -> Compiler:
+        def deoptimize() -> None:
+            self._code.pop(hot, None)
+            self._counts[hot] = 0
+
+        return Compiler(self, self._isrepl, deoptimize, self._feedback)
+
+    def visit_binary_expr(self, expr: e.Binary) -> Any:
+        left = self._evaluate(expr.left)
+        right = self._evaluate(expr.right)
+        kind = type(left)
+        seen = self._feedback.types.get(expr)
+        if kind is not type(right) or (seen is not None and seen is not kind):
+            kind = object
+        self._feedback.types[expr] = kind
+        return binary_operation(expr.operator, left, right)
+
+    def _get(self, obj: Any, expr: e.Get) -> Any:
+        self._record_shape(obj, expr)
+        return super()._get(obj, expr)
+
+    def _method(self, obj: LoxInstance, expr: e.Get) -> LoxFunction | None:
+        self._record_shape(obj, expr)
+        return super()._method(obj, expr)
+
+    def _set(self, obj: LoxInstance, expr: e.Set, value: Any) -> None:
+        self._record_shape(obj, expr)
+        super()._set(obj, expr, value)
+
+    def _record_shape(self, obj: Any, expr: e.Get | e.Set) -> None:
+        shape = obj.shape if type(obj) is LoxInstance else None
+        if self._feedback.shapes.get(expr, shape) is not shape:
+            shape = None
+        self._feedback.shapes[expr] = shape
@@ -1,8 +1,9 @@
 from __future__ import annotations  # NOTE: No need since python 3.11+
 from enum import Enum, auto
 from dataclasses import dataclass
-from typing import Any
-from source import Source
+from typing import Any, Iterator
+from array import array
+from source import LineIndex, Source, SourceText, as_text
 
 
 class TokenType(Enum):
@@ -77,3 +78,82 @@ class Token:
             literal=literal,
             line=source.line(),
         )
+
+
+_TOKEN_TYPES = {token_type.value: token_type for token_type in TokenType}
+
+
+class TokenBuffer:
+    """Compact storage for a whole token stream, laid out as one array per
+    token attribute. Lexemes are not copied: they are sliced from the source
+    only when a Token is actually needed, and so are lines, looked up in
+    the LineIndex of the source."""
+
+    def __init__(self, source: SourceText, lines: LineIndex | None = None):
+        self._source = source
+        self._lines = LineIndex(source) if lines is None else lines
+        self.kinds = array("B")
+        self.starts = array("I")
+        self.ends = array("I")
+        self._pending: Iterator[None] | None = None
+        # True if scanning stopped early because of an error
+        self.truncated = False
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def fill_lazily(self, pending: Iterator[None]) -> None:
+        """Fill the buffer on demand: each step of pending appends a token"""
+        self._pending = pending
+
+    def fetch(self, index: int) -> bool:
+        """Return True if there is a token at index, scanning it first if the
+        buffer is filled lazily"""
+        while index >= len(self.kinds):
+            if self._pending is None:
+                return False
+            if next(self._pending, False) is False:
+                self._pending = None
+        return True
+
+    def append(self, token_type: TokenType, start: int, end: int) -> None:
+        self.kinds.append(token_type.value)
+        self.starts.append(start)
+        self.ends.append(end)
+
+    def token_type(self, index: int) -> TokenType:
+        return _TOKEN_TYPES[self.kinds[index]]
+
+    def line(self, index: int) -> int:
+        """The line of a token is the one where it ends, like for Scanner"""
+        return self._lines.line(self.ends[index])
+
+    def position(self, index: int) -> tuple[int, int]:
+        """Returns line and column where the token at index starts"""
+        return self._lines.position(self.starts[index])
+
+    def lexeme(self, index: int) -> str:
+        return as_text(self._source[self.starts[index] : self.ends[index]])
+
+    def literal(self, index: int) -> Any:
+        """Literals are derived from the lexeme, so they need no storage"""
+        match self.token_type(index):
+            case TokenType.NUMBER:
+                return float(self.lexeme(index))
+            case TokenType.STRING:
+                return self.lexeme(index)[1:-1]
+        return None
+
+    def token(self, index: int) -> Token:
+        """Materialise the Token stored at index"""
+        token_type = _TOKEN_TYPES[self.kinds[index]]
+        end = self.ends[index]
+        lexeme = as_text(self._source[self.starts[index] : end])
+        match token_type:
+            case TokenType.NUMBER:
+                literal: Any = float(lexeme)
+            case TokenType.STRING:
+                literal = lexeme[1:-1]
+            case _:
+                literal = None
+        return Token(token_type, lexeme, literal, self._lines.line(end))
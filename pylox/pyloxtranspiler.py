@@ -0,0 +1,690 @@
+from __future__ import annotations  # NOTE: No need since python 3.11+
+import ast
+import copy
+from types import CodeType
+from typing import Any, TypeVar
+import expr as e
+import stmt as s
+from pyloxtoken import Token, TokenType
+from exceptions import PyloxRuntimeError
+from error_handler import report
+from native import Clock
+from pyloxinterpreter import Interpreter
+import pyloxruntime
+
+# Python file name of the generated code: its line numbers are Lox lines
+FILENAME = "<lox>"
+
+_COMPARISONS: dict[TokenType, type[ast.cmpop]] = {
+    TokenType.EQUAL_EQUAL: ast.Eq,
+    TokenType.BANG_EQUAL: ast.NotEq,
+    TokenType.GREATER: ast.Gt,
+    TokenType.GREATER_EQUAL: ast.GtE,
+    TokenType.LESS: ast.Lt,
+    TokenType.LESS_EQUAL: ast.LtE,
+}
+
+_ARITHMETIC: dict[TokenType, type[ast.operator]] = {
+    TokenType.MINUS: ast.Sub,
+    TokenType.PLUS: ast.Add,
+    TokenType.SLASH: ast.Div,
+    TokenType.STAR: ast.Mult,
+}
+
+
+def _helper(name: str) -> str:
+    """Name of a runtime helper in the generated code"""
+    return f"_lox_{name}"
+
+
+def _prelude(natives: bool) -> list[ast.stmt]:
+    imports: list[ast.stmt] = [
+        ast.ImportFrom(
+            module=pyloxruntime.__name__,
+            names=[
+                ast.alias(name=name, asname=_helper(name))
+                for name in pyloxruntime.__all__
+            ],
+            level=0,
+        )
+    ]
+    if natives:
+        imports.append(
+            ast.ImportFrom(
+                module=Clock.__module__,
+                names=[ast.alias(name=Clock.__name__)],
+                level=0,
+            )
+        )
+        imports.append(ast.parse(f"g_clock = {Clock.__name__}()").body[0])
+    return imports
+
+
+def _load(name: str) -> ast.Name:
+    return ast.Name(id=name, ctx=ast.Load())
+
+
+def _store(name: str) -> ast.Name:
+    return ast.Name(id=name, ctx=ast.Store())
+
+
+Node = TypeVar("Node", bound=ast.expr | ast.stmt)
+
+
+def _at(node: Node, line: int) -> Node:
+    node.lineno = node.end_lineno = line
+    node.col_offset = node.end_col_offset = 0
+    return node
+
+
+def _call(helper: str, *arguments: ast.expr) -> ast.Call:
+    return ast.Call(
+        func=_load(_helper(helper)), args=list(arguments), keywords=[]
+    )
+
+
+def _is(value: ast.expr, constant: Any, negate: bool = False) -> ast.Compare:
+    return ast.Compare(
+        left=value,
+        ops=[ast.IsNot() if negate else ast.Is()],
+        comparators=[ast.Constant(constant)],
+    )
+
+
+def _type(value: ast.expr) -> ast.expr:
+    return ast.Call(func=_load("type"), args=[value], keywords=[])
+
+
+def _one_of(kind: ast.expr, kinds: tuple[str, ...]) -> ast.expr:
+    tests: list[ast.expr] = [
+        ast.Compare(left=kind, ops=[ast.Is()], comparators=[_load(name)])
+        for name in kinds
+    ]
+    return tests[0] if len(tests) == 1 else ast.BoolOp(op=ast.Or(),
+                                                       values=tests)
+
+
+def _body(statements: list[ast.stmt]) -> list[ast.stmt]:
+    return statements or [ast.Pass()]
+
+
+def _is_boolean(expression: e.Expr) -> bool:
+    """Whether the expression always evaluates to a bool, so that python
+    truthiness is the same as Lox's"""
+    match expression:
+        case e.Binary(operator=operator):
+            return operator.token_type in _COMPARISONS
+        case e.Unary(operator=operator):
+            return operator.token_type is TokenType.BANG
+        case e.Literal(value=value):
+            return isinstance(value, bool)
+        case e.Grouping(expression=inner):
+            return _is_boolean(inner)
+    return False
+
+
+class _Function:
+    """The python function being generated"""
+
+    def __init__(self, upvalues: list[str]):
+        self.upvalues = upvalues  # Python names of the captured cells
+        self.this: ast.expr | None = None  # Returned by an initializer
+        self.globals: set[str] = set()  # The globals it assigns
+
+
+class Transpiler:
+    """Translate a resolved program into a python module. Lox variables
+    become python variables: the resolution picks their python name, so
+    shadowing is just renaming. Captured variables live in cells, which a
+    function receives as keyword only defaults: its closure is bound when
+    it is declared, as in Lox. Classes are python classes, and everything
+    that may fail calls a runtime helper, passing the Lox line."""
+
+    def __init__(self, isrepl: bool):
+        self._isrepl = isrepl
+        self._scopes: list[list[str]] = []  # Python names by slot
+        self._functions = [_Function([])]
+        self._count = 0
+        self._line = 1
+
+    def transpile(
+        self, statements: list[s.Stmt], natives: bool = False
+    ) -> ast.Module:
+        """The program as a module. With the natives, it can run on its
+        own."""
+        body = _prelude(natives) + self._statements(statements)
+        module = ast.Module(body=body, type_ignores=[])
+        return ast.fix_missing_locations(module)
+
+    def _statements(self, statements: list[s.Stmt]) -> list[ast.stmt]:
+        return [
+            _at(node, self._line)
+            for statement in statements
+            for node in statement.accept(self)
+        ]
+
+    def _expression(self, expression: e.Expr) -> ast.expr:
+        node: ast.expr = expression.accept(self)
+        return node
+
+    def _new_name(self, lexeme: str, prefix: str = "l") -> str:
+        self._count += 1
+        return f"{prefix}{self._count}_{lexeme}"
+
+    def _temporary(self) -> str:
+        self._count += 1
+        return f"_t{self._count}"
+
+    def _declare(self, name: Token) -> str:
+        self._line = name.line
+        if not self._scopes:
+            return f"g_{name.lexeme}"
+        python_name = self._new_name(name.lexeme)
+        self._scopes[-1].append(python_name)
+        return python_name
+
+    def _variable(
+        self, expr: e.Assign | e.Super | e.This | e.Variable, lexeme: str
+    ) -> tuple[str, bool]:
+        """The python name of a variable, and whether it holds a cell"""
+        match expr.depth:
+            case e.GLOBAL:
+                return f"g_{lexeme}", False
+            case e.UPVALUE:
+                return self._functions[-1].upvalues[expr.slot], True
+        return self._scopes[-1 - expr.depth][expr.slot], expr.boxed
+
+    def _read(
+        self, expr: e.Super | e.This | e.Variable, lexeme: str, line: int
+    ) -> ast.expr:
+        name, boxed = self._variable(expr, lexeme)
+        # An undefined global raises a NameError at this line
+        variable = _at(_load(name), line)
+        if boxed:
+            return ast.Attribute(value=variable, attr="value", ctx=ast.Load())
+        return variable
+
+    def _truthy(self, expression: e.Expr) -> ast.expr:
+        """Lox truthiness of the expression as a python condition"""
+        value = self._expression(expression)
+        if _is_boolean(expression):
+            return value
+        temporary = self._temporary()
+        return ast.BoolOp(
+            op=ast.And(),
+            values=[
+                _is(ast.NamedExpr(target=_store(temporary), value=value),
+                    None, negate=True),
+                _is(_load(temporary), False, negate=True),
+            ],
+        )
+
+    def _operand(self, value: ast.expr) -> tuple[ast.expr, ast.expr]:
+        """How to evaluate an operand first and how to use it after. Only
+        what may have side effects is stored in a temporary."""
+        if isinstance(value, (ast.Name, ast.Constant)):
+            return value, value
+        temporary = self._temporary()
+        return ast.NamedExpr(target=_store(temporary), value=value), _load(
+            temporary
+        )
+
+    def _function(
+        self, stmt: s.Function, name: str, this: bool = False
+    ) -> ast.FunctionDef:
+        captures = [
+            self._functions[-1].upvalues[slot]
+            if depth == e.UPVALUE
+            else self._scopes[-1 - depth][slot]
+            for depth, slot in stmt.upvalues
+        ]
+        scope = [self._new_name("this")] if this else []
+        scope += [self._new_name(param.lexeme) for param in stmt.params]
+        params = list(scope)
+        function = _Function(captures)
+        if this and stmt.name.lexeme == "init":
+            function.this = _load(scope[0])
+            if 0 in stmt.boxed_params:
+                function.this = ast.Attribute(
+                    value=function.this, attr="value", ctx=ast.Load()
+                )
+        self._functions.append(function)
+        self._scopes.append(scope)
+        body: list[ast.stmt] = [
+            ast.Assign(
+                targets=[_store(scope[slot])],
+                value=_call("Cell", _load(scope[slot])),
+            )
+            for slot in stmt.boxed_params
+        ]
+        body += self._statements(stmt.body)
+        if function.this is not None:
+            body.append(self._return(None))
+        self._scopes.pop()
+        self._functions.pop()
+        if function.globals:
+            body.insert(0, ast.Global(names=sorted(function.globals)))
+        return _at(
+            ast.FunctionDef(
+                name=name,
+                args=ast.arguments(
+                    posonlyargs=[],
+                    args=[ast.arg(arg=param) for param in params],
+                    kwonlyargs=[ast.arg(arg=capture) for capture in captures],
+                    kw_defaults=[_load(capture) for capture in captures],
+                    defaults=[],
+                ),
+                body=_body(body),
+                decorator_list=[],
+            ),
+            stmt.name.line,
+        )
+
+    def _return(self, value: ast.expr | None) -> ast.Return:
+        this = self._functions[-1].this
+        if this is not None:
+            value = copy.deepcopy(this)
+        return ast.Return(value=value)
+
+    def _assign(self, expr: e.Assign, value: ast.expr) -> ast.expr:
+        name, boxed = self._variable(expr, expr.name.lexeme)
+        if boxed:
+            return _call("set_cell", _load(name), value)
+        if expr.depth == e.GLOBAL:
+            if len(self._functions) > 1:
+                self._functions[-1].globals.add(name)
+            # Read it first, as assigning an undefined global is an error
+            value = ast.Subscript(
+                value=ast.Tuple(
+                    elts=[value, _at(_load(name), expr.name.line)],
+                    ctx=ast.Load(),
+                ),
+                slice=ast.Constant(0),
+                ctx=ast.Load(),
+            )
+        return ast.NamedExpr(target=_store(name), value=value)
+
+    def visit_block_stmt(self, stmt: s.Block) -> list[ast.stmt]:
+        if not stmt.scoped:
+            return self._statements(stmt.statements)
+        self._scopes.append([])
+        statements = self._statements(stmt.statements)
+        self._scopes.pop()
+        return statements
+
+    def visit_class_stmt(self, stmt: s.Class) -> list[ast.stmt]:
+        statements: list[ast.stmt] = []
+        base: ast.expr = _load(_helper("LoxObject"))
+        if stmt.superclass is not None:
+            token = stmt.superclass.name
+            superclass = _call(
+                "superclass",
+                self._expression(stmt.superclass),
+                ast.Constant(token.lexeme),
+                ast.Constant(token.line),
+            )
+            # The methods capture it from its own scope
+            super_name = self._new_name("super")
+            statements.append(
+                ast.Assign(
+                    targets=[_store(super_name)],
+                    value=_call("Cell", superclass),
+                )
+            )
+            base = ast.Attribute(
+                value=_load(super_name), attr="value", ctx=ast.Load()
+            )
+        name = self._declare(stmt.name)
+        class_name = name
+        if stmt.boxed:
+            class_name = self._new_name(stmt.name.lexeme, "c")
+            statements.append(
+                ast.Assign(targets=[_store(name)], value=_call("Cell"))
+            )
+        if stmt.superclass is not None:
+            self._scopes.append([super_name])
+        methods: list[ast.stmt] = []
+        for method in stmt.methods:
+            methods.append(
+                self._function(method, f"p_{method.name.lexeme}", this=True)
+            )
+        if stmt.superclass is not None:
+            self._scopes.pop()
+        statements.append(
+            ast.ClassDef(
+                name=class_name,
+                bases=[base],
+                keywords=[],
+                body=_body(methods),
+                decorator_list=[],
+            )
+        )
+        if stmt.boxed:
+            statements.append(self._set_cell(name, class_name))
+        return statements
+
+    def _set_cell(self, cell: str, value: str) -> ast.stmt:
+        return ast.Assign(
+            targets=[ast.Attribute(value=_load(cell), attr="value",
+                                   ctx=ast.Store())],
+            value=_load(value),
+        )
+
+    def visit_expression_stmt(self, stmt: s.Expression) -> list[ast.stmt]:
+        expression = self._expression(stmt.expression)
+        if self._isrepl:
+            return [ast.Expr(value=_call("print_value", expression))]
+        match expression:
+            case ast.NamedExpr(target=target, value=value):
+                return [ast.Assign(targets=[target], value=value)]
+        return [ast.Expr(value=expression)]
+
+    def visit_for_stmt(self, stmt: s.For) -> list[ast.stmt]:
+        scoped = isinstance(stmt.initializer, s.Var)
+        if scoped:
+            self._scopes.append([])
+        statements: list[ast.stmt] = []
+        if stmt.initializer is not None:
+            statements += stmt.initializer.accept(self)
+        condition: ast.expr = ast.Constant(True)
+        if stmt.condition is not None:
+            condition = self._truthy(stmt.condition)
+        body = stmt.body.accept(self)
+        if stmt.increment is not None:
+            body.append(ast.Expr(value=self._expression(stmt.increment)))
+        statements.append(
+            ast.While(test=condition, body=_body(body), orelse=[])
+        )
+        if scoped:
+            self._scopes.pop()
+        return statements
+
+    def visit_function_stmt(self, stmt: s.Function) -> list[ast.stmt]:
+        name = self._declare(stmt.name)
+        if not stmt.boxed:
+            return [self._function(stmt, name)]
+        # A function that captures itself needs its cell first
+        function_name = self._new_name(stmt.name.lexeme, "f")
+        return [
+            ast.Assign(targets=[_store(name)], value=_call("Cell")),
+            self._function(stmt, function_name),
+            self._set_cell(name, function_name),
+        ]
+
+    def visit_if_stmt(self, stmt: s.If) -> list[ast.stmt]:
+        condition = self._truthy(stmt.condition)
+        then_branch = stmt.then_branch.accept(self)
+        else_branch = []
+        if stmt.else_branch is not None:
+            else_branch = stmt.else_branch.accept(self)
+        return [
+            ast.If(test=condition, body=_body(then_branch), orelse=else_branch)
+        ]
+
+    def visit_print_stmt(self, stmt: s.Print) -> list[ast.stmt]:
+        return [
+            ast.Expr(
+                value=_call("print_value", self._expression(stmt.expression))
+            )
+        ]
+
+    def visit_return_stmt(self, stmt: s.Return) -> list[ast.stmt]:
+        self._line = stmt.keyword.line
+        value = None
+        if stmt.value is not None:
+            value = self._expression(stmt.value)
+        return [self._return(value)]
+
+    def visit_var_stmt(self, stmt: s.Var) -> list[ast.stmt]:
+        value: ast.expr = ast.Constant(None)
+        if stmt.initializer is not None:
+            value = self._expression(stmt.initializer)
+        name = self._declare(stmt.name)
+        if stmt.boxed:
+            value = _call("Cell", value)
+        return [ast.Assign(targets=[_store(name)], value=value)]
+
+    def visit_while_stmt(self, stmt: s.While) -> list[ast.stmt]:
+        condition = self._truthy(stmt.condition)
+        body = stmt.body.accept(self)
+        return [ast.While(test=condition, body=_body(body), orelse=[])]
+
+    def visit_assign_expr(self, expr: e.Assign) -> ast.expr:
+        return self._assign(expr, self._expression(expr.value))
+
+    def visit_binary_expr(self, expr: e.Binary) -> ast.expr:
+        token = expr.operator
+        self._line = token.line
+        left, right = self._expression(expr.left), self._expression(expr.right)
+        token_type = token.token_type
+        if token_type in (TokenType.EQUAL_EQUAL, TokenType.BANG_EQUAL):
+            return ast.Compare(
+                left=left, ops=[_COMPARISONS[token_type]()], comparators=[right]
+            )
+        # Inline the operation on two floats, or two strings for +: what
+        # cannot fail. Everything else goes through the interpreter's
+        # binary_operation, for its checks and error messages.
+        left, left_value = self._operand(left)
+        right, right_value = self._operand(right)
+        kinds = ("float", "str") if token_type is TokenType.PLUS else (
+            "float",
+        )
+        test = self._same_kind(left, right, kinds)
+        if test is None:
+            left_value, right_value = left, right
+        fallback = _call(
+            "binary",
+            ast.Constant(token.lexeme),
+            left_value,
+            right_value,
+            ast.Constant(token.line),
+        )
+        if test is None:
+            return fallback
+        if token_type is TokenType.SLASH and not (
+            isinstance(right_value, ast.Constant) and right_value.value
+        ):
+            test = ast.BoolOp(op=ast.And(), values=[test, right_value])
+        operation: ast.expr
+        if token_type in _ARITHMETIC:
+            operation = ast.BinOp(
+                left=left_value, op=_ARITHMETIC[token_type](), right=right_value
+            )
+        else:
+            operation = ast.Compare(
+                left=left_value,
+                ops=[_COMPARISONS[token_type]()],
+                comparators=[right_value],
+            )
+        return ast.IfExp(test=test, body=operation, orelse=fallback)
+
+    def _same_kind(
+        self, left: ast.expr, right: ast.expr, kinds: tuple[str, ...]
+    ) -> ast.expr | None:
+        """Test that both operands are of one of the kinds, evaluating
+        both. None if they never are."""
+        match left, right:
+            case ast.Constant(), ast.Constant():
+                return None
+            case ast.Constant(value=value), operand:
+                pass
+            case operand, ast.Constant(value=value):
+                pass
+            case _:
+                kind = self._temporary()
+                return ast.BoolOp(
+                    op=ast.And(),
+                    values=[
+                        ast.Compare(
+                            left=ast.NamedExpr(
+                                target=_store(kind), value=_type(left)
+                            ),
+                            ops=[ast.Is()],
+                            comparators=[_type(right)],
+                        ),
+                        _one_of(_load(kind), kinds),
+                    ],
+                )
+        if type(value).__name__ not in kinds:
+            return None
+        return _one_of(_type(operand), (type(value).__name__,))
+
+    def visit_call_expr(self, expr: e.Call) -> ast.expr:
+        callee = self._expression(expr.callee)
+        self._line = expr.paren.line
+        return _call(
+            "call",
+            callee,
+            ast.Constant(expr.paren.line),
+            *[self._expression(argument) for argument in expr.arguments],
+        )
+
+    def visit_get_expr(self, expr: e.Get) -> ast.expr:
+        self._line = expr.name.line
+        return _call(
+            "get",
+            self._expression(expr.obj),
+            ast.Constant(f"p_{expr.name.lexeme}"),
+            ast.Constant(expr.name.line),
+        )
+
+    def visit_grouping_expr(self, expr: e.Grouping) -> ast.expr:
+        return self._expression(expr.expression)
+
+    def visit_literal_expr(self, expr: e.Literal) -> ast.expr:
+        return ast.Constant(expr.value)
+
+    def visit_logical_expr(self, expr: e.Logical) -> ast.expr:
+        right = self._expression(expr.right)
+        if _is_boolean(expr.left):
+            # Python's and/or are Lox's on bools
+            op = ast.Or() if expr.operator.token_type is TokenType.OR else (
+                ast.And()
+            )
+            return ast.BoolOp(op=op, values=[self._expression(expr.left),
+                                             right])
+        temporary = self._temporary()
+        truthy = ast.BoolOp(
+            op=ast.And(),
+            values=[
+                _is(
+                    ast.NamedExpr(
+                        target=_store(temporary),
+                        value=self._expression(expr.left),
+                    ),
+                    None,
+                    negate=True,
+                ),
+                _is(_load(temporary), False, negate=True),
+            ],
+        )
+        if expr.operator.token_type is TokenType.OR:
+            return ast.IfExp(test=truthy, body=_load(temporary), orelse=right)
+        return ast.IfExp(test=truthy, body=right, orelse=_load(temporary))
+
+    def visit_set_expr(self, expr: e.Set) -> ast.expr:
+        self._line = expr.name.line
+        name = ast.Constant(f"p_{expr.name.lexeme}")
+        return _call(
+            "set_property",
+            _call(
+                "instance",
+                self._expression(expr.obj),
+                name,
+                ast.Constant(expr.name.line),
+            ),
+            name,
+            self._expression(expr.value),
+        )
+
+    def visit_super_expr(self, expr: e.Super) -> ast.expr:
+        assert expr.this is not None, "Error: unresolved instance."
+        line = expr.keyword.line
+        return _call(
+            "super_method",
+            self._read(expr, "super", line),
+            self._read(expr.this, "this", line),
+            ast.Constant(f"p_{expr.method.lexeme}"),
+            ast.Constant(expr.method.line),
+        )
+
+    def visit_this_expr(self, expr: e.This) -> ast.expr:
+        return self._read(expr, "this", expr.keyword.line)
+
+    def visit_unary_expr(self, expr: e.Unary) -> ast.expr:
+        token = expr.operator
+        right = self._expression(expr.right)
+        if token.token_type is TokenType.BANG:
+            if _is_boolean(expr.right):
+                return ast.UnaryOp(op=ast.Not(), operand=right)
+            temporary = self._temporary()
+            return ast.BoolOp(
+                op=ast.Or(),
+                values=[
+                    _is(ast.NamedExpr(target=_store(temporary), value=right),
+                        None),
+                    _is(_load(temporary), False),
+                ],
+            )
+        right, value = self._operand(right)
+        return ast.IfExp(
+            test=_one_of(_type(right), ("float",)),
+            body=ast.UnaryOp(op=ast.USub(), operand=value),
+            orelse=_call(
+                "unary",
+                ast.Constant(token.lexeme),
+                value,
+                ast.Constant(token.line),
+            ),
+        )
+
+    def visit_variable_expr(self, expr: e.Variable) -> ast.expr:
+        return self._read(expr, expr.name.lexeme, expr.name.line)
+
+
+def _line(error: BaseException) -> int:
+    """The Lox line where the generated code raised the error"""
+    line = 0
+    traceback = error.__traceback__
+    while traceback is not None:
+        if traceback.tb_frame.f_code.co_filename == FILENAME:
+            line = traceback.tb_lineno
+        traceback = traceback.tb_next
+    return line
+
+
+class TranspiledInterpreter(Interpreter):
+    """Run programs translated to python and compiled by python. The Lox
+    globals are the globals of the generated code. With an output path, the
+    generated module is also written there, ready to be run again by
+    python."""
+
+    def __init__(self, output: str | None = None):
+        super().__init__()
+        self._output = output
+        self._namespace: dict[str, Any] = {"g_clock": Clock()}
+
+    def compile(self, statements: list[s.Stmt]) -> CodeType:
+        module = Transpiler(self._isrepl).transpile(statements)
+        if self._output is not None:
+            self._write(statements)
+        return compile(module, FILENAME, "exec")
+
+    def interpret(self, statements: list[s.Stmt]) -> bool:
+        code = self.compile(statements)
+        try:
+            exec(code, self._namespace)
+            return True
+        except PyloxRuntimeError as e:
+            report({f"{e}": f"\n\t[line {e.token.line}]"})
+        except NameError as e:
+            name = pyloxruntime.lox_name(e.name or "_")
+            report({f'Undefined variable "{name}"': f"\n\t[line {_line(e)}]"})
+        return False
+
+    def _write(self, statements: list[s.Stmt]) -> None:
+        assert self._output is not None
+        module = Transpiler(self._isrepl).transpile(statements, natives=True)
+        with open(self._output, mode="w") as output:
+            output.write(ast.unparse(module))
+            output.write("\n")
@@ -0,0 +1,417 @@
+from __future__ import annotations  # NOTE: No need since python 3.11+
+from typing import Any
+import stmt as s
+from environment import Cell
+from error_handler import report
+from exceptions import InternalPyloxError, PyloxRuntimeError
+from loxcallable import LoxCallable, LoxClass, LoxInstance
+from pyloxbytecode import BytecodeCompiler, Chunk, OpCode, Prototype
+from pyloxinterpreter import (
+    Interpreter,
+    binary_operation,
+    pylox_stringify,
+    unary_operation,
+)
+
+
+# The dispatch loop compares plain ints: looking up enum members is slow
+CONSTANT = OpCode.CONSTANT.value
+NIL = OpCode.NIL.value
+TRUE = OpCode.TRUE.value
+FALSE = OpCode.FALSE.value
+POP = OpCode.POP.value
+POPN = OpCode.POPN.value
+GET_LOCAL = OpCode.GET_LOCAL.value
+SET_LOCAL = OpCode.SET_LOCAL.value
+GET_CELL = OpCode.GET_CELL.value
+SET_CELL = OpCode.SET_CELL.value
+CELL = OpCode.CELL.value
+GET_UPVALUE = OpCode.GET_UPVALUE.value
+SET_UPVALUE = OpCode.SET_UPVALUE.value
+GET_GLOBAL = OpCode.GET_GLOBAL.value
+SET_GLOBAL = OpCode.SET_GLOBAL.value
+DEFINE_GLOBAL = OpCode.DEFINE_GLOBAL.value
+GET_PROPERTY = OpCode.GET_PROPERTY.value
+SET_PROPERTY = OpCode.SET_PROPERTY.value
+ASSERT_INSTANCE = OpCode.ASSERT_INSTANCE.value
+GET_SUPER = OpCode.GET_SUPER.value
+EQUAL = OpCode.EQUAL.value
+NOT_EQUAL = OpCode.NOT_EQUAL.value
+GREATER = OpCode.GREATER.value
+GREATER_EQUAL = OpCode.GREATER_EQUAL.value
+LESS = OpCode.LESS.value
+LESS_EQUAL = OpCode.LESS_EQUAL.value
+ADD = OpCode.ADD.value
+SUBTRACT = OpCode.SUBTRACT.value
+MULTIPLY = OpCode.MULTIPLY.value
+DIVIDE = OpCode.DIVIDE.value
+NOT = OpCode.NOT.value
+NEGATE = OpCode.NEGATE.value
+PRINT = OpCode.PRINT.value
+JUMP = OpCode.JUMP.value
+JUMP_IF_FALSE = OpCode.JUMP_IF_FALSE.value
+CALL = OpCode.CALL.value
+INVOKE = OpCode.INVOKE.value
+METHOD = OpCode.METHOD.value
+SUPER_METHOD = OpCode.SUPER_METHOD.value
+CLOSURE = OpCode.CLOSURE.value
+CLASS = OpCode.CLASS.value
+SUPERCLASS = OpCode.SUPERCLASS.value
+RETURN = OpCode.RETURN.value
+
+
+def _error(chunk: Chunk, offset: int, message: str) -> PyloxRuntimeError:
+    return PyloxRuntimeError(chunk.tokens[offset], message)
+
+
+def _arity_error(
+    chunk: Chunk, offset: int, callee: Any, count: int
+) -> PyloxRuntimeError:
+    return _error(
+        chunk,
+        offset,
+        f"Expected {callee.arity()} arguments"
+        f"but got {count} instead",
+    )
+
+
+class Closure:
+    """A compiled function with the cells it captured. A method is bound by
+    pairing it with the instance, that the call puts in its first slot."""
+
+    __slots__ = ("function", "cells", "this")
+
+    def __init__(
+        self,
+        function: Prototype,
+        cells: list[Cell],
+        this: LoxInstance | None = None,
+    ):
+        self.function = function
+        self.cells = cells
+        self.this = this
+
+    def bind(self, instance: LoxInstance) -> Closure:
+        return Closure(self.function, self.cells, instance)
+
+    def arity(self) -> int:
+        return self.function.arity
+
+    def __repr__(self) -> str:
+        return f"<function {self.function.name}>"
+
+
+class VirtualMachine(Interpreter):
+    """Run programs compiled to bytecode, on a stack shared by all the
+    frames. Resolution, globals and error reporting are the interpreter's."""
+
+    def interpret(self, statements: list[s.Stmt]) -> bool:
+        script = BytecodeCompiler(self._isrepl).compile(statements)
+        try:
+            self._run(Closure(script, []))
+            return True
+        except PyloxRuntimeError as e:
+            report({f"{e}": f"\n\t[line {e.token.line}]"})
+            return False
+
+    def _run(self, closure: Closure) -> None:
+        stack: list[Any] = []
+        # The suspended callers: (closure, ip, base, start)
+        frames: list[tuple[Closure, int, int, int]] = []
+        globals = self._globals
+        global_slots = globals.slots
+        chunk = closure.function.chunk
+        code, constants, cells = chunk.code, chunk.constants, closure.cells
+        ip = 0
+        base = 0  # Stack index of the first slot of the frame
+        start = 0  # Stack index where the frame ends up on return
+
+        while True:
+            offset = ip
+            op = code[ip]
+            ip += 1
+            if op == GET_LOCAL:
+                stack.append(stack[base + code[ip]])
+                ip += 1
+            elif op == CONSTANT:
+                stack.append(constants[code[ip]])
+                ip += 1
+            elif op == POP:
+                stack.pop()
+            elif op == JUMP_IF_FALSE:
+                if (value := stack[-1]) is None or value is False:
+                    ip = code[ip]
+                else:
+                    ip += 1
+            elif op == JUMP:
+                ip = code[ip]
+            elif op == SET_LOCAL:
+                stack[base + code[ip]] = stack[-1]
+                ip += 1
+            elif op == ADD:
+                b = stack.pop()
+                a = stack[-1]
+                if (t := type(a)) is type(b) and (t is float or t is str):
+                    stack[-1] = a + b
+                else:
+                    stack[-1] = binary_operation(
+                        chunk.tokens[offset], a, b
+                    )
+            elif op == SUBTRACT:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a - b
+                else:
+                    stack[-1] = binary_operation(
+                        chunk.tokens[offset], a, b
+                    )
+            elif op == LESS:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a < b
+                else:
+                    stack[-1] = binary_operation(
+                        chunk.tokens[offset], a, b
+                    )
+            elif op == GET_UPVALUE:
+                stack.append(cells[code[ip]].value)
+                ip += 1
+            elif op == GET_GLOBAL:
+                site = constants[code[ip]]
+                ip += 1
+                if site.version is not globals.version:
+                    site.slot = globals.index(site.name)
+                    site.version = globals.version
+                stack.append(global_slots[site.slot])
+            elif op == CALL or op == INVOKE:
+                count = code[ip]
+                ip += 1
+                callee_slot = len(stack) - count - 1
+                if op == INVOKE:
+                    # A method is below its instance, a field after a nil
+                    callee_slot -= 1
+                    if stack[callee_slot] is None:
+                        del stack[callee_slot]
+                callee = stack[callee_slot]
+                if type(callee) is not Closure:
+                    if not isinstance(callee, (LoxCallable, LoxClass)):
+                        raise _error(
+                            chunk,
+                            offset,
+                            "Can only call functions and classes",
+                        )
+                    if count != callee.arity():
+                        raise _arity_error(chunk, offset, callee, count)
+                    if type(callee) is not LoxClass:
+                        arguments = stack[callee_slot + 1:]
+                        del stack[callee_slot:]
+                        stack.append(callee.call(self, arguments))
+                        continue
+                    instance = LoxInstance(callee)
+                    if (init := callee.initializer) is None:
+                        del stack[callee_slot:]
+                        stack.append(instance)
+                        continue
+                    callee = init.bind(instance)
+                function = callee.function
+                if count != function.arity:
+                    raise _arity_error(chunk, offset, callee, count)
+                frames.append((closure, ip, base, start))
+                closure, start = callee, callee_slot
+                if callee.this is None:
+                    base = callee_slot + 1
+                else:
+                    stack[callee_slot] = callee.this
+                    base = callee_slot
+                for slot in function.boxed_params:
+                    stack[base + slot] = Cell(stack[base + slot])
+                chunk, cells = function.chunk, callee.cells
+                code, constants = chunk.code, chunk.constants
+                ip = 0
+            elif op == RETURN:
+                result = stack.pop()
+                if closure.function.is_initializer:
+                    # The instance, in the first slot of the frame
+                    result = stack[base]
+                    if type(result) is Cell:
+                        result = result.value
+                del stack[start:]
+                if not frames:
+                    return
+                stack.append(result)
+                closure, ip, base, start = frames.pop()
+                chunk, cells = closure.function.chunk, closure.cells
+                code, constants = chunk.code, chunk.constants
+            elif op == NIL:
+                stack.append(None)
+            elif op == TRUE:
+                stack.append(True)
+            elif op == FALSE:
+                stack.append(False)
+            elif op == POPN:
+                del stack[len(stack) - code[ip]:]
+                ip += 1
+            elif op == GET_CELL:
+                stack.append(stack[base + code[ip]].value)
+                ip += 1
+            elif op == SET_CELL:
+                stack[base + code[ip]].value = stack[-1]
+                ip += 1
+            elif op == CELL:
+                stack[-1] = Cell(stack[-1])
+            elif op == SET_UPVALUE:
+                cells[code[ip]].value = stack[-1]
+                ip += 1
+            elif op == SET_GLOBAL:
+                site = constants[code[ip]]
+                ip += 1
+                if site.version is not globals.version:
+                    site.slot = globals.index(site.name)
+                    site.version = globals.version
+                global_slots[site.slot] = stack[-1]
+            elif op == DEFINE_GLOBAL:
+                globals.define(constants[code[ip]].lexeme, stack.pop())
+                ip += 1
+            elif op == GET_PROPERTY:
+                obj = stack[-1]
+                if not isinstance(obj, LoxInstance):
+                    raise _error(
+                        chunk, offset, "Only instances have properties"
+                    )
+                site = constants[code[ip]]
+                stack[-1] = obj.get(site.name, site.cache)
+                ip += 1
+            elif op == ASSERT_INSTANCE:
+                if type(stack[-1]) is not LoxInstance:
+                    raise _error(
+                        chunk, offset, "Only instances have fields"
+                    )
+            elif op == SET_PROPERTY:
+                value = stack.pop()
+                site = constants[code[ip]]
+                stack[-1].set(site.name, value, site.cache)
+                stack[-1] = value
+                ip += 1
+            elif op == GET_SUPER:
+                site = constants[code[ip]]
+                ip += 1
+                name = site.name.lexeme
+                method = site.cache.find(stack.pop())
+                if method is None:
+                    raise _error(chunk, offset, f"Undefined property {name}.")
+                stack[-1] = method.bind(stack[-1])
+            elif op == METHOD:
+                obj = stack[-1]
+                if not isinstance(obj, LoxInstance):
+                    raise _error(
+                        chunk, offset, "Only instances have properties"
+                    )
+                site = constants[code[ip]]
+                ip += 1
+                if (method := obj.method(site.name, site.cache)) is None:
+                    stack[-1] = None
+                    stack.append(obj.get(site.name, site.cache))
+                else:
+                    stack[-1] = method
+                    stack.append(obj)
+            elif op == SUPER_METHOD:
+                site = constants[code[ip]]
+                ip += 1
+                if (method := site.cache.find(stack[-1])) is None:
+                    name = site.name.lexeme
+                    raise _error(chunk, offset, f"Undefined property {name}.")
+                stack[-1] = method
+            elif op == EQUAL:
+                b = stack.pop()
+                stack[-1] = stack[-1] == b
+            elif op == NOT_EQUAL:
+                b = stack.pop()
+                stack[-1] = stack[-1] != b
+            elif op == GREATER:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a > b
+                else:
+                    stack[-1] = binary_operation(
+                        chunk.tokens[offset], a, b
+                    )
+            elif op == GREATER_EQUAL:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a >= b
+                else:
+                    stack[-1] = binary_operation(
+                        chunk.tokens[offset], a, b
+                    )
+            elif op == LESS_EQUAL:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a <= b
+                else:
+                    stack[-1] = binary_operation(
+                        chunk.tokens[offset], a, b
+                    )
+            elif op == MULTIPLY:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float:
+                    stack[-1] = a * b
+                else:
+                    stack[-1] = binary_operation(
+                        chunk.tokens[offset], a, b
+                    )
+            elif op == DIVIDE:
+                b = stack.pop()
+                a = stack[-1]
+                if type(a) is float and type(b) is float and b:
+                    stack[-1] = a / b
+                else:
+                    stack[-1] = binary_operation(
+                        chunk.tokens[offset], a, b
+                    )
+            elif op == NOT:
+                stack[-1] = (value := stack[-1]) is None or value is False
+            elif op == NEGATE:
+                value = stack[-1]
+                if type(value) is float:
+                    stack[-1] = -value
+                else:
+                    stack[-1] = unary_operation(
+                        chunk.tokens[offset], value
+                    )
+            elif op == PRINT:
+                print(pylox_stringify(stack.pop()))
+            elif op == CLOSURE:
+                function = constants[code[ip]]
+                ip += 1
+                captured = [
+                    stack[base + index] if is_local else cells[index]
+                    for is_local, index in function.upvalues
+                ]
+                stack.append(Closure(function, captured))
+            elif op == CLASS:
+                name = constants[code[ip]]
+                count = code[ip + 1]
+                has_superclass = code[ip + 2]
+                ip += 3
+                first = len(stack) - count
+                methods = {
+                    method.function.name: method
+                    for method in stack[first:]
+                }
+                del stack[first:]
+                superclass = stack.pop().value if has_superclass else None
+                stack.append(LoxClass(name, superclass, methods))
+            elif op == SUPERCLASS:
+                if type(stack[-1]) is not LoxClass:
+                    raise _error(
+                        chunk, offset, "Superclass must be a class"
+                    )
+                stack[-1] = Cell(stack[-1])
+            else:
+                raise InternalPyloxError(f"Unknown instruction {op}")
@@ -1,3 +1,64 @@
+from bisect import bisect_right
+from functools import partial
+from typing import Callable, Pattern
+from mmap import mmap
+
+
+# Source code, either as text or as utf-8 encoded bytes (e.g. a mapped file)
+SourceText = str | bytes | mmap
+
+
+def as_text(text: str | bytes) -> str:
+    """Decode a slice of SourceText, normalising the line endings like a
+    file opened in text mode does"""
+    if isinstance(text, str):
+        return text
+    return text.decode().replace("\r\n", "\n")
+
+
+class LineIndex:
+    """Maps offsets of a source to lines and columns. The offsets where the
+    lines start are searched for only when, and as far as, they are needed:
+    scanning does no per-character line bookkeeping at all.
+    Indexing can begin at any offset, given the line of that offset."""
+
+    def __init__(self, source: SourceText, start: int = 0, line: int = 1):
+        self._length = len(source)
+        # Finds the first newline from an offset on
+        self._find_newline: Callable[[int], int]
+        if isinstance(source, str):
+            previous = source.rfind("\n", 0, start)
+            self._find_newline = partial(source.find, "\n")
+        else:
+            previous = source.rfind(b"\n", 0, start)
+            self._find_newline = partial(source.find, b"\n")
+        self._first_line = line
+        # Offsets where the lines start, from the line of start onward
+        self._starts = [previous + 1]
+        # Every newline before this offset is already in _starts
+        self._indexed = start
+
+    def line(self, offset: int) -> int:
+        """Returns the line of the character at offset"""
+        if offset > self._indexed:
+            self._index_up_to(offset)
+        return self._first_line + bisect_right(self._starts, offset) - 1
+
+    def position(self, offset: int) -> tuple[int, int]:
+        """Returns line and column (both starting from 1) of offset"""
+        line = self.line(offset)
+        return line, offset - self._starts[line - self._first_line] + 1
+
+    def _index_up_to(self, offset: int) -> None:
+        while self._indexed < offset:
+            found = self._find_newline(self._indexed)
+            if found == -1:
+                self._indexed = self._length
+                return
+            self._indexed = found + 1
+            self._starts.append(self._indexed)
+
+
 class Source:
     """Helper class to manage a source file (or repl command)"""
 
@@ -6,7 +67,7 @@ class Source:
         self._source_len = len(self._source)
         self._start = 0
         self._current = 0
-        self._line = 1
+        self._lines = LineIndex(source)
 
     def lexeme(self) -> str:
         """Returns the current lexeme"""
@@ -16,10 +77,6 @@ class Source:
         """Start a new lexeme analysis"""
         self._start = self._current
 
-    def newline(self) -> None:
-        """Move to next line"""
-        self._line += 1
-
     def is_at_end(self) -> bool:
         """Returns True if the source has been consumed"""
         return self._current >= self._source_len
@@ -32,6 +89,12 @@ class Source:
         self._current += 1
         return c
 
+    def advance_matching(self, pattern: Pattern[str]) -> None:
+        """Consume the longest run of characters, starting at the current
+        one, matched by pattern"""
+        if (match := pattern.match(self._source, self._current)) is not None:
+            self._current = match.end()
+
     def peek(self, depth: int = 0) -> str | None:
         """Returns next + detph character, if any, otherwise return None"""
         if self._current + depth >= self._source_len:
@@ -51,4 +114,8 @@ class Source:
 
     def line(self) -> int:
         """Returns the current line"""
-        return self._line
+        return self._lines.line(self._current)
+
+    def position(self) -> tuple[int, int]:
+        """Returns line and column where the current lexeme starts"""
+        return self._lines.position(self._start)
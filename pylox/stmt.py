@@ -2,6 +2,7 @@
 # Do not manually change it.
 
 from __future__ import annotations  # NOTE: No need since python 3.11+
+from enum import IntEnum
 from typing import Protocol, TypeVar, runtime_checkable
 from pyloxtoken import Token
 import expr as e
@@ -11,6 +12,19 @@ T_co = TypeVar("T_co", covariant=True)
 T = TypeVar("T")
 
 
+class Kind(IntEnum):
+    BLOCK = 0
+    CLASS = 1
+    EXPRESSION = 2
+    FOR = 3
+    FUNCTION = 4
+    IF = 5
+    PRINT = 6
+    RETURN = 7
+    VAR = 8
+    WHILE = 9
+
+
 class Visitor(Protocol[T_co]):
     def visit_block_stmt(self, stmt: Block) -> T_co:
         ...
@@ -21,6 +35,9 @@ class Visitor(Protocol[T_co]):
     def visit_expression_stmt(self, stmt: Expression) -> T_co:
         ...
 
+    def visit_for_stmt(self, stmt: For) -> T_co:
+        ...
+
     def visit_function_stmt(self, stmt: Function) -> T_co:
         ...
 
@@ -42,29 +59,50 @@ class Visitor(Protocol[T_co]):
 
 @runtime_checkable
 class Stmt(Protocol[T]):
+    kind: Kind
+
     def accept(self, visitor: Visitor[T]) -> T:
         ...
 
 
 class Block:
+    __slots__ = ("statements", "scoped")
+    __match_args__ = ("statements",)
+    kind = Kind.BLOCK
+
     def __init__(self, statements: list[Stmt]):
         self.statements = statements
+        self.scoped: bool = True
 
     def accept(self, visitor: Visitor[T_co]) -> T_co:
         return visitor.visit_block_stmt(self)
 
 
 class Class:
-    def __init__(self, name: Token, superclass: e.Variable | None, methods: list[Function]):
+    __slots__ = ("name", "superclass", "methods", "boxed")
+    __match_args__ = ("name", "superclass", "methods")
+    kind = Kind.CLASS
+
+    def __init__(
+        self,
+        name: Token,
+        superclass: e.Variable | None,
+        methods: list[Function],
+    ):
         self.name = name
         self.superclass = superclass
         self.methods = methods
+        self.boxed: bool = False
 
     def accept(self, visitor: Visitor[T_co]) -> T_co:
         return visitor.visit_class_stmt(self)
 
 
 class Expression:
+    __slots__ = ("expression",)
+    __match_args__ = ("expression",)
+    kind = Kind.EXPRESSION
+
     def __init__(self, expression: e.Expr):
         self.expression = expression
 
@@ -72,18 +110,52 @@ class Expression:
         return visitor.visit_expression_stmt(self)
 
 
+class For:
+    __slots__ = ("initializer", "condition", "increment", "body")
+    __match_args__ = ("initializer", "condition", "increment", "body")
+    kind = Kind.FOR
+
+    def __init__(
+        self,
+        initializer: Stmt | None,
+        condition: e.Expr | None,
+        increment: e.Expr | None,
+        body: Stmt,
+    ):
+        self.initializer = initializer
+        self.condition = condition
+        self.increment = increment
+        self.body = body
+
+    def accept(self, visitor: Visitor[T_co]) -> T_co:
+        return visitor.visit_for_stmt(self)
+
+
 class Function:
+    __slots__ = ("name", "params", "body", "boxed", "upvalues", "boxed_params")
+    __match_args__ = ("name", "params", "body")
+    kind = Kind.FUNCTION
+
     def __init__(self, name: Token, params: list[Token], body: list[Stmt]):
         self.name = name
         self.params = params
         self.body = body
+        self.boxed: bool = False
+        self.upvalues: list[tuple[int, int]] = []
+        self.boxed_params: tuple[int, ...] = ()
 
     def accept(self, visitor: Visitor[T_co]) -> T_co:
         return visitor.visit_function_stmt(self)
 
 
 class If:
-    def __init__(self, condition: e.Expr, then_branch: Stmt, else_branch: Stmt | None):
+    __slots__ = ("condition", "then_branch", "else_branch")
+    __match_args__ = ("condition", "then_branch", "else_branch")
+    kind = Kind.IF
+
+    def __init__(
+        self, condition: e.Expr, then_branch: Stmt, else_branch: Stmt | None
+    ):
         self.condition = condition
         self.then_branch = then_branch
         self.else_branch = else_branch
@@ -93,6 +165,10 @@ class If:
 
 
 class Print:
+    __slots__ = ("expression",)
+    __match_args__ = ("expression",)
+    kind = Kind.PRINT
+
     def __init__(self, expression: e.Expr):
         self.expression = expression
 
@@ -101,6 +177,10 @@ class Print:
 
 
 class Return:
+    __slots__ = ("keyword", "value")
+    __match_args__ = ("keyword", "value")
+    kind = Kind.RETURN
+
     def __init__(self, keyword: Token, value: e.Expr | None):
         self.keyword = keyword
         self.value = value
@@ -110,15 +190,24 @@ class Return:
 
 
 class Var:
+    __slots__ = ("name", "initializer", "boxed")
+    __match_args__ = ("name", "initializer")
+    kind = Kind.VAR
+
     def __init__(self, name: Token, initializer: e.Expr | None):
         self.name = name
         self.initializer = initializer
+        self.boxed: bool = False
 
     def accept(self, visitor: Visitor[T_co]) -> T_co:
         return visitor.visit_var_stmt(self)
 
 
 class While:
+    __slots__ = ("condition", "body")
+    __match_args__ = ("condition", "body")
+    kind = Kind.WHILE
+
     def __init__(self, condition: e.Expr, body: Stmt):
         self.condition = condition
         self.body = body
@@ -0,0 +1,103 @@
+import pytest
+from typing import NoReturn
+from pathlib import Path
+import astcache
+import lox
+from astcache import CACHE_DIRECTORY
+from lox import Lox
+from pyloxparser import Parser
+from pyloxtoken import TokenBuffer
+
+
+PROGRAM = """
+fun counter() {
+  var count = 0;
+  fun increment() { count = count + 1; return count; }
+  return increment;
+}
+var next = counter();
+next();
+print next();
+"""
+
+
+@pytest.fixture
+def script(tmp_path: Path) -> Path:
+    path = tmp_path / "script.lox"
+    path.write_text(PROGRAM)
+    return path
+
+
+def run(script: Path) -> None:
+    Lox(use_cache=True).run_file(str(script))
+
+
+def test_astcache_hit_skips_front_end(
+    script: Path,
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    run(script)
+    assert capsys.readouterr().out == "2\n"
+    assert (script.parent / CACHE_DIRECTORY / "script.lox.pickle").exists()
+
+    def no_parsing(*_: object) -> NoReturn:
+        raise AssertionError("The front end should not run")
+
+    monkeypatch.setattr(lox, "Parser", no_parsing)
+    run(script)
+    assert capsys.readouterr().out == "2\n"
+
+
+def test_astcache_invalidated_by_source_change(
+    script: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    run(script)
+    script.write_text(PROGRAM.replace("print next();", "print next() * 10;"))
+    run(script)
+    assert capsys.readouterr().out == "2\n20\n"
+
+
+def test_astcache_invalidated_by_interpreter_change(
+    script: Path,
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    run(script)
+    monkeypatch.setattr(astcache, "interpreter_version", lambda: "changed")
+    parsed: list[TokenBuffer] = []
+    parser = lox.Parser
+
+    def parsing(tokens: TokenBuffer) -> Parser:
+        parsed.append(tokens)
+        return parser(tokens)
+
+    monkeypatch.setattr(lox, "Parser", parsing)
+    run(script)
+    assert len(parsed) == 1
+    assert capsys.readouterr().out == "2\n2\n"
+
+
+def test_astcache_ignores_corrupted_file(
+    script: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    run(script)
+    (script.parent / CACHE_DIRECTORY / "script.lox.pickle").write_bytes(b"?")
+    run(script)
+    assert capsys.readouterr().out == "2\n2\n"
+
+
+def test_astcache_does_not_store_invalid_programs(tmp_path: Path) -> None:
+    script = tmp_path / "invalid.lox"
+    script.write_text("print 1 +;")
+    with pytest.raises(SystemExit):
+        run(script)
+    assert not (tmp_path / CACHE_DIRECTORY / "invalid.lox.pickle").exists()
+
+
+def test_astcache_is_off_by_default(
+    script: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    Lox().run_file(str(script))
+    assert capsys.readouterr().out == "2\n"
+    assert not (script.parent / CACHE_DIRECTORY).exists()
@@ -0,0 +1,93 @@
+import pytest
+import expr as e
+import stmt as s
+from incremental import IncrementalFrontEnd
+from pyloxinterpreter import Interpreter
+from .test_parser import dump
+
+
+SOURCE = """var a = 1;
+fun add(x, y) {
+  return x + y;
+}
+print add(a, 2);
+class Foo {
+  bar() { return "multi
+line"; }
+}
+print Foo().bar();
+"""
+
+
+def _full(source: str) -> IncrementalFrontEnd:
+    return IncrementalFrontEnd(Interpreter(), source)
+
+
+def _check(front_end: IncrementalFrontEnd) -> None:
+    full = _full(front_end.source)
+    assert [
+        (d.start, d.end, d.first_line, d.last_line)
+        for d in front_end.declarations
+    ] == [
+        (d.start, d.end, d.first_line, d.last_line) for d in full.declarations
+    ]
+    assert dump(front_end.program()) == dump(full.program())
+
+
+@pytest.mark.parametrize(
+    "start, end, text",
+    [
+        (9, 9, "0"),  # Inside the first declaration
+        (10, 10, "\n\n"),  # Shifts all the following lines
+        (0, 0, "print 0;"),  # New declaration
+        (11, 11, "{"),  # Swallows the following declarations
+        (8, 9, "2 + 3"),
+        (0, 11, ""),  # Removes a declaration
+        (len(SOURCE), len(SOURCE), "print a;"),
+        (43, 45, "/* open"),  # Untermined comment
+    ],
+)
+def test_edit_matches_full_parse(
+    start: int, end: int, text: str, capsys: pytest.CaptureFixture[str]
+) -> None:
+    front_end = _full(SOURCE)
+    front_end.edit(start, end, text)
+    _check(front_end)
+
+
+def test_edit_reuses_untouched_declarations() -> None:
+    front_end = _full(SOURCE)
+    before = [d.statement for d in front_end.declarations]
+    assert front_end.edit(9, 9, "0")
+    after = [d.statement for d in front_end.declarations]
+    assert after[0] is not before[0]
+    assert all(a is b for a, b in zip(after[1:], before[1:]))
+
+
+def test_edit_error_and_fix(capsys: pytest.CaptureFixture[str]) -> None:
+    front_end = _full(SOURCE)
+    assert not front_end.edit(9, 10, "")  # Remove ';'
+    assert front_end.program() is None
+    assert front_end.edit(9, 9, ";")
+    _check(front_end)
+
+
+def test_edit_sequence() -> None:
+    front_end = _full("")
+    for text in ("var x", " = 2", ";\n", "print x", ";"):
+        front_end.edit(len(front_end.source), len(front_end.source), text)
+    assert front_end.source == "var x = 2;\nprint x;"
+    _check(front_end)
+
+
+def test_line_shift_moves_only_later_declarations() -> None:
+    front_end = _full(SOURCE)
+    var, _, call, *_ = front_end.program() or []
+    assert isinstance(var, s.Var) and isinstance(call, s.Print)
+    assert isinstance(call.expression, e.Call)
+    name, paren = var.name, call.expression.paren
+    assert front_end.edit(27, 27, "\n")  # In the body of add
+    assert front_end.program() is not None
+    assert var.name is name
+    assert call.expression.paren.line == paren.line + 1
+    _check(front_end)
@@ -0,0 +1,629 @@
+import runpy
+from pathlib import Path
+import pytest
+from lox import Engine, Lexer, Lox
+from expr import GLOBAL, Binary, Call, Get, Literal, Set
+from loxcallable import (
+    LoxClass,
+    LoxFunction,
+    LoxInstance,
+    MethodCache,
+    POLYMORPHIC_LIMIT,
+    Shape,
+)
+from pyloxinterpreter import Interpreter
+from pyloxparser import Parser
+from pyloxresolver import Resolver
+from pyloxscanner import RegexScanner
+from pyloxtoken import Token, TokenType
+from stmt import Expression, For, Function, Return, Stmt, While
+from pyloxtranspiler import TranspiledInterpreter
+from pyloxtiered import HOT_CALLS, HOT_ITERATIONS, TieredInterpreter
+
+
+# Lox programs and what they print
+PROGRAMS = {
+    "arithmetic": (
+        'print 1 + 2 * 3; print (1 + 2) * 3; print 7 / 2; print "a" + "b";',
+        "7\n9\n3.5\nab\n",
+    ),
+    "logic": (
+        "print nil or 1; print false and 1; print !nil; print 1 == 1;",
+        "1\nFalse\nTrue\nTrue\n",
+    ),
+    "scopes": (
+        """
+        var a = "global";
+        { var a = "outer"; { var a = "inner"; print a; } print a; }
+        print a;
+        """,
+        "inner\nouter\nglobal\n",
+    ),
+    "booleans_are_numbers": (
+        'print true + 1; print -true; print false * 2 < true; print 1 / true;',
+        "2\n-1\nTrue\n1\n",
+    ),
+    "polymorphic_property_sites": (
+        """
+        class A { name() { return "A"; } }
+        class B < A { name() { return "B" + super.name(); } }
+        class C < A {}
+        var shadowed = C();
+        shadowed.name = "field";
+        for (var i = 0; i < 2; i = i + 1) {
+          print A().name(); print B().name(); print C().name();
+          print shadowed.name;
+        }
+        """,
+        "A\nBA\nA\nfield\nA\nBA\nA\nfield\n",
+    ),
+    "invoked_methods": (
+        """
+        class A {
+          init(n) { this.n = n; }
+          add(k) { this.n = this.n + k; return this; }
+          get() { return this.n; }
+        }
+        class B < A {
+          init(n) { super.init(n * 10); }
+          add(k) { return super.add(k + 1); }
+          counter() { fun next() { this.n = this.n + 1; return this.n; }
+                      return next; }
+        }
+        var b = B(1);
+        print b.add(2).add(3).get();
+        print b.init(5) == b; print b.get();
+        b.next = b.counter();
+        print b.next(); print b.next();
+        var invoke = A(1).add; print invoke(1).get();
+        """,
+        "17\nTrue\n50\n51\n52\n2\n",
+    ),
+    "deep_inheritance": (
+        """
+        class A { init(x) { this.x = x; } name() { return "A"; }
+                  who() { return this.name() + this.x; } }
+        class B < A { name() { return "B"; } }
+        class C < B {}
+        class D < C { init() { super.init("d"); } }
+        print C("c").who(); print D().who(); print A("a").who();
+        print B("b").name(); print D().init().x;
+        """,
+        "Bc\nBd\nAa\nB\nd\n",
+    ),
+    "fields_in_any_order": (
+        """
+        class P {}
+        fun make(first, x, y) {
+          var p = P();
+          if (first) { p.x = x; p.y = y; } else { p.y = y; p.x = x; }
+          return p;
+        }
+        var a = make(true, 1, 2); var b = make(false, 3, 4);
+        for (var i = 0; i < 2; i = i + 1) {
+          print a.x + a.y; print b.x + b.y;
+          a.x = a.x * 10; b.y = b.y + 1;
+        }
+        b.y = nil;
+        print b.y;
+        """,
+        "3\n7\n12\n8\nnil\n",
+    ),
+    "nil_globals": (
+        "var a; print a; a = 1; print a; var b = nil; print b == nil;",
+        "nil\n1\nTrue\n",
+    ),
+    "global_redefinition": (
+        """
+        var a = 1;
+        fun get() { return a; }
+        print get();
+        var a = "redefined";
+        print get();
+        fun get() { return a + "!"; }
+        print get();
+        """,
+        "1\nredefined\nredefined!\n",
+    ),
+    "if_else": (
+        "if (1 > 2) print 1; else print 2; if (nil) print 3;",
+        "2\n",
+    ),
+    "while": (
+        "var i = 0; while (i < 3) { print i; i = i + 1; }",
+        "0\n1\n2\n",
+    ),
+    "for": (
+        "for (var i = 0; i < 3; i = i + 1) print i;",
+        "0\n1\n2\n",
+    ),
+    "for_without_clauses": (
+        """
+        var i = 0;
+        for (; i < 2;) { print i; i = i + 1; }
+        for (i = 5; i < 7; i = i + 1) { var j = i * 2; print j; }
+        print i;
+        """,
+        "0\n1\n10\n12\n7\n",
+    ),
+    "for_return": (
+        """
+        fun find(limit) {
+          for (var i = 0;; i = i + 1) if (i * i > limit) return i;
+        }
+        print find(50);
+        """,
+        "8\n",
+    ),
+    "for_closures_share_the_loop_variable": (
+        """
+        var first; var second;
+        for (var i = 0; i < 2; i = i + 1) {
+          fun show() { print i; }
+          if (first == nil) first = show; else second = show;
+        }
+        first(); second();
+        """,
+        "2\n2\n",
+    ),
+    "nested_for": (
+        """
+        var total = 0;
+        for (var i = 0; i < 3; i = i + 1)
+          for (var j = i; j < 3; j = j + 1) total = total + j;
+        print total;
+        """,
+        "8\n",
+    ),
+    "local_slots": (
+        """
+        fun f(a, b) {
+          var c = a + b;
+          {
+            var d = c * 2;
+            class K { get() { return d + a; } }
+            fun g(e) { return e + c + d; }
+            var k = K();
+            d = d + 1;
+            print g(k.get());
+          }
+          return c;
+        }
+        print f(1, 2);
+        """,
+        "18\n3\n",
+    ),
+    "returns_from_nested_scopes": (
+        """
+        fun find(n) {
+          var a = "a";
+          { var b = "b"; for (var i = 0; i < 10; i = i + 1) {
+              var c = i * 2; if (c > n) { var d = c + 1; return d; } } }
+          return a;
+        }
+        print find(5); print find(100);
+        var x = "x"; { var y = x + "y"; { var z = y + "z"; print z; } }
+        print nil or "default"; print 1 and nil; print clock() > 0;
+        """,
+        "7\na\nxyz\ndefault\nnil\nTrue\n",
+    ),
+    "closures": (
+        """
+        fun counter() {
+          var count = 0;
+          fun increment() { count = count + 1; return count; }
+          return increment;
+        }
+        var a = counter(); var b = counter();
+        a(); a(); print a(); print b();
+        """,
+        "3\n1\n",
+    ),
+    "nested_closures": (
+        """
+        fun outer(a) {
+          var b = 10;
+          fun middle() {
+            fun inner() { a = a + 1; return a + b; }
+            return inner;
+          }
+          var f = middle();
+          f();
+          print a;
+          return f;
+        }
+        var g = outer(1);
+        print g();
+        """,
+        "2\n13\n",
+    ),
+    "closures_in_loop_bodies": (
+        """
+        var fs; var i = 0;
+        while (i < 2) {
+          var j = i;
+          fun show() { print j; }
+          if (fs == nil) fs = show; else { fs(); show(); }
+          i = i + 1;
+        }
+        """,
+        "0\n1\n",
+    ),
+    "local_recursion": (
+        """
+        fun run() {
+          fun count(n) { if (n > 0) return count(n - 1) + 1; return 0; }
+          class Node {
+            make() { return Node(); }
+          }
+          print count(4);
+          print Node().make();
+        }
+        run();
+        """,
+        "4\nNode instance\n",
+    ),
+    "recursion": (
+        "fun fib(n) { if (n < 2) return n; return fib(n - 1) + fib(n - 2); }"
+        " print fib(15);",
+        "610\n",
+    ),
+    "classes": (
+        """
+        class Point {
+          init(x, y) { this.x = x; this.y = y; }
+          sum() { return this.x + this.y; }
+        }
+        var p = Point(1, 2);
+        p.x = 10;
+        print p.sum();
+        var sum = p.sum;
+        print sum();
+        """,
+        "12\n12\n",
+    ),
+    "inheritance": (
+        """
+        class A {
+          name() { return "A"; }
+          greet() { return "I am " + this.name(); }
+        }
+        class B < A { name() { return "B, not " + super.name(); } }
+        print B().greet();
+        """,
+        "I am B, not A\n",
+    ),
+    "this_and_super_in_closures": (
+        """
+        class A { name() { return "A"; } }
+        class B < A {
+          init() { this.n = "B"; }
+          names() {
+            fun both() { return super.name() + this.n; }
+            return both;
+          }
+        }
+        print B().names()();
+        """,
+        "AB\n",
+    ),
+    "initializer_returns_this": (
+        """
+        class C { init() { this.v = 1; return; } }
+        var c = C();
+        print c.init().v;
+        """,
+        "1\n",
+    ),
+    "bound_methods_are_distinct": (
+        """
+        class A { m() {} }
+        class B < A { n() { return super.m == super.m; } }
+        var b = B();
+        var m = b.m;
+        print b.m == b.m; print m == m; print b.n();
+        """,
+        "False\nTrue\nFalse\n",
+    ),
+}
+
+
+@pytest.mark.parametrize("engine", Engine)
+@pytest.mark.parametrize("name", PROGRAMS)
+def test_interpreter_programs(
+    name: str, engine: Engine, capsys: pytest.CaptureFixture[str]
+) -> None:
+    source, expected = PROGRAMS[name]
+    assert Lox(use_cache=False, engine=engine)._run(source) == 0
+    assert capsys.readouterr().out == expected
+
+
+# Programs that fail at runtime, what they print before and the error
+RUNTIME_ERRORS = {
+    "division_by_zero": ("print 1; print 1 / 0;", "1\n", "Division by zero."),
+    "operand_types": ('print "a" - 1;', "", "Operands must be Number."),
+    "undefined_variable": ("print x;", "", 'Undefined variable "x"'),
+    "undefined_assignment": ("x = 1;", "", 'Undefined variable "x"'),
+    "call_non_callable": ('"a"();', "", "Can only call functions"),
+    "arity": (
+        "fun f(a) {} f(1, 2);",
+        "",
+        "Expected 1 argumentsbut got 2 instead",
+    ),
+    "set_on_non_instance": (
+        'fun f() { print "not called"; return 1; } var a = "a"; a.x = f();',
+        "",
+        "Only instances have fields",
+    ),
+    "superclass_not_class": (
+        "var A = 1; class B < A {}",
+        "",
+        "Superclass must be a class",
+    ),
+    "class_arity": (
+        "class A { init(a, b) {} } A(1);",
+        "",
+        "Expected 2 argumentsbut got 1 instead",
+    ),
+    "method_arity": (
+        "class A { m(a) {} } class B < A { m() { super.m(); } } B().m();",
+        "",
+        "Expected 1 argumentsbut got 0 instead",
+    ),
+    "invoke_on_non_instance": (
+        'fun f() { print "not called"; } "a".m(f());',
+        "",
+        "Only instances have properties",
+    ),
+    "inherited_initializer_arity": (
+        "class A { init(a) {} } class B < A {} B();",
+        "",
+        "Expected 1 argumentsbut got 0 instead",
+    ),
+    "undefined_property": (
+        "class A {} print A().x;",
+        "",
+        "Undefined property 'x'.",
+    ),
+}
+
+
+@pytest.mark.parametrize("engine", Engine)
+@pytest.mark.parametrize("name", RUNTIME_ERRORS)
+def test_interpreter_runtime_errors(
+    name: str, engine: Engine, capsys: pytest.CaptureFixture[str]
+) -> None:
+    source, expected, error = RUNTIME_ERRORS[name]
+    assert Lox(use_cache=False, engine=engine)._run(source) == 70
+    captured = capsys.readouterr()
+    assert captured.out == expected
+    assert error in captured.err
+
+
+@pytest.mark.parametrize("lexer", Lexer)
+def test_scripts_lines_end_like_in_text_mode(
+    lexer: Lexer, tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    script = tmp_path / "script.lox"
+    script.write_bytes(b"print 1;\rprint 2;\r\nprint x;\n")
+    with pytest.raises(SystemExit):
+        Lox(lexer, use_cache=False).run_file(str(script))
+    captured = capsys.readouterr()
+    assert captured.out == "1\n2\n"
+    assert "[line 3]" in captured.err
+
+
+def test_closures_capture_only_what_they_use() -> None:
+    source = """
+    fun outer(unused) {
+      var big = "not captured"; var x = 1;
+      fun f() { return x; }
+      return f;
+    }
+    var f = outer(0);
+    """
+    lox = Lox(use_cache=False)
+    assert lox._run(source) == 0
+    globals = lox._interpreter.get_globals()
+    name = Token(TokenType.IDENTIFIER, "f", None, 1)
+    function = globals.slots[globals.index(name)]
+    assert [cell.value for cell in function._closure] == [1]
+
+
+@pytest.mark.parametrize("engine", Engine)
+def test_interpreter_repl_prints_expressions(
+    engine: Engine, capsys: pytest.CaptureFixture[str]
+) -> None:
+    lox = Lox(use_cache=False, engine=engine)
+    lox._interpreter.set_repl()
+    for line in ["var a = 2;", "a * 3;", "fun f() { return a; }", "f();"]:
+        assert lox._run(line) == 0
+    assert capsys.readouterr().out == "6\n2\n"
+
+
+def test_transpiled_errors_point_at_lox_lines(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    source = """
+    fun f() {
+      return missing;
+    }
+    f();
+    """
+    assert Lox(use_cache=False, engine=Engine.PYTHON)._run(source) == 70
+    assert 'Undefined variable "missing"' in (err := capsys.readouterr().err)
+    assert "[line 3]" in err
+
+
+def test_transpiled_program_runs_from_disk(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    output = tmp_path / "program.py"
+    lox = Lox(use_cache=False, engine=Engine.PYTHON)
+    lox._interpreter = TranspiledInterpreter(str(output))
+    source = """
+    class A { init(n) { this.n = n; } twice() { return this.n * 2; } }
+    fun counter() {
+      var i = 0; fun next() { i = i + 1; return i; } return next;
+    }
+    var next = counter(); next();
+    print A(next()).twice();
+    """
+    assert lox._run(source) == 0
+    assert capsys.readouterr().out == "4\n"
+    runpy.run_path(str(output))
+    assert capsys.readouterr().out == "4\n"
+
+
+def test_tiered_compiles_hot_code_and_deoptimizes(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    source = f"""
+    fun add(a, b) {{ return a + b; }}
+    var total = 0;
+    for (var i = 0; i < {HOT_CALLS}; i = i + 1) total = add(total, 1);
+    print total;
+    print add("a", "b");
+    var i = 0;
+    while (i < {HOT_ITERATIONS + 1}) i = i + 1;
+    print i;
+    """
+    lox = Lox(use_cache=False, engine=Engine.TIERED)
+    statements = lox._front_end(source, None)
+    tiered = lox._interpreter
+    assert isinstance(tiered, TieredInterpreter)
+    assert statements is not None and tiered.interpret(statements)
+    assert capsys.readouterr().out == (
+        f"{HOT_CALLS}\nab\n{HOT_ITERATIONS + 1}\n"
+    )
+    match statements:
+        case [
+            Function(body=[Return(value=Binary() as plus)]) as add,
+            _,
+            For() as loop,
+            *_,
+            While() as counter,
+            _,
+        ]:
+            # The strings broke the assumption of the compiled add
+            assert add not in tiered._code and tiered._counts[add] == 0
+            assert tiered._feedback.types[plus] is object
+            assert loop not in tiered._code
+            assert counter in tiered._code
+        case _:
+            pytest.fail("Unexpected statements")
+
+
+def test_tiered_specializes_property_sites_on_shapes(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    lox = Lox(use_cache=False, engine=Engine.TIERED)
+    tiered = lox._interpreter
+    assert isinstance(tiered, TieredInterpreter)
+    source = f"""
+    class P {{ init(x) {{ this.x = x; }} get() {{ return this.x; }} }}
+    class Q {{ init() {{ this.y = 0; this.x = 10; }} get() {{ return 0; }} }}
+    fun use(p) {{ p.x = p.x + 1; return p.get(); }}
+    for (var i = 0; i < {HOT_CALLS}; i = i + 1) use(P(i));
+    """
+    statements = lox._front_end(source, None)
+    assert statements is not None and tiered.interpret(statements)
+    match statements:
+        case [
+            _,
+            _,
+            Function(
+                body=[
+                    Expression(Set(value=Binary(left=Get() as get)) as set),
+                    Return(value=Call(Get() as invoke)),
+                ]
+            ) as use,
+            _,
+        ]:
+            sites: list[Get | Set] = [get, set, invoke]
+        case _:
+            pytest.fail("Unexpected statements")
+    shapes = tiered._feedback.shapes
+    assert use in tiered._code
+    assert all(isinstance(shapes[site], Shape) for site in sites)
+    # Another shape breaks the assumption of the compiled use
+    statements = lox._front_end("print use(P(1)); print use(Q());", None)
+    assert statements is not None and tiered.interpret(statements)
+    assert capsys.readouterr().out == "2\n0\n"
+    assert use not in tiered._code and tiered._counts[use] == 0
+    assert all(shapes[site] is None for site in sites)
+
+
+def test_tiered_interpreters_share_a_tree(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    source = f"""
+    var g = 0;
+    fun f() {{ g = g + 1; }}
+    for (var i = 0; i < {2 * HOT_CALLS}; i = i + 1) f();
+    print g;
+    """
+    statements = Lox(engine=Engine.TIERED)._front_end(source, None)
+    assert statements is not None
+    first, second = TieredInterpreter(), TieredInterpreter()
+    assert first.interpret(statements)
+    assert second.interpret(statements)
+    assert capsys.readouterr().out == f"{2 * HOT_CALLS}\n" * 2
+    assert first._code.keys() == second._code.keys() == {statements[1]}
+
+
+def test_one_resolution_runs_in_two_interpreters(
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    source = """
+    class A { init(n) { this.n = n; } get() { return this.n; } }
+    class B < A { get() { return super.get() + 1; } }
+    fun counter() {
+      var i = 0; fun next() { i = i + 1; return i; } return next;
+    }
+    var next = counter();
+    { var b = B(next()); print b.get(); }
+    """
+    statements = Parser(RegexScanner(source).scan_buffer()).parse()
+    assert statements is not None
+    first, second = Interpreter(), TieredInterpreter()
+    resolver = Resolver(first)
+    assert resolver.resolve_statements(statements)
+    assert first.interpret(statements)
+    # The fields of the nodes are only a cache of the table
+    for expr in resolver.table.variables:
+        expr.depth, expr.slot, expr.boxed = GLOBAL, 0, False
+    resolver.table.apply(second)
+    assert second.interpret(statements)
+    assert capsys.readouterr().out == "2\n2\n"
+
+
+def test_method_cache_goes_megamorphic() -> None:
+    token = Token(TokenType.IDENTIFIER, "f", None, 1)
+    body: list[Stmt] = [Return(token, Literal(1.0))]
+    method = LoxFunction(Function(token, [], body), [], False)
+    classes = [
+        LoxClass(f"C{i}", None, {"f": method})
+        for i in range(POLYMORPHIC_LIMIT + 1)
+    ]
+    cache = MethodCache("f")
+    for klass in classes:
+        assert cache.find(klass) is method
+    assert cache._others is None
+    assert cache.find(classes[0]) is method
+    assert MethodCache("g").find(classes[-1]) is None
+
+
+def test_instances_share_shapes() -> None:
+    klass = LoxClass("A", None, {})
+    x, y = (Token(TokenType.IDENTIFIER, name, None, 1) for name in "xy")
+    a, b, c = LoxInstance(klass), LoxInstance(klass), LoxInstance(klass)
+    for instance in (a, b):
+        instance.set(x, 1.0)
+        instance.set(y, 2.0)
+    c.set(y, 3.0)
+    assert a.shape is b.shape
+    assert c.shape is not a.shape
+    b.set(x, 4.0)  # An existing field keeps the shape
+    assert b.shape is a.shape
+    assert (a.get(x), b.get(x), b.get(y), c.get(y)) == (1.0, 4.0, 2.0, 3.0)
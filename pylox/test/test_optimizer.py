@@ -0,0 +1,95 @@
+import pytest
+import expr as e
+import stmt as s
+from pyloxinterpreter import Interpreter
+from pyloxoptimizer import Optimizer
+from pyloxparser import Parser
+from pyloxresolver import Resolver
+from pyloxscanner import RegexScanner
+from .test_parser import parenthesize
+
+
+def front_end(
+    source: str, interpreter: Interpreter | None = None
+) -> list[s.Stmt]:
+    statements = Parser(RegexScanner(source).scan_buffer()).parse()
+    assert statements is not None
+    interpreter = Interpreter() if interpreter is None else interpreter
+    assert Resolver(interpreter).resolve_statements(statements)
+    return statements
+
+
+def optimized(source: str) -> list[s.Stmt]:
+    return Optimizer().optimize(front_end(source))
+
+
+@pytest.mark.parametrize(
+    "source, expected",
+    [
+        ("(1 + 2) * 3 - 4 / 8", "8.5"),
+        ('"a" + "b" == "ab"', "True"),
+        ("!(1 < 2) or nil", "None"),
+        ("false and x", "False"),
+        ("true and x", "x"),
+        ("nil or x + (2 * 3)", "(+ x 6.0)"),
+        ("-(-(x))", "(- (- x))"),
+        ("f((1), (x))", "(call f 1.0 x)"),
+        ("1 / 0 + 2", "(+ (/ 1.0 0.0) 2.0)"),
+        ('-"a" - 1', '(- (- a) 1.0)'),
+        ('"a" + 1', "(+ a 1.0)"),
+    ],
+)
+def test_optimizer_folds_expressions(source: str, expected: str) -> None:
+    [statement] = optimized(f"{source};")
+    assert isinstance(statement, s.Expression)
+    assert parenthesize(statement.expression) == expected
+
+
+def test_optimizer_prunes_constant_conditions() -> None:
+    statements = optimized(
+        """
+        if (1 < 2) print "then"; else print "else";
+        if (nil) print "then"; else { print "else"; }
+        if (false) print "then";
+        while (1 > 2) print "never";
+        while (x) if (false) print "never";
+        """
+    )
+    match statements:
+        case [
+            s.Print(e.Literal("then")),
+            s.Block([s.Print(e.Literal("else"))]),
+            s.While(e.Variable(), s.Block([]) as empty),
+        ]:
+            assert not empty.scoped
+        case _:
+            pytest.fail("Unexpected statements")
+
+
+PROGRAMS = [
+    'var a = 2; print (a + 3) * (4 - 1); print "x" + "y";',
+    "print 1 + 2 * 3; print 10 / 0;",
+    'print "a" + 1;',
+    'print -"a";',
+    'print !nil; print 1 == 1; print nil == false; print 2 >= "a";',
+    "if (1 > 2) print 1 / 0; else print 3;",
+    "var i = 0; while (i < 3) { i = i + (1 * 1); } print i;",
+    "fun f(x) { if (true) return x * (2 + 2); return 0; } print f(3);",
+    "print false or 4; print nil and 1 / 0; print true and 5;",
+    "while (false) print 1 / 0; print -(1 + 1);",
+]
+
+
+@pytest.mark.parametrize("source", PROGRAMS)
+def test_optimizer_preserves_behavior(
+    source: str, capsys: pytest.CaptureFixture[str]
+) -> None:
+    def run(optimize: bool) -> tuple[str, str]:
+        interpreter = Interpreter()
+        statements = front_end(source, interpreter)
+        if optimize:
+            statements = Optimizer().optimize(statements)
+        interpreter.interpret(statements)
+        return capsys.readouterr()
+
+    assert run(optimize=True) == run(optimize=False)
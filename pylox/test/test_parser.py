@@ -1,5 +1,180 @@
+from types import ModuleType
+from typing import Any
 import expr as e
+import stmt as s
 from pyloxtoken import Token, TokenType
 from pyloxparser import Parser
 from exceptions import ScannerError, InternalPyloxError
 import pytest
+from pyloxscanner import RegexScanner
+from pyloxresolver import Resolver
+from pyloxinterpreter import Interpreter
+
+
+PROGRAM = """
+class Foo < Bar {
+  init(a, b) { this.a; super.init(b); }
+  get() { return this.a >= 2 and !(this.b == nil) or -1 < 2; }
+}
+fun add(a, b) { return a + b * 2 / (3 - 1); }
+var x = add(1, "two").field.call();
+x = x.field = add;
+for (var i = 0; i < 10; i + 1) { if (i) print i; print nil; }
+while (true) x;
+"""
+
+
+def dump(node: Any) -> Any:
+    """Turn an AST into nested tuples that can be compared with =="""
+    if isinstance(node, list):
+        return [dump(n) for n in node]
+    if hasattr(node, "accept"):
+        return (
+            type(node).__name__,
+            {name: dump(getattr(node, name)) for name in node.__slots__},
+        )
+    return node
+
+
+def test_parser_buffer_matches_stream() -> None:
+    from_stream = Parser(RegexScanner(PROGRAM).scan_tokens()).parse()
+    from_buffer = Parser(RegexScanner(PROGRAM).scan_buffer()).parse()
+    assert from_stream is not None
+    assert dump(from_buffer) == dump(from_stream)
+
+
+def test_if_statement_with_else() -> None:
+    source = "if (a) print 1; else print 2; print 3;"
+    match Parser(RegexScanner(source).scan_buffer()).parse():
+        case [s.If(e.Variable(), s.Print(), s.Print()), s.Print()]:
+            pass
+        case other:
+            pytest.fail(f"Unexpected statements {dump(other)}")
+
+
+def parenthesize(node: e.Expr) -> str:
+    """Render an expression with explicit grouping, Lisp style"""
+    match node:
+        case e.Binary() | e.Logical():
+            left, right = parenthesize(node.left), parenthesize(node.right)
+            return f"({node.operator.lexeme} {left} {right})"
+        case e.Unary():
+            return f"({node.operator.lexeme} {parenthesize(node.right)})"
+        case e.Grouping():
+            return f"(group {parenthesize(node.expression)})"
+        case e.Call():
+            arguments = " ".join(parenthesize(a) for a in node.arguments)
+            return f"(call {parenthesize(node.callee)} {arguments})"
+        case e.Get():
+            return f"(. {parenthesize(node.obj)} {node.name.lexeme})"
+        case e.Variable():
+            return node.name.lexeme
+        case e.Literal():
+            return str(node.value)
+        case _:
+            pytest.fail(f"Unexpected expression {dump(node)}")
+
+
+@pytest.mark.parametrize(
+    "source, expected",
+    [
+        ("1 - 2 - 3", "(- (- 1.0 2.0) 3.0)"),
+        ("1 + 2 * 3 / 4", "(+ 1.0 (/ (* 2.0 3.0) 4.0))"),
+        ("a or b and c or d", "(or (or a (and b c)) d)"),
+        ("!a == -b < c", "(== (! a) (< (- b) c))"),
+        ("-a.b(1, 2).c", "(- (. (call (. a b) 1.0 2.0) c))"),
+        ("(1 + 2) * -(3)", "(* (group (+ 1.0 2.0)) (- (group 3.0)))"),
+        ("a <= b != c >= d", "(!= (<= a b) (>= c d))"),
+    ],
+)
+def test_parser_precedence(source: str, expected: str) -> None:
+    match Parser(RegexScanner(source + ";").scan_buffer()).parse():
+        case [s.Expression(expression)]:
+            assert parenthesize(expression) == expected
+        case other:
+            pytest.fail(f"Unexpected statements {dump(other)}")
+
+
+def test_parser_deeply_nested_expression() -> None:
+    depth = 200
+    source = "(" * depth + "1" + ")" * depth + ";"
+    match Parser(RegexScanner(source).scan_buffer()).parse():
+        case [s.Expression(node)]:
+            pass
+        case other:
+            pytest.fail(f"Unexpected statements {dump(other)}")
+    for _ in range(depth):
+        assert isinstance(node, e.Grouping)
+        node = node.expression
+    assert isinstance(node, e.Literal) and node.value == 1.0
+
+
+def test_parser_assignment_targets() -> None:
+    source = "a = b.c = 1; a.b(c).d = 2; 1 + a = 3;"
+    match Parser(RegexScanner(source).scan_buffer()).parse():
+        case [
+            s.Expression(e.Assign(a, e.Set(e.Variable(b), c, e.Literal(1.0)))),
+            s.Expression(e.Set(e.Call(), d, e.Literal(2.0))),
+            s.Expression(e.Binary()),
+        ]:
+            assert [t.lexeme for t in (a, b, c, d)] == ["a", "b", "c", "d"]
+        case other:
+            pytest.fail(f"Unexpected statements {dump(other)}")
+
+
+@pytest.mark.parametrize("module", [e, s])
+def test_nodes_are_compact_and_tagged(module: ModuleType) -> None:
+    classes = [module.__dict__[kind.name.capitalize()] for kind in module.Kind]
+    for node_class in classes:
+        assert node_class.kind is module.Kind[node_class.__name__.upper()]
+        fields = node_class.__match_args__
+        assert node_class.__slots__[: len(fields)] == fields
+        node = node_class(*[None] * len(fields))
+        assert not hasattr(node, "__dict__")
+
+
+def test_resolution_is_stored_on_nodes() -> None:
+    source = "var g; fun f(a) { var b; { print a + b + g; } }"
+    match Parser(RegexScanner(source).scan_buffer()).parse():
+        case [
+            _,
+            s.Function(body=[_, s.Block([s.Print(use)])]),
+        ] as statements:
+            pass
+        case other:
+            pytest.fail(f"Unexpected statements {dump(other)}")
+    match use:  # (a + b) + g
+        case e.Binary(
+            e.Binary(e.Variable() as a, _, e.Variable() as b),
+            _,
+            e.Variable() as g,
+        ):
+            pass
+        case _:
+            pytest.fail(f"Unexpected expression {dump(use)}")
+    assert (a.depth, a.slot) == (e.GLOBAL, 0)
+
+    assert Resolver(Interpreter()).resolve_statements(statements)
+    assert (a.depth, a.slot) == (0, 0)
+    assert (b.depth, b.slot) == (0, 1)
+    assert g.depth == e.GLOBAL
+
+
+def test_blocks_without_declarations_have_no_scope() -> None:
+    source = "fun f(a) { { print a; } { var b; print a; } }"
+    match Parser(RegexScanner(source).scan_buffer()).parse():
+        case [
+            s.Function(
+                body=[
+                    s.Block([s.Print(e.Variable() as outer)]) as plain,
+                    s.Block([_, s.Print(e.Variable() as inner)]) as declaring,
+                ]
+            )
+        ] as statements:
+            pass
+        case other:
+            pytest.fail(f"Unexpected statements {dump(other)}")
+    assert Resolver(Interpreter()).resolve_statements(statements)
+    assert not plain.scoped and declaring.scoped
+    assert outer.depth == 0
+    assert inner.depth == 1
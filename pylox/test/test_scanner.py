@@ -1,4 +1,5 @@
-from pyloxscanner import Scanner, TokenMatch
+import pytest
+from pyloxscanner import Scanner, RegexScanner, TokenMatch, TOKEN_FINDERS
 from source import Source
 from pyloxtoken import Token, TokenType
 from error_handler import ErrorData
@@ -70,3 +71,69 @@ def test_scan_tokens_multiple():
     mock_source.is_at_end.return_value = True
 
     assert next(tokens) == Token(TokenType.EOF, "", None, mock_source.line())
+
+
+EQUIVALENCE_SOURCES = [
+    "",
+    ". class () {;fun",
+    "class Foo < Bar {\n  init(a, b) { this.a = a >= b; }\n}\n",
+    "// a comment\nvar x = 12.5 * (3 - 1) / 2; /* multi\nline */\n",
+    'print "multi\nline string" + x != nil and !true or x <= 1;\n',
+    "a/b//c\n1.2.3 12. _x9 x_ == = ! != < <= > >=\t\r\n",
+]
+
+ERROR_SOURCES = [
+    'print 1;\nvar x = "untermined\nstring',
+    "print 1;\n/* untermined\ncomment",
+    "print 1;\nvar x = @;",
+    "print 'x';",
+]
+
+
+def _finders_tokens(text):
+    return [
+        token
+        for token in Scanner(Source(text), TOKEN_FINDERS).scan_tokens()
+        if token is not None
+    ]
+
+
+@pytest.mark.parametrize("text", EQUIVALENCE_SOURCES)
+def test_regex_scanner_matches_token_finders(text):
+    tokens = [
+        token for token in RegexScanner(text).scan_tokens() if token is not None
+    ]
+    assert tokens == _finders_tokens(text)
+
+
+@pytest.mark.parametrize("text", ERROR_SOURCES)
+def test_regex_scanner_errors_match_token_finders(text, capsys):
+    with pytest.raises(ScannerError) as expected:
+        _finders_tokens(text)
+    expected_report = capsys.readouterr().err
+
+    with pytest.raises(ScannerError) as error:
+        list(RegexScanner(text).scan_tokens())
+    assert str(error.value) == str(expected.value)
+    assert capsys.readouterr().err == expected_report
+
+
+@pytest.mark.parametrize("text", EQUIVALENCE_SOURCES)
+def test_regex_scanner_buffer_matches_tokens(text):
+    buffer = RegexScanner(text).scan_buffer()
+    tokens = list(RegexScanner(text).scan_tokens())
+    assert len(buffer) == len(tokens)
+    assert [buffer.token(i) for i in range(len(buffer))] == tokens
+
+
+def test_regex_scanner_on_utf8_bytes():
+    text = 'var s = "héllo\r\nwörld";\r\nprint s + "/* ü */";\r\n'
+    from_bytes = RegexScanner(text.encode()).scan_buffer()
+    expected = list(RegexScanner(text.replace("\r\n", "\n")).scan_tokens())
+    assert [from_bytes.token(i) for i in range(len(from_bytes))] == expected
+
+
+def test_regex_scanner_on_utf8_bytes_invalid_char(capsys):
+    with pytest.raises(ScannerError):
+        list(RegexScanner("print 1;\nvar é;".encode()).scan_tokens())
+    assert "Invalid character parsed: é" in capsys.readouterr().err
@@ -1,5 +1,5 @@
 import pytest
-from source import Source
+from source import LineIndex, Source
 from string import ascii_letters, digits
 
 
@@ -22,10 +22,40 @@ def test_source_initialization(example_text):
 def test_source_newline(example_text):
     source = Source(example_text)
 
-    source.newline()
+    while source.advance() != "\n":
+        pass
     assert source.line() == 2
 
 
+def test_source_position(example_text):
+    source = Source(example_text)
+
+    while source.advance() != "\n":
+        pass
+    source.advance()
+    source.start_lexeme()
+    source.advance()
+    assert source.position() == (2, 2)
+
+
+@pytest.mark.parametrize("text", ["", "a\n\nbc\n", "\n\nx", b"a\nb\n"])
+def test_line_index(text):
+    lines = LineIndex(text)
+    newline = "\n" if isinstance(text, str) else b"\n"
+    # Out of order lookups, so that the index is extended piecemeal
+    for offset in sorted(range(len(text) + 1), key=lambda x: (x % 2, -x)):
+        line = text[:offset].count(newline) + 1
+        column = offset - (text.rfind(newline, 0, offset) + 1) + 1
+        assert lines.position(offset) == (line, column)
+
+
+def test_line_index_from_the_middle():
+    text = "a\nbc\nd\n"
+    lines = LineIndex(text, 3, 2)
+    assert lines.position(4) == (2, 3)
+    assert lines.position(6) == (3, 2)
+
+
 def test_source_advance(example_text):
     source = Source(example_text)
 
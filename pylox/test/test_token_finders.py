@@ -112,9 +112,10 @@ def test_token_finder_newline_not_found(a_source):
     )
 
 
-def test_token_finder_newline_found(a_source):
-    assert s.token_finder_newline("\n", a_source).result is None
-    assert a_source.line() == 2
+def test_token_finder_newline_found():
+    source = Source("\nx")
+    assert s.token_finder_newline(source.advance(), source).result is None
+    assert source.line() == 2
 
 
 def test_token_finder_string_not_found(a_source):
@@ -250,3 +251,72 @@ def test_scanner_with_invalid_char():
         assert True
     else:
         assert False
+
+
+def test_token_finder_whitespace_run():
+    source = Source(" \t\r\n  \n x")
+    c = source.advance()
+    assert s.token_finder_whitespace_run(c, source).result is None
+    assert source.lexeme() == " \t\r\n  \n "
+    assert source.line() == 3
+
+
+def test_token_finder_number_run():
+    for text, value in (("12569", 12569), ("12.75", 12.75), ("3.", 3)):
+        source = Source(text)
+        c = source.advance()
+        assert s.token_finder_number_run(c, source).result == Token.make(
+            source, TokenType.NUMBER, value
+        )
+
+
+def test_token_finder_identifier_run():
+    for word in ("apple", "class_", "_if_", "my_var_4", "_"):
+        source = Source(word + "+")
+        c = source.advance()
+        assert s.token_finder_identifier_run(c, source).result == Token.make(
+            source, TokenType.IDENTIFIER
+        )
+        assert source.lexeme() == word
+    for string, token_type in s.RESERVED_KEYWORDS.items():
+        source = Source(string)
+        c = source.advance()
+        assert s.token_finder_identifier_run(c, source).result == Token.make(
+            source, token_type
+        )
+
+
+def test_token_finder_table_ambiguous():
+    find_dot = s.token_finder_single_char_factory(".", TokenType.DOT)
+    with pytest.raises(AssertionError):
+        s.make_token_finder_table((".", find_dot), ("..", find_dot))
+
+
+def test_dispatch_scanner_matches_scanner():
+    text = (
+        "class Foo < Bar {\n  init(a, b) { this.a = a >= b; }\n}\n"
+        "// a comment\nvar x = 12.5 * (3 - 1) / 2; /* multi\nline */\n"
+        'print "multi\nline string" + x != nil and !true or x <= 1;\n'
+    )
+    expected = [
+        token
+        for token in s.Scanner(Source(text), s.TOKEN_FINDERS).scan_tokens()
+        if token is not None
+    ]
+    tokens = [
+        token
+        for token in s.DispatchScanner(
+            Source(text), s.TOKEN_FINDER_TABLE
+        ).scan_tokens()
+        if token is not None
+    ]
+    assert tokens == expected
+
+
+def test_dispatch_scanner_with_invalid_char():
+    source = Source(". 'class () {;fun")
+    tokens = s.DispatchScanner(source, s.TOKEN_FINDER_TABLE).scan_tokens()
+    next(tokens)
+    next(tokens)
+    with pytest.raises(ScannerError):
+        next(tokens)